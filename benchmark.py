@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#coding: utf-8
+
+"""計算機やソルバの実行時間を計るプログラム
+
+    benchmark.py run [options]
+    benchmark.py compare [options] old.json new.json
+"""
+
+# Copyright (c) 2013 Yuki Fujii @fjyuu
+# Licensed under the MIT License
+
+from __future__ import division, print_function
+import fjbench
+import json
+import sys
+
+
+def parse_arguments():
+    import optparse
+    import os
+    parser = optparse.OptionParser(
+        "usage: %prog run [options]\n"
+        "       %prog compare [options] old.json new.json")
+    parser.add_option("-s", "--seed",
+                      dest="seed",
+                      type="string",
+                      default="0",
+                      help="set the seed for generating the inputs",
+                      metavar="STRING")
+    parser.add_option("-r", "--repeat",
+                      dest="repeat",
+                      type="int",
+                      default=3,
+                      help="time each case NUMBER times and keep the best "
+                           "(run)",
+                      metavar="NUMBER")
+    parser.add_option("-k", "--filter",
+                      dest="filter",
+                      type="string",
+                      default=None,
+                      help="run only the cases whose name contains STRING "
+                           "(run)",
+                      metavar="STRING")
+    parser.add_option("-q", "--quick",
+                      dest="quick",
+                      action="store_true",
+                      default=False,
+                      help="use only the small sizes (run)")
+    parser.add_option("-l", "--list",
+                      dest="list",
+                      action="store_true",
+                      default=False,
+                      help="list the cases and exit (run)")
+    parser.add_option("-O", "--output",
+                      dest="output",
+                      type="string",
+                      default=None,
+                      help="write the results to FILE as JSON (run)",
+                      metavar="FILE")
+    parser.add_option("-t", "--threshold",
+                      dest="threshold",
+                      type="float",
+                      default=0.1,
+                      help="report cases slower by more than this ratio as "
+                           "regressions (compare, default: 0.1)",
+                      metavar="NUMBER")
+    (opts, args) = parser.parse_args()
+    if not args or args[0] not in ("run", "compare"):
+        parser.error("required a command: run or compare")
+    if args[0] == "run" and len(args) != 1:
+        parser.error("run takes no arguments")
+    if args[0] == "compare":
+        if len(args) != 3:
+            parser.error("compare requires two json files")
+        for path in args[1:]:
+            if not os.access(path, os.R_OK):
+                parser.error("cannot read {}".format(path))
+    if opts.repeat < 1:
+        parser.error("--repeat must be positive")
+    return (opts, args)
+
+
+def run_benchmark(opts):
+    cases = fjbench.default_cases(opts.quick)
+    if opts.filter:
+        cases = [case for case in cases if opts.filter in case.name]
+    if opts.list:
+        for case in cases:
+            print(case.name)
+        return 0
+
+    width = max([len(case.name) for case in cases] + [1])
+
+    def progress(case, result):
+        if "skipped" in result:
+            print("{:<{}} skipped ({})".format(case.name, width,
+                                                result["skipped"]))
+        else:
+            print("{:<{}} {:>12.6f} s".format(case.name, width,
+                                               result["seconds"]))
+        sys.stdout.flush()
+
+    results = fjbench.run(cases, opts.seed, opts.repeat, progress)
+    if opts.output:
+        with open(opts.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+    return 0
+
+
+def compare_benchmarks(opts, old_file, new_file):
+    with open(old_file) as f:
+        old = json.load(f)
+    with open(new_file) as f:
+        new = json.load(f)
+
+    # 入力のグラフと時間は環境によって変わるので，違えば知らせる
+    for key in ["python", "implementation", "platform", "networkx", "seed"]:
+        if old["meta"].get(key) != new["meta"].get(key):
+            print("warning: {} differs: {} and {}".format(
+                key, old["meta"].get(key), new["meta"].get(key)))
+
+    rows = fjbench.compare(old, new, opts.threshold)
+    width = max([len(row[0]) for row in rows] + [4])
+    print("{:<{}} {:>12} {:>12} {:>7}".format("case", width, "old[s]",
+                                              "new[s]", "ratio"))
+    for name, old_seconds, new_seconds, ratio, verdict in rows:
+        print("{:<{}} {:>12.6f} {:>12.6f} {:>7.3f} {}".format(
+            name, width, old_seconds, new_seconds, ratio, verdict))
+
+    regressions = [row for row in rows if row[4] == "regression"]
+    print()
+    print("{} cases compared, {} regressions (threshold: {:.0%})".format(
+        len(rows), len(regressions), opts.threshold))
+    return 1 if regressions else 0
+
+
+def benchmark():
+    (opts, args) = parse_arguments()
+    if args[0] == "run":
+        return run_benchmark(opts)
+    return compare_benchmarks(opts, args[1], args[2])
+
+
+if __name__ == "__main__":
+    sys.exit(benchmark())
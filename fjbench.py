@@ -0,0 +1,345 @@
+#coding: utf-8
+
+"""ベンチマーク
+
+グラフの生成，全数探索の計算機，最小カット，頂点被覆ソルバの実行時間を計る．
+各ケースは固定したシードでグラフを作ってから計るので，同じ環境なら同じ入力に
+なる．結果はJSONに書き出せるdictで，2つの結果を比べて遅くなったケースを見つ
+けられる．
+"""
+
+# Copyright (c) 2013 Yuki Fujii @fjyuu
+# Licensed under the MIT License
+
+from __future__ import division, print_function
+import fjgraph
+import fjutil
+import random
+import platform
+import timeit
+
+
+class BenchmarkCase(object):
+    """ベンチマークの1つのケース
+
+    setup()は計る関数を返す関数で，その中でグラフなどの入力を作る．計る関数は
+    number回の呼び出しをまとめて1回と数え，1回あたりの時間を記録する．
+    """
+
+    def __init__(self, name, params, setup, number=1):
+        self.name = name
+        self.params = params
+        self.setup = setup
+        self.number = number
+
+    def __str__(self):
+        return self.name
+
+
+def _ensembles(quick):
+    "(名前, パラメータ, アンサンブル)のリスト"
+
+    if quick:
+        sizes = [(100, 150)]
+        degree_dists = [[0, 0, 0, 100]]
+    else:
+        sizes = [(100, 150), (1000, 1500)]
+        degree_dists = [[0, 0, 0, 100], [0, 0, 0, 1000], [0, 0, 500, 0, 500]]
+
+    ret = []
+    for n, m in sizes:
+        params = {"n": n, "m": m}
+        ret.append(("NMGraphEnsemble", params,
+                    fjgraph.NMGraphEnsemble(n, m)))
+        ret.append(("ErdosRenyiGraphEnsemble", params,
+                    fjgraph.ErdosRenyiGraphEnsemble(
+                        n, 2 * m / (n * (n - 1)))))
+        ret.append(("MultiGraphEnsemble", params,
+                    fjgraph.MultiGraphEnsemble(n, m)))
+    for degree_dist in degree_dists:
+        ensemble = fjgraph.SpecifiedDegreeDistEnsemble(degree_dist)
+        params = {"n": ensemble.num_of_nodes(), "m": ensemble.num_of_edges(),
+                  "degree_dist": degree_dist}
+        ret.append(("SpecifiedDegreeDistEnsemble", params, ensemble))
+    return ret
+
+
+def _case_name(prefix, params, hidden=()):
+    "prefix(key=value,...)の形のケース名．hiddenのキーは名前に入れない"
+
+    items = []
+    for key in sorted(params):
+        if key in hidden: continue
+        value = params[key]
+        if isinstance(value, list):
+            value = "-".join(str(x) for x in value)
+        items.append("{}={}".format(key, value))
+    return "{}({})".format(prefix, ",".join(items))
+
+
+def _graphs(ensemble, k, compact=True):
+    "ensembleからk個のグラフを作る"
+
+    if compact:
+        return [ensemble.generate_compact_graph() for i in range(k)]
+    return [ensemble.generate_graph() for i in range(k)]
+
+
+def _apply(f, graphs):
+    "graphsの各グラフについてf(G)を呼ぶ関数"
+
+    def run():
+        for G in graphs:
+            f(G)
+    return run
+
+
+def _generation_cases(quick):
+    cases = []
+    for kind, params, ensemble in _ensembles(quick):
+        for method in ["generate_graph", "generate_compact_graph"]:
+            cases.append(BenchmarkCase(
+                _case_name("{}.{}".format(kind, method), params),
+                dict(params, ensemble=kind, method=method),
+                lambda ensemble=ensemble, method=method:
+                    getattr(ensemble, method),
+                number=10))
+        if kind == "ErdosRenyiGraphEnsemble":
+            continue  # 辺数が一定でないのでgenerate_graphsは使えない
+        # 10個のグラフをまとめて作る時間なので，1個あたりの時間は
+        # generate_compact_graphのケースの時間と比べて10分の1になるはず
+        cases.append(BenchmarkCase(
+            _case_name("{}.generate_graphs".format(kind),
+                       dict(params, k=10)),
+            dict(params, ensemble=kind, method="generate_graphs", k=10),
+            lambda ensemble=ensemble:
+                lambda: ensemble.generate_graphs(10)))
+    return cases
+
+
+def _calculator_cases(quick):
+    # (名前, パラメータ, 計算機を作る関数, 計算する関数, (n, m))
+    vc = fjgraph.VertexCoverDistCalculator
+    cut = fjgraph.CutSetDistCalculator
+    three = fjgraph.ThreeWayCutSetDistCalculator
+    tree = fjgraph.TreeDecompositionDistCalculator
+    two_way_size = (10, 15) if quick else (14, 21)
+    lp_size = (7, 10) if quick else (9, 13)
+    three_way_size = (6, 9) if quick else (8, 12)
+    mitm_size = (12, 18) if quick else (16, 24)
+    tree_size = (30, 40) if quick else (35, 47)
+    definitions = []
+    for method in ["naive", "numpy", "branch"]:
+        definitions.append((
+            "VertexCoverDistCalculator.vertex_cover_dist", {"method": method},
+            vc, lambda calc, G, method=method:
+                calc.vertex_cover_dist(G, method=method),
+            two_way_size))
+    definitions.append((
+        "VertexCoverDistCalculator.lp_vertex_cover_dist", {},
+        vc, lambda calc, G: calc.lp_vertex_cover_dist(G), lp_size))
+    for method in ["naive", "gray"]:
+        definitions.append((
+            "CutSetDistCalculator.detailed_global_cutset_dist",
+            {"method": method}, cut,
+            lambda calc, G, method=method:
+                calc.detailed_global_cutset_dist(G, method=method),
+            two_way_size))
+        definitions.append((
+            "CutSetDistCalculator.detailed_st_cutset_dist",
+            {"method": method}, cut,
+            lambda calc, G, method=method:
+                calc.detailed_st_cutset_dist(G, 0, 1, method=method),
+            two_way_size))
+    for method in ["naive", "mitm"]:
+        definitions.append((
+            "ThreeWayCutSetDistCalculator.detailed_cutset_dist",
+            {"method": method}, three,
+            lambda calc, G, method=method:
+                calc.detailed_cutset_dist(G, method=method),
+            three_way_size))
+    # "mitm"の時間は境界の大きさで大きく変わるので，naiveでは届かないサイズ
+    # でも計る
+    definitions.append((
+        "ThreeWayCutSetDistCalculator.detailed_cutset_dist",
+        {"method": "mitm"}, three,
+        lambda calc, G: calc.detailed_cutset_dist(G, method="mitm"),
+        mitm_size))
+    definitions.append((
+        "ThreeWayCutSetDistCalculator.cutset_dist", {},
+        three, lambda calc, G: calc.cutset_dist(G), three_way_size))
+    for method in ["vertex_cover_dist", "lp_vertex_cover_dist",
+                   "detailed_global_cutset_dist"]:
+        definitions.append((
+            "TreeDecompositionDistCalculator." + method, {}, tree,
+            lambda calc, G, method=method: getattr(calc, method)(G),
+            tree_size))
+
+    cases = []
+    for name, params, create, compute, (n, m) in definitions:
+        params = dict(params, n=n, m=m, ensemble="MultiGraphEnsemble")
+        name = _case_name(name, params, hidden=("ensemble",))
+
+        def setup(create=create, compute=compute, n=n, m=m):
+            calc = create()
+            graphs = _graphs(fjgraph.MultiGraphEnsemble(n, m), 3)
+            return _apply(lambda G: compute(calc, G), graphs)
+        cases.append(BenchmarkCase(name, params, setup))
+    return cases
+
+
+def _min_cut_cases(quick):
+    sizes = [(50, 100)] if quick else [(50, 100), (200, 400)]
+    cases = []
+    for n, m in sizes:
+        for compact in [True, False]:
+            graph_type = "CompactGraph" if compact else "MultiGraph"
+            definitions = [
+                ("global_mincut", {"algorithm": "stoer_wagner"},
+                 lambda calc, G: calc.global_mincut(
+                     G, algorithm="stoer_wagner")),
+                ("st_mincut", {},
+                 lambda calc, G: calc.st_mincut(G, 0, 1))]
+            if n <= 50:
+                # maxflowはn-1回の最大流を解くので，大きいグラフでは遅すぎる
+                definitions.append((
+                    "global_mincut", {"algorithm": "maxflow"},
+                    lambda calc, G: calc.global_mincut(
+                        G, algorithm="maxflow")))
+            for method, extra, compute in definitions:
+                params = dict(extra, n=n, m=m, graph=graph_type,
+                              ensemble="MultiGraphEnsemble")
+                name = _case_name("MinCutCalculator." + method, params,
+                                  hidden=("ensemble",))
+
+                def setup(compute=compute, n=n, m=m, compact=compact):
+                    calc = fjgraph.MinCutCalculator()
+                    graphs = _graphs(fjgraph.MultiGraphEnsemble(n, m), 5,
+                                     compact)
+                    return _apply(lambda G: compute(calc, G), graphs)
+                cases.append(BenchmarkCase(name, params, setup))
+    return cases
+
+
+def _solver_cases(quick):
+    if quick:
+        ensembles = [("n-m", fjgraph.NMGraphEnsemble(100, 150))]
+    else:
+        ensembles = [("n-m", fjgraph.NMGraphEnsemble(100, 150)),
+                     ("n-m", fjgraph.NMGraphEnsemble(1000, 1500)),
+                     ("3-regular",
+                      fjgraph.SpecifiedDegreeDistEnsemble([0, 0, 0, 100]))]
+    cases = []
+    for backend in ["native", "cplex"]:
+        for label, ensemble in ensembles:
+            for mode in ["LP", "IP"]:
+                if backend == "cplex" and ensemble.num_of_nodes() > 200:
+                    # Community Editionでは変数と制約が1000個までしか解けない
+                    continue
+                params = {"backend": backend, "mode": mode, "graph": label,
+                          "n": ensemble.num_of_nodes(),
+                          "m": ensemble.num_of_edges()}
+                name = _case_name(
+                    "VertexCoverSolver.{}_solve".format(mode.lower()),
+                    params, hidden=("mode",))
+
+                def setup(backend=backend, ensemble=ensemble, mode=mode):
+                    if backend == "cplex":
+                        import cplex  # なければこのケースは飛ばす
+                    solver = fjgraph.VertexCoverSolver(backend=backend)
+                    graphs = _graphs(ensemble, 5, compact=False)
+                    if mode == "LP":
+                        return _apply(solver.lp_solve, graphs)
+                    return _apply(solver.ip_solve, graphs)
+                cases.append(BenchmarkCase(name, params, setup))
+    return cases
+
+
+def default_cases(quick=False):
+    """すべてのケースのリスト
+
+    quickがTrueのときは，小さいサイズだけにする．
+    """
+
+    return (_generation_cases(quick) + _calculator_cases(quick) +
+            _min_cut_cases(quick) + _solver_cases(quick))
+
+
+def run_case(case, seed, repeat=3):
+    """caseを計る
+
+    入力はseedとケース名から作ったシードで作る．repeat回計って，1回あたりの時
+    間の最小値と中央値を返す．入力を作れないとき（必要なモジュールがないとき）
+    はskippedに理由を入れて返す．
+    """
+
+    random.seed(fjutil.derive_seed(seed, case.name))
+    try:
+        function = case.setup()
+    except ImportError as e:
+        return {"params": case.params, "skipped": u"{}".format(e)}
+
+    timer = timeit.default_timer
+    times = []
+    for i in range(repeat):
+        random.seed(fjutil.derive_seed(seed, case.name + ":run"))
+        start = timer()
+        for j in range(case.number):
+            function()
+        times.append((timer() - start) / case.number)
+    times.sort()
+    return {"params": case.params,
+            "seconds": times[0],
+            "median": times[len(times) // 2],
+            "repeat": repeat,
+            "number": case.number}
+
+
+def run(cases, seed=0, repeat=3, progress=None):
+    """casesを順に計り，JSONに書き出せるdictで返す
+
+    progressを指定すると，各ケースのあとでprogress(case, result)を呼ぶ．
+    """
+
+    import networkx
+    results = {}
+    for case in cases:
+        result = run_case(case, seed, repeat)
+        results[case.name] = result
+        if progress is not None:
+            progress(case, result)
+    return {"meta": {"python": platform.python_version(),
+                     "implementation": platform.python_implementation(),
+                     "platform": platform.platform(),
+                     "networkx": networkx.__version__,
+                     "seed": seed,
+                     "repeat": repeat},
+            "results": results}
+
+
+def compare(old, new, threshold=0.1):
+    """runの結果oldとnewを比べる
+
+    両方にあるケースについて(ケース名, oldの時間, newの時間, 比, 判定)のリスト
+    を返す．比はnew / old．判定は，比が1 + thresholdより大きければ
+    "regression"，1 / (1 + threshold)より小さければ"improvement"，そうでな
+    ければ""．時間は最小値を使う．
+    """
+
+    ret = []
+    old_results = old["results"]
+    new_results = new["results"]
+    for name in sorted(set(old_results) & set(new_results)):
+        old_seconds = old_results[name].get("seconds")
+        new_seconds = new_results[name].get("seconds")
+        if old_seconds is None or new_seconds is None:
+            continue
+        ratio = new_seconds / old_seconds if old_seconds > 0 else 1.0
+        if ratio > 1 + threshold:
+            verdict = "regression"
+        elif ratio < 1 / (1 + threshold):
+            verdict = "improvement"
+        else:
+            verdict = ""
+        ret.append((name, old_seconds, new_seconds, ratio, verdict))
+    return ret
@@ -11,14 +11,399 @@
 from __future__ import division, print_function
 import fjgraph
 import fjutil
+import random
+import math
+import time
+import os
+import multiprocessing
 from collections import Counter
 
 
-def ave_3way_detailed_cutset_dist(ensemble, num_of_trials):
-    "平均3分割詳細カットセット分布を実験的に求める"
+class TrialRunner(object):
+    """試行を繰り返し実行するクラス
 
-    sum_dist = Counter()
-    calc = fjgraph.ThreeWayCutSetDistCalculator()
+    seedを指定すると，各試行の前にseedと試行番号から作ったシードでrandomモジュー
+    ルを初期化する．そのため，結果はjobsによらず同じになる．jobsが2以上のとき
+    は，試行をmultiprocessingのプールで並列に実行する．
+
+    cacheにfjgraph.IsomorphismCacheを指定すると，実験で使う計算機がそれを使う．
+    キャッシュのヒット数とミス数は実験の終わりに表示する．並列に実行するときは
+    ワーカプロセスごとにキャッシュを持ち，ヒット数とミス数はcacheに足し込む．
+
+    storeにfjstore.TrialStoreを指定すると，各試行の結果を保存し，保存済みの試
+    行は実行せずにその結果を使う（seedが必要）．さらにpool_trialsがTrueのとき
+    は，同じ実験とアンサンブルについて保存されているほかの試行（ほかのシードの
+    ものなど）の結果もあわせて使う．
+
+    rel_errorを指定すると逐次停止モードになる（max_trialsが必要）．試行を
+    num_of_trials回ずつまとめて行い，各まとまりの終わりに実験の推定値の信頼区
+    間の半幅が推定値のrel_error倍以下になっていれば止める．そうでなくても試行
+    回数がmax_trialsに達したら止める．最後に行った実験の結果の数は
+    num_of_resultsに入る．
+
+    runが結果を返している間，next_trialは次の試行番号（返した結果までの試行
+    の続き）になり，pooledはpool_trialsでほかの試行の結果を返しているときに
+    Trueになる．
+
+    profilerにfjutil.Profilerを指定すると，試行の間それを有効にして，フェー
+    ズ（グラフの生成，分布の計算，ソルバなど）ごとの時間とカウンタを集計する．
+    並列に実行するときはワーカプロセスごとに集計し，試行ごとにprofilerに足し
+    込むので，時間は全プロセスの合計になる．キャッシュのヒット数とミス数も
+    カウンタに足す．
+    """
+
+    def __init__(self, seed=None, jobs=1, cache=None, store=None,
+                 pool_trials=False, rel_error=None, max_trials=None,
+                 profiler=None):
+        if store is not None and seed is None:
+            raise ExperimentError(u"結果を保存するにはseedが必要です")
+        if rel_error is not None and max_trials is None:
+            raise ExperimentError(u"逐次停止モードにはmax_trialsが必要です")
+        self.seed = seed
+        self.jobs = jobs
+        self.cache = cache
+        self.store = store
+        self.pool_trials = pool_trials
+        self.rel_error = rel_error
+        self.max_trials = max_trials
+        self.profiler = profiler
+        self.num_of_results = 0
+        self.next_trial = 0
+        self.pooled = False
+
+    def map_graphs(self, compute, args, graphs):
+        """compute(G, *args)をgraphsの各グラフについて求め，graphsの順に返す
+        イテレータ
+
+        computeとargsはrunのtrialとargsと同じく，ワーカプロセスに渡せるもので
+        なければならない．jobs，cache，profilerはrunと同じように使う．乱数は使
+        わないものとし，seedとstore，逐次停止モードは使わない．
+        """
+
+        graphs = list(graphs)
+        cache = self.cache
+        if cache is not None:
+            start_stats = (cache.hits, cache.misses)
+
+        profiler = self.profiler
+        if profiler is not None:
+            previous_profiler = fjutil.set_profiler(profiler)
+
+        pool = None
+        progress_bar = fjutil.ProgressBar("Calculation", 80)
+        progress_bar.begin()
+        try:
+            if self.jobs > 1 and len(graphs) > 1:
+                pool = multiprocessing.Pool(
+                    self.jobs, _init_trial_worker,
+                    (compute, args, cache, profiler is not None))
+                chunksize = max(1, len(graphs) // (self.jobs * 16))
+                results = pool.imap(_map_graph_in_worker, graphs, chunksize)
+            else:
+                results = ((compute(G, *args), 0, 0, None) for G in graphs)
+
+            for i in range(len(graphs)):
+                result, hits, misses, profile = next(results)
+                if cache is not None:
+                    cache.hits += hits
+                    cache.misses += misses
+                if profile is not None:
+                    profiler.merge(profile)
+                yield result
+                progress_bar.write((i + 1) / len(graphs))
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if profiler is not None:
+                fjutil.set_profiler(previous_profiler)
+        progress_bar.end()
+
+        if cache is not None:
+            self._report_cache(start_stats)
+
+    def _report_cache(self, start_stats):
+        "start_stats = (ヒット数, ミス数)からの増分を表示し，profilerに足す"
+
+        cache = self.cache
+        hits = cache.hits - start_stats[0]
+        misses = cache.misses - start_stats[1]
+        if self.profiler is not None:
+            self.profiler.count("cache_hits", hits)
+            self.profiler.count("cache_misses", misses)
+        print("isomorphism cache: {} hits, {} misses".format(hits, misses))
+        print()
+
+    def run(self, trial, args, num_of_trials, key=None, converged=None,
+            first=0):
+        """trial(*args)をnum_of_trials回実行し，結果を試行順に返すイテレータ
+
+        trialとargsは，並列に実行するときワーカプロセスに渡せるもの（モジュール
+        のトップレベルで定義した関数など）でなければならない．keyは結果を保存す
+        るときに使う(実験名, アンサンブル)の組．firstを指定すると試行firstから
+        始める（それより前の試行の結果は別に持っているとき）．
+
+        逐次停止モードでは，num_of_trials回ごとにconverged(rel_error)を呼び，
+        Trueが返れば止める．convergedは，それまでに返した結果から求めた推定値
+        の精度がrel_errorに届いたかを返す関数．convergedを省略すると常に
+        num_of_trials回実行する．試行iの結果はモードによらず同じになる．
+        """
+
+        seed = self.seed
+        if seed is None and self.jobs > 1:
+            # ワーカプロセスが同じ乱数列を使わないようにする
+            seed = random.getrandbits(64)
+
+        store = self.store
+        done = {}
+        if store is not None:
+            experiment, ensemble = key
+            done = store.load(experiment, ensemble, seed)
+
+        sequential = self.rel_error is not None and converged is not None
+        limit = max(self.max_trials, 1) if sequential else num_of_trials
+        batch_size = max(num_of_trials, 1)
+
+        cache = self.cache
+        if cache is not None:
+            start_stats = (cache.hits, cache.misses)
+
+        profiler = self.profiler
+        if profiler is not None:
+            previous_profiler = fjutil.set_profiler(profiler)
+
+        pool = None
+        self.num_of_results = 0
+        self.next_trial = first
+        self.pooled = False
+        stop_reason = "max_trials"
+        progress_bar = fjutil.ProgressBar("Calculation", 80)
+        progress_bar.begin()
+        try:
+            start = first
+            while start < limit:
+                stop = min(start + batch_size, limit) if sequential else limit
+                todo = [i for i in range(start, stop) if i not in done]
+                if seed is None:
+                    seeds = [None] * len(todo)
+                else:
+                    seeds = [fjutil.derive_seed(seed, i) for i in todo]
+
+                if self.jobs > 1 and seeds:
+                    if pool is None:
+                        pool = multiprocessing.Pool(
+                            self.jobs, _init_trial_worker,
+                            (trial, args, cache, profiler is not None))
+                    chunksize = max(1, len(seeds) // (self.jobs * 16))
+                    results = pool.imap(_run_trial_in_worker, seeds, chunksize)
+                else:
+                    results = ((_run_trial(trial, args, s), 0, 0, None)
+                               for s in seeds)
+
+                for i in range(start, stop):
+                    if i in done:
+                        result = done[i]
+                    else:
+                        result, hits, misses, profile = next(results)
+                        if cache is not None:
+                            cache.hits += hits
+                            cache.misses += misses
+                        if profile is not None:
+                            profiler.merge(profile)
+                        if store is not None:
+                            store.save(experiment, ensemble, seed, i, result)
+                    self.num_of_results += 1
+                    self.next_trial = i + 1
+                    yield result
+                    progress_bar.write((i - first) / (limit - first))
+
+                start = stop
+                if sequential and converged(self.rel_error):
+                    stop_reason = "converged"
+                    break
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            if store is not None:
+                store.flush()
+            if profiler is not None:
+                fjutil.set_profiler(previous_profiler)
+        progress_bar.end()
+
+        if cache is not None:
+            self._report_cache(start_stats)
+
+        if sequential:
+            print("sequential stopping: {} trials ({})".format(
+                self.num_of_results, stop_reason))
+            print()
+
+        if store is not None and self.pool_trials:
+            self.pooled = True
+            for other_seed, i, result in store.results(experiment, ensemble):
+                if other_seed == u"{}".format(seed) and i < start:
+                    continue
+                self.num_of_results += 1
+                yield result
+
+
+def _tail_probs_converged(counts, num_of_results, rel_error):
+    """countsから求めたx以上の確率（0と1は除く）のすべてについて，Wilsonスコ
+    ア区間の半幅がその確率のrel_error倍以下かを返す"""
+
+    if num_of_results == 0:
+        return False
+    tail = 0
+    for x in sorted(counts, reverse=True):
+        tail += counts[x]
+        if tail == num_of_results:
+            break
+        if not _prob_converged(tail, num_of_results, rel_error):
+            return False
+    return True
+
+
+def _prob_converged(successes, num_of_results, rel_error):
+    "確率のWilsonスコア区間の半幅が確率のrel_error倍以下か（確率0は除く）"
+
+    low, high = fjutil.wilson_interval(successes, num_of_results)
+    return (high - low) / 2 <= rel_error * successes / num_of_results
+
+
+def _means_converged(means, rel_error):
+    "fjutil.RunningMeanのすべてについて，信頼区間の半幅が平均のrel_error倍以下か"
+
+    for mean in means:
+        low, high = mean.interval()
+        if (high - low) / 2 > rel_error * abs(mean.mean()):
+            return False
+    return True
+
+
+def _run_trial(trial, args, seed):
+    if seed is not None:
+        random.seed(seed)
+    with fjutil.profiler().phase("trial"):
+        return trial(*args)
+
+
+_worker_trial = None
+
+
+def _init_trial_worker(trial, args, cache, profile):
+    global _worker_trial
+    _worker_trial = (trial, args, cache)
+    if profile:
+        fjutil.set_profiler(fjutil.Profiler())
+
+
+def _run_trial_in_worker(seed):
+    trial, args, cache = _worker_trial
+    return _measure(cache, lambda: _run_trial(trial, args, seed))
+
+
+def _map_graph_in_worker(G):
+    compute, args, cache = _worker_trial
+    return _measure(cache, lambda: compute(G, *args))
+
+
+def _measure(cache, run):
+    """run()を実行し，結果とキャッシュのヒット数，ミス数の増分，その間に集計
+    したProfiler（有効にしていなければNone）を返す"""
+
+    profiler = fjutil.profiler()
+    hits = misses = 0
+    if cache is not None:
+        hits, misses = cache.hits, cache.misses
+    result = run()
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    profile = profiler.take() if profiler.enabled else None
+    return result, hits, misses, profile
+
+
+def _generate(generate, *args):
+    "generate(*args)でグラフを生成する（Profilerではgenerateのフェーズ）"
+
+    with fjutil.profiler().phase("generate"):
+        return generate(*args)
+
+
+def _3way_detailed_cutset_dist_trial(ensemble, calc, method):
+    return _3way_detailed_cutset_dist(
+        _generate(ensemble.generate_compact_graph), calc, method)
+
+
+def _3way_detailed_cutset_dist(G, calc, method):
+    return calc.detailed_cutset_dist(G, method=method)
+
+
+def _dist_accumulator(ensemble, shape, checkpoint):
+    """分布を足し合わせるためのオブジェクトと，最初の試行番号を返す
+
+    shape(n, m)は頂点数n，辺数mのときのキーの範囲．checkpointのファイルがあれ
+    ばそれを読み込み，そこに書かれた次の試行から始める．
+    """
+
+    try:
+        shape = shape(ensemble.num_of_nodes(), ensemble.num_of_edges())
+    except fjgraph.FJGraphError:
+        shape = None  # 辺数が一定でない
+    if checkpoint is not None and os.path.exists(checkpoint):
+        accumulator, next_trial = fjutil.load_checkpoint(checkpoint)
+        if isinstance(accumulator, fjutil.DenseAccumulator) and \
+                accumulator.shape != shape:
+            raise ExperimentError(u"チェックポイントのキーの範囲が違います")
+        print("checkpoint: resume from trial {}".format(next_trial))
+        return accumulator, next_trial
+    return fjutil.make_accumulator(shape), 0
+
+
+# 分布を足し合わせているとき，前回の書き出しからこの秒数が経つとチェックポ
+# イントを書き出す
+_checkpoint_interval = 60.0
+
+
+def _accumulate(accumulator, runner, dists, checkpoint):
+    """runner.runが返すdistsの分布をaccumulatorに足し込み，ときどき
+    checkpointに書き出す
+
+    チェックポイントにはrunner.next_trialを次の試行番号として書く．
+    pool_trialsで返されるほかの試行の結果は，再開したときにもう一度返される
+    ので，チェックポイントには含めない．
+    """
+
+    last_checkpoint = time.time()
+    for dist in dists:
+        if runner.pooled and checkpoint is not None:
+            fjutil.save_checkpoint(checkpoint, accumulator, runner.next_trial)
+            checkpoint = None
+        accumulator.add(dist)
+        if checkpoint is not None and \
+                time.time() - last_checkpoint > _checkpoint_interval:
+            fjutil.save_checkpoint(checkpoint, accumulator, runner.next_trial)
+            last_checkpoint = time.time()
+    if checkpoint is not None:
+        fjutil.save_checkpoint(checkpoint, accumulator, runner.next_trial)
+    return accumulator
+
+
+def ave_3way_detailed_cutset_dist(ensemble, num_of_trials, runner=None,
+                                  method="naive", checkpoint=None):
+    """平均3分割詳細カットセット分布を実験的に求める
+
+    methodはThreeWayCutSetDistCalculator.detailed_cutset_distの計算方法である．
+    キー(j, k, l, w)ごとの和は，頂点数と辺数から決まる大きさの配列に足し込む
+    （fjutil.DenseAccumulator）．checkpointにファイル名を指定すると，和をとき
+    どきそこに書き出し，次に同じファイル名で呼んだときはその続きから試行する．
+    """
+
+    runner = runner or TrialRunner()
+    calc = fjgraph.ThreeWayCutSetDistCalculator(
+        cache=runner.cache, split_components=True)
+    accumulator, first = _dist_accumulator(
+        ensemble, lambda n, m: (n + 1, n + 1, n + 1, m + 1), checkpoint)
 
     print("""= ave_3way_detailed_cutset_dist =
 input:
@@ -27,25 +412,35 @@ input:
 output:
  * ave_3way_detailed_cutset_dist""".format(ensemble, num_of_trials))
 
-    progress_bar = fjutil.ProgressBar("Calculation", 80)
-    progress_bar.begin()
-    for i in range(num_of_trials):
-        G = ensemble.generate_graph()
-        ret_dist = calc.detailed_cutset_dist(G)
-        sum_dist += ret_dist
-        progress_bar.write(i / num_of_trials)
-    progress_bar.end()
+    _accumulate(accumulator, runner, runner.run(
+        _3way_detailed_cutset_dist_trial, (ensemble, calc, method),
+        num_of_trials, ("ave_3way_detailed_cutset_dist", ensemble),
+        first=first), checkpoint)
+    return accumulator.average()
 
-    ave_dist = Counter(dict((key, value / num_of_trials)
-                            for key, value in sum_dist.items()))
-    return ave_dist
 
+def _vertex_cover_dist_trial(ensemble, dist_calc, method):
+    return _vertex_cover_dist(_generate(ensemble.generate_compact_graph),
+                              dist_calc, method)
 
-def ave_vertex_cover_dist(ensemble, num_of_trials):
-    "平均IP-頂点被覆分布を実験的に求める"
 
-    sum_dist = Counter()
-    dist_calc = fjgraph.VertexCoverDistCalculator()
+def _vertex_cover_dist(G, dist_calc, method):
+    return dist_calc.vertex_cover_dist(G, method=method)
+
+
+def ave_vertex_cover_dist(ensemble, num_of_trials, runner=None,
+                          method="naive", checkpoint=None):
+    """平均IP-頂点被覆分布を実験的に求める
+
+    methodはVertexCoverDistCalculator.vertex_cover_distの計算方法である．
+    checkpointはave_3way_detailed_cutset_distと同じ．
+    """
+
+    runner = runner or TrialRunner()
+    dist_calc = fjgraph.VertexCoverDistCalculator(cache=runner.cache,
+                                                  split_components=True)
+    accumulator, first = _dist_accumulator(
+        ensemble, lambda n, m: (n + 1,), checkpoint)
 
     print("""= ave_vertex_cover_dist =
 input:
@@ -54,25 +449,34 @@ input:
 output:
  * ave_vertex_cover_dist""".format(ensemble, num_of_trials))
 
-    progress_bar = fjutil.ProgressBar("Calculation", 80)
-    progress_bar.begin()
-    for i in range(num_of_trials):
-        G = ensemble.generate_graph()
-        ret_dist = dist_calc.vertex_cover_dist(G)
-        sum_dist += ret_dist
-        progress_bar.write(i / num_of_trials)
-    progress_bar.end()
+    _accumulate(accumulator, runner, runner.run(
+        _vertex_cover_dist_trial, (ensemble, dist_calc, method),
+        num_of_trials, ("ave_vertex_cover_dist", ensemble),
+        first=first), checkpoint)
+    return accumulator.average()
+
+
+def _lp_vertex_cover_dist_trial(ensemble, dist_calc):
+    return _lp_vertex_cover_dist(_generate(ensemble.generate_compact_graph),
+                                 dist_calc)
 
-    ave_dist = Counter(dict((key, value / num_of_trials)
-                            for key, value in sum_dist.items()))
-    return ave_dist
 
+def _lp_vertex_cover_dist(G, dist_calc):
+    return dist_calc.lp_vertex_cover_dist(G)
 
-def ave_lp_vertex_cover_dist(ensemble, num_of_trials):
-    "平均LP-頂点被覆分布を実験的に求める"
 
-    sum_table = Counter()
-    dist_calc = fjgraph.VertexCoverDistCalculator()
+def ave_lp_vertex_cover_dist(ensemble, num_of_trials, runner=None,
+                             checkpoint=None):
+    """平均LP-頂点被覆分布を実験的に求める
+
+    checkpointはave_3way_detailed_cutset_distと同じ．
+    """
+
+    runner = runner or TrialRunner()
+    dist_calc = fjgraph.VertexCoverDistCalculator(cache=runner.cache,
+                                                  split_components=True)
+    accumulator, first = _dist_accumulator(
+        ensemble, lambda n, m: (n + 1, n + 1), checkpoint)
 
     print("""= ave_lp_vertex_cover_dist =
 input:
@@ -81,18 +485,79 @@ input:
 output:
  * ave_lp_vertex_cover_dist""".format(ensemble, num_of_trials))
 
-    progress_bar = fjutil.ProgressBar("Calculation", 80)
-    progress_bar.begin()
-    for i in range(num_of_trials):
-        G = ensemble.generate_graph()
-        ret_table = dist_calc.lp_vertex_cover_dist(G)
-        sum_table += ret_table
-        progress_bar.write(i / num_of_trials)
-    progress_bar.end()
+    _accumulate(accumulator, runner, runner.run(
+        _lp_vertex_cover_dist_trial, (ensemble, dist_calc), num_of_trials,
+        ("ave_lp_vertex_cover_dist", ensemble),
+        first=first), checkpoint)
+    return accumulator.average()
+
+
+def exact_ave_3way_detailed_cutset_dist(ensemble, runner=None,
+                                        method="naive"):
+    """平均3分割詳細カットセット分布を，アンサンブルのすべてのグラフを列挙し
+    て正確に求める
+
+    ensembleはenumerate_graphsで列挙できるもの（頂点数と辺数が小さい
+    MultiGraphEnsemble，SpecifiedDegreeDistEnsemble，NMGraphEnsemble）でなけ
+    ればならない．同型なグラフはまとめて1回だけ計算し，確率で重み付けして足
+    し合わせる．runnerのjobsが2以上なら並列に計算する．methodは
+    ave_3way_detailed_cutset_distと同じ．
+    """
+
+    runner = runner or TrialRunner()
+    calc = fjgraph.ThreeWayCutSetDistCalculator(
+        cache=runner.cache, split_components=True)
+    return _exact_ave_dist("exact_ave_3way_detailed_cutset_dist", ensemble,
+                           _3way_detailed_cutset_dist, (calc, method), runner)
+
+
+def exact_ave_vertex_cover_dist(ensemble, runner=None, method="naive"):
+    """平均IP-頂点被覆分布を，アンサンブルのすべてのグラフを列挙して正確に求
+    める
+
+    詳しくはexact_ave_3way_detailed_cutset_distを参照．
+    """
+
+    runner = runner or TrialRunner()
+    dist_calc = fjgraph.VertexCoverDistCalculator(cache=runner.cache,
+                                                  split_components=True)
+    return _exact_ave_dist("exact_ave_vertex_cover_dist", ensemble,
+                           _vertex_cover_dist, (dist_calc, method), runner)
+
 
-    ave_table = Counter(dict((key, value / num_of_trials)
-                             for key, value in sum_table.items()))
-    return ave_table
+def exact_ave_lp_vertex_cover_dist(ensemble, runner=None):
+    """平均LP-頂点被覆分布を，アンサンブルのすべてのグラフを列挙して正確に求
+    める
+
+    詳しくはexact_ave_3way_detailed_cutset_distを参照．
+    """
+
+    runner = runner or TrialRunner()
+    dist_calc = fjgraph.VertexCoverDistCalculator(cache=runner.cache,
+                                                  split_components=True)
+    return _exact_ave_dist("exact_ave_lp_vertex_cover_dist", ensemble,
+                           _lp_vertex_cover_dist, (dist_calc,), runner)
+
+
+def _exact_ave_dist(name, ensemble, compute, args, runner):
+    "列挙したグラフGのcompute(G, *args)を確率で重み付けして足し合わせる"
+
+    graphs = list(ensemble.enumerate_graphs())
+
+    print("""= {} =
+input:
+ * ensemble: {}
+ * num_of_graphs: {} (isomorphism classes)
+output:
+ * {}""".format(name, ensemble, len(graphs), name[len("exact_"):]))
+
+    sum_dist = Counter()
+    dists = runner.map_graphs(compute, args, [G for G, prob in graphs])
+    for i, dist in enumerate(dists):
+        prob = graphs[i][1]
+        for key, value in dist.items():
+            sum_dist[key] += prob * value
+    return sum_dist
 
 
 
@@ -103,16 +568,38 @@ def count_one_half(values):
     return counter[1/2]
 
 
-def ip_lp_ensemble(ensemble, num_of_trials):
-    "アンサンブルにおける最小頂点被覆問題のIP解とLP解を比較する"
+def _ip_lp_trial(ensemble, solver):
+    G = _generate(ensemble.generate_graph)
 
-    sum_num_of_one_half = 0
-    sum_lp_opt_value = 0.0
-    sum_ip_opt_value = 0.0
-    sum_opt_ratio = 0.0
+    with solver.session(G) as session:
+        lp_solution = session.lp_solve()
+        num_of_one_half = count_one_half(lp_solution.values())
+        lp_opt_value = lp_solution.opt_value()
+
+        ip_solution = session.ip_solve()
+        ip_opt_value = ip_solution.opt_value()
+
+    return num_of_one_half, lp_opt_value, ip_opt_value
+
+
+def ip_lp_ensemble(ensemble, num_of_trials, runner=None, solver=None):
+    """アンサンブルにおける最小頂点被覆問題のIP解とLP解を比較する
+
+    solverはVertexCoverSolverで，省略するとCPLEXを使う．平均値には標準誤差
+    （キーの末尾が_stderr）を，確率にはWilsonスコア区間（キーの末尾が
+    _interval）を付けて返す．
+    """
+
+    runner = runner or TrialRunner()
+    num_of_one_half = fjutil.RunningMean()
+    lp_opt_value = fjutil.RunningMean()
+    ip_opt_value = fjutil.RunningMean()
+    opt_ratio = fjutil.RunningMean()
+    difference_opt = fjutil.RunningMean()
+    means = [num_of_one_half, lp_opt_value, ip_opt_value, opt_ratio,
+             difference_opt]
     count_lp_equal_ip = 0
-    sum_difference_opt = 0.0
-    solver = fjgraph.VertexCoverSolver()
+    solver = solver or fjgraph.VertexCoverSolver()
 
     print("= ip_lp_ensemble =")
     print("""input:
@@ -127,49 +614,51 @@ def ip_lp_ensemble(ensemble, num_of_trials):
  * lp_equal_ip_prob
  * ave_difference_opt""")
 
-    progress_bar = fjutil.ProgressBar("Calculation", 80)
-    progress_bar.begin()
-    for i in range(num_of_trials):
-        G = ensemble.generate_graph()
-
-        lp_solution = solver.lp_solve(G)
-        num_of_one_half = count_one_half(lp_solution.values())
-        lp_opt_value = lp_solution.opt_value()
-
-        ip_solution = solver.ip_solve(G)
-        ip_opt_value = ip_solution.opt_value()
+    def converged(rel_error):
+        if count_lp_equal_ip > 0 and not _prob_converged(
+                count_lp_equal_ip, lp_opt_value.n, rel_error):
+            return False
+        return _means_converged(means, rel_error)
 
-        sum_num_of_one_half += num_of_one_half
-        sum_opt_ratio += lp_opt_value / ip_opt_value
-        sum_lp_opt_value += lp_opt_value
-        sum_ip_opt_value += ip_opt_value
-        sum_difference_opt += ip_opt_value - lp_opt_value
-        if lp_opt_value == ip_opt_value:
+    for num_of_one_half_value, lp_opt, ip_opt in runner.run(
+            _ip_lp_trial, (ensemble, solver), num_of_trials,
+            ("ip_lp_ensemble", ensemble), converged):
+        num_of_one_half.add(num_of_one_half_value)
+        opt_ratio.add(lp_opt / ip_opt)
+        lp_opt_value.add(lp_opt)
+        ip_opt_value.add(ip_opt)
+        difference_opt.add(ip_opt - lp_opt)
+        if lp_opt == ip_opt:
             count_lp_equal_ip += 1
-        progress_bar.write(i / num_of_trials)
-    progress_bar.end()
     print()
 
     # 結果返却
-    ave_num_of_one_half = sum_num_of_one_half / num_of_trials
-    ave_opt_ration = sum_opt_ratio / num_of_trials
+    num_of_results = lp_opt_value.n
     ave_ratio_of_one_half = \
-        ave_num_of_one_half / ensemble.num_of_nodes()
-    ave_lp_opt_value = sum_lp_opt_value / num_of_trials
-    ave_ip_opt_value = sum_ip_opt_value / num_of_trials
-    lp_equal_ip_prob = count_lp_equal_ip / num_of_trials
-    ave_difference_opt = sum_difference_opt / num_of_trials
-    return {"ave_num_of_one_half": ave_num_of_one_half,
+        num_of_one_half.mean() / ensemble.num_of_nodes()
+    return {"num_of_trials": num_of_results,
+            "ave_num_of_one_half": num_of_one_half.mean(),
+            "ave_num_of_one_half_stderr": num_of_one_half.stderr(),
             "ave_num_of_one_half_ratio": ave_ratio_of_one_half,
-            "ave_opt_ration": ave_opt_ration,
-            "ave_lp_opt_value": ave_lp_opt_value,
-            "ave_ip_opt_value": ave_ip_opt_value,
-            "lp_equal_ip_prob": lp_equal_ip_prob,
-            "ave_difference_opt": ave_difference_opt}
+            "ave_opt_ration": opt_ratio.mean(),
+            "ave_opt_ration_stderr": opt_ratio.stderr(),
+            "ave_lp_opt_value": lp_opt_value.mean(),
+            "ave_lp_opt_value_stderr": lp_opt_value.stderr(),
+            "ave_ip_opt_value": ip_opt_value.mean(),
+            "ave_ip_opt_value_stderr": ip_opt_value.stderr(),
+            "lp_equal_ip_prob": count_lp_equal_ip / num_of_results,
+            "lp_equal_ip_prob_interval": fjutil.wilson_interval(
+                count_lp_equal_ip, num_of_results),
+            "ave_difference_opt": difference_opt.mean(),
+            "ave_difference_opt_stderr": difference_opt.stderr()}
+
 
+def prob_dist_min_vertex_cover(ensemble, num_of_trials, runner=None,
+                               solver=None):
+    """最小頂点被覆問題のIP-最適値の確率分布を実験的に求める
 
-def prob_dist_min_vertex_cover(ensemble, num_of_trials):
-    "最小頂点被覆問題のIP-最適値の確率分布を実験的に求める"
+    solverはVertexCoverSolverで，省略するとCPLEXを使う．
+    """
 
     print("= prob_min_vertex_cover =")
     print("""input:
@@ -178,11 +667,17 @@ def prob_dist_min_vertex_cover(ensemble, num_of_trials):
     print("""output:
  * prob_dist_min_vertex_cover""")
 
-    return _prob_dist_min_vertex_cover(ensemble, num_of_trials, "IP")
+    return _prob_dist_min_vertex_cover(ensemble, num_of_trials, "IP", runner,
+                                       solver)
 
 
-def prob_dist_lp_min_vertex_cover(ensemble, num_of_trials):
-    "最小頂点被覆問題のLP-最適値の確率分布を実験的に求める"
+def prob_dist_lp_min_vertex_cover(ensemble, num_of_trials, runner=None,
+                                  solver=None):
+    """最小頂点被覆問題のLP-最適値の確率分布を実験的に求める
+
+    solverはVertexCoverSolverで，省略するとCPLEXを使う．
+    VertexCoverSolver(backend="native")ならCPLEXなしで計算できる．
+    """
 
     print("= prob_lp_min_vertex_cover =")
     print("""input:
@@ -191,36 +686,51 @@ def prob_dist_lp_min_vertex_cover(ensemble, num_of_trials):
     print("""output:
  * prob_dist_lp_min_vertex_cover""")
 
-    return _prob_dist_min_vertex_cover(ensemble, num_of_trials, "LP")
+    return _prob_dist_min_vertex_cover(ensemble, num_of_trials, "LP", runner,
+                                       solver)
+
+
+def _min_vertex_cover_trial(ensemble, solver, type):
+    return _min_vertex_cover(_generate(ensemble.generate_graph), solver, type)
 
 
-def _prob_dist_min_vertex_cover(ensemble, num_of_trials, type="IP"):
+def _min_vertex_cover(G, solver, type):
+    if type == "IP":
+        solution = solver.ip_solve(G)
+    else:
+        solution = solver.lp_solve(G)
+    return solution.opt_value()
+
+
+def _prob_dist_min_vertex_cover(ensemble, num_of_trials, type="IP",
+                                runner=None, solver=None):
     "最小頂点被覆問題のIP-最適値もしくはLP-最適値の確率分布を実験的に求める"
 
+    if type not in ("IP", "LP"):
+        raise ExperimentError(u"typeは'IP'もしくは'LP'でなければいけません")
+
+    runner = runner or TrialRunner()
     sum_dist = Counter()
-    solver = fjgraph.VertexCoverSolver()
-    progress_bar = fjutil.ProgressBar("Calculation", 80)
-
-    progress_bar.begin()
-    for i in range(num_of_trials):
-        G = ensemble.generate_graph()
-        if type == "IP":
-            solution = solver.ip_solve(G)
-        elif type == "LP":
-            solution = solver.lp_solve(G)
-        else:
-            raise ExperimentError(u"typeは'IP'もしくは'LP'でなければいけません")
-        opt_value = solution.opt_value()
+    solver = solver or fjgraph.VertexCoverSolver()
+
+    num_of_results = 0
+
+    def converged(rel_error):
+        return _tail_probs_converged(sum_dist, num_of_results, rel_error)
+
+    for opt_value in runner.run(_min_vertex_cover_trial,
+                                (ensemble, solver, type), num_of_trials,
+                                ("prob_dist_min_vertex_cover:" + type,
+                                 ensemble), converged):
         sum_dist[round(opt_value, 1)] += 1 # 小数点第2位以下は誤差
-        progress_bar.write(i / num_of_trials)
-    progress_bar.end()
+        num_of_results += 1
 
     return dict(
-        (key, value / num_of_trials) for key, value in sum_dist.items()
+        (key, value / num_of_results) for key, value in sum_dist.items()
     )
 
 
-def prob_dist_global_min_cut(ensemble, num_of_trials):
+def prob_dist_global_min_cut(ensemble, num_of_trials, runner=None):
     "全域最小カット重みの確率分布を実験的に求める"
 
     print("= prob_dist_global_min_cut =")
@@ -230,10 +740,10 @@ def prob_dist_global_min_cut(ensemble, num_of_trials):
     print("""output:
  * prob_dist_global_min_cut""")
 
-    return _prob_dist_min_cut(ensemble, num_of_trials, type="global")
+    return _prob_dist_min_cut(ensemble, num_of_trials, "global", runner)
 
 
-def prob_dist_st_min_cut(ensemble, num_of_trials):
+def prob_dist_st_min_cut(ensemble, num_of_trials, runner=None):
     "s-t最小カット重みの確率分布を実験的に求める"
 
     print("= prob_dist_st_min_cut =")
@@ -243,33 +753,281 @@ def prob_dist_st_min_cut(ensemble, num_of_trials):
     print("""output:
  * prob_dist_st_min_cut""")
 
-    return _prob_dist_min_cut(ensemble, num_of_trials, type="st")
+    return _prob_dist_min_cut(ensemble, num_of_trials, "st", runner)
+
+
+def _min_cut_trial(ensemble, calc, type):
+    return _min_cut(_generate(ensemble.generate_compact_graph), calc, type)
 
 
-def _prob_dist_min_cut(ensemble, num_of_trials, type="global"):
+def _min_cut(G, calc, type):
+    if type == "st":
+        return calc.st_mincut(G, 0, 1)
+    else:
+        return calc.global_mincut(G, algorithm="stoer_wagner")
+
+
+def _prob_dist_min_cut(ensemble, num_of_trials, type="global", runner=None):
     "s-t最小カット重みもしくは全域最小カット重みの確率分布を実験的に求める"
 
+    if type not in ("st", "global"):
+        raise ExperimentError(u"typeは'st'もしくは'global'でなければいけません")
+
+    runner = runner or TrialRunner()
     sum_dist = Counter()
-    calc = fjgraph.MinCutCalculator()
-    progress_bar = fjutil.ProgressBar("Calculation", 80)
-
-    progress_bar.begin()
-    for i in range(num_of_trials):
-        G = ensemble.generate_graph()
-        if type == "st":
-            min_cut = calc.st_mincut(G, 0, 1)
-        elif type == "global":
-            min_cut = calc.global_mincut(G)
-        else:
-            raise ExperimentError(u"typeは'st'もしくは'global'でなければいけません")
+    calc = fjgraph.MinCutCalculator(cache=runner.cache)
+
+    num_of_results = 0
+
+    def converged(rel_error):
+        return _tail_probs_converged(sum_dist, num_of_results, rel_error)
+
+    for min_cut in runner.run(_min_cut_trial, (ensemble, calc, type),
+                              num_of_trials,
+                              ("prob_dist_min_cut:" + type, ensemble),
+                              converged):
         sum_dist[min_cut] += 1
-        progress_bar.write(i / num_of_trials)
-    progress_bar.end()
+        num_of_results += 1
 
     return dict(
-        (key, value / num_of_trials) for key, value in sum_dist.items()
+        (key, value / num_of_results) for key, value in sum_dist.items()
     )
 
 
+def rare_event_prob_dist_min_cut(ensemble, num_of_trials, delta,
+                                 type="global", runner=None, rho=0.1,
+                                 max_iterations=10):
+    """最小カット重みがx以上の確率の分布を，重点サンプリングで求める
+
+    typeは"global"か"st"．確率が小さいdelta付近の値を精度よく求めるためのもの．
+    詳しくは_rare_event_tail_prob_distを参照．
+    """
+
+    if type not in ("st", "global"):
+        raise ExperimentError(u"typeは'st'もしくは'global'でなければいけません")
+
+    print("= rare_event_prob_dist_min_cut =")
+    print("""input:
+ * ensemble: {}
+ * num_of_trials: {}
+ * delta: {}
+ * type: {}""".format(ensemble, num_of_trials, delta, type))
+    print("""output:
+ * tail_prob_dist_min_cut""")
+
+    runner = runner or TrialRunner()
+    calc = fjgraph.MinCutCalculator(cache=runner.cache)
+    return _rare_event_tail_prob_dist(
+        ensemble, num_of_trials, delta, _min_cut, (calc, type),
+        "rare_event_prob_dist_min_cut:" + type, runner, rho, max_iterations)
+
+
+def rare_event_prob_dist_min_vertex_cover(ensemble, num_of_trials, delta,
+                                          type="IP", runner=None, solver=None,
+                                          rho=0.1, max_iterations=10):
+    """最小頂点被覆問題のIP-最適値もしくはLP-最適値がx以上の確率の分布を，重点
+    サンプリングで求める
+
+    solverはVertexCoverSolverで，省略するとCPLEXを使う．詳しくは
+    _rare_event_tail_prob_distを参照．
+    """
+
+    if type not in ("IP", "LP"):
+        raise ExperimentError(u"typeは'IP'もしくは'LP'でなければいけません")
+
+    print("= rare_event_prob_dist_min_vertex_cover =")
+    print("""input:
+ * ensemble: {}
+ * num_of_trials: {}
+ * delta: {}
+ * type: {}""".format(ensemble, num_of_trials, delta, type))
+    print("""output:
+ * tail_prob_dist_min_vertex_cover""")
+
+    runner = runner or TrialRunner()
+    solver = solver or fjgraph.VertexCoverSolver()
+    return _rare_event_tail_prob_dist(
+        ensemble, num_of_trials, delta, _rounded_min_vertex_cover,
+        (solver, type), "rare_event_prob_dist_min_vertex_cover:" + type,
+        runner, rho, max_iterations)
+
+
+def _rounded_min_vertex_cover(G, solver, type):
+    return round(_min_vertex_cover(G, solver, type), 1) # 小数点第2位以下は誤差
+
+
+def _tilted_trial(ensemble, theta, statistic, args, with_steps):
+    steps = Counter() if with_steps else None
+    G, log_ratio = _generate(ensemble.generate_tilted_compact_graph, theta,
+                             steps)
+    return statistic(G, *args), log_ratio, steps
+
+
+def _rare_event_tail_prob_dist(ensemble, num_of_trials, delta, statistic,
+                               args, name, runner, rho, max_iterations):
+    """statistic(G, *args)がx以上になる確率を，交差エントロピー法で傾けた手の
+    つなぎ方からの重点サンプリングで求める
+
+    ensembleはSpecifiedDegreeDistEnsembleでなければならない．まず傾き
+    thetaを(0, 0)として，num_of_trials個のグラフの値の上位rhoの分位点（前の
+    水準より上がらなければ，前の水準より大きい最小の値）を次の水準とし，水準以上になったグラフの尤度比を重みとして，それらのグラフの手の
+    つなぎ方の尤度が最大になるようにthetaを更新する．水準がdeltaに届くか，
+    max_iterations回繰り返したら，そのthetaでnum_of_trials個のグラフを生成
+    し，尤度比で重み付けした平均で確率を求める．各回と最後の推定は別の試行番
+    号（したがって別の乱数列）を使うので，推定に使うグラフはthetaを決めたグラ
+    フと独立であり，thetaが有限なので推定は不偏である．
+
+    尤度比の分散は傾けた先から遠いxほど大きくなり，標準誤差の推定も当てにな
+    らなくなる．そのため重点サンプリングの推定値は最後の水準以上のxにだけ使い，
+    それより小さいxには傾けていない最初の回のグラフの割合（ふつうのモンテカ
+    ルロ法の推定値）を使う．
+
+    次のキーを持つdictを返す．
+
+    * tail_prob_dist: {x: xに対するx以上の確率の推定値}
+    * tail_prob_stderr: {x: その標準誤差}
+    * importance_sampling_from: 重点サンプリングの推定値を使った最小のx
+    * theta: 使った傾き
+    * levels: 交差エントロピー法の各回の水準
+    * ess: 尤度比の有効サンプルサイズ (Σw)^2 / Σw^2
+    * tail_ess: 値がdelta以上のグラフだけについての有効サンプルサイズ
+    * num_of_trials: 推定に使ったグラフの数
+    """
+
+    if not isinstance(ensemble, fjgraph.SpecifiedDegreeDistEnsemble):
+        raise ExperimentError(
+            u"重点サンプリングはSpecifiedDegreeDistEnsembleでしか使えません")
+
+    def run_stage(stage, trial_args, key):
+        # 段階stageは試行stage * num_of_trialsからのnum_of_trials個を使う
+        return list(runner.run(_tilted_trial, trial_args,
+                               (stage + 1) * num_of_trials, key,
+                               first=stage * num_of_trials))
+
+    theta = (0.0, 0.0)
+    levels = []
+    plain_values = []
+    for iteration in range(max_iterations):
+        results = run_stage(
+            iteration, (ensemble, theta, statistic, args, True),
+            ("{}:ce:{:.6}:{:.6}".format(name, theta[0], theta[1]), ensemble))
+        values = sorted(value for value, log_ratio, steps in results)
+        if iteration == 0:
+            plain_values = values
+        index = min(len(values), int(math.ceil((1 - rho) * len(values))))
+        level = values[max(index - 1, 0)]
+        if levels and level <= levels[-1]:
+            # 値が離散的なので分位点が上がらないことがある．そのときは前の
+            # 水準より大きい値のうち最小のものを水準にする
+            larger = [value for value in values if value > levels[-1]]
+            if not larger:
+                print(u"warning: 水準がdeltaに届かなかった")
+                print()
+                break
+            level = larger[0]
+        level = min(delta, level)
+        levels.append(level)
+
+        elite = [(log_ratio, steps) for value, log_ratio, steps in results
+                 if value >= level]
+        max_log_ratio = max(log_ratio for log_ratio, steps in elite)
+        theta = _fit_tilting(
+            [(math.exp(log_ratio - max_log_ratio), steps)
+             for log_ratio, steps in elite], theta)
+        print("cross-entropy iteration {}: level={} theta=({:.4}, {:.4})"
+              .format(iteration, level, theta[0], theta[1]))
+        print()
+        if level >= delta:
+            break
+    else:
+        print(u"warning: 水準がdeltaに届かなかった")
+        print()
+
+    results = run_stage(
+        max_iterations, (ensemble, theta, statistic, args, False),
+        ("{}:is:{:.6}:{:.6}".format(name, theta[0], theta[1]), ensemble))
+    ratios = [(value, math.exp(log_ratio))
+              for value, log_ratio, steps in results]
+
+    boundary = levels[-1] if plain_values else float("-inf")
+    tail_prob_dist = {}
+    tail_prob_stderr = {}
+    for x in set([value for value, ratio in ratios] + plain_values + [delta]):
+        mean = fjutil.RunningMean()
+        if x >= boundary:
+            for value, ratio in ratios:
+                mean.add(ratio if value >= x else 0.0)
+        else:
+            for value in plain_values:
+                mean.add(1.0 if value >= x else 0.0)
+        tail_prob_dist[x] = mean.mean()
+        tail_prob_stderr[x] = mean.stderr()
+
+    return {"tail_prob_dist": tail_prob_dist,
+            "tail_prob_stderr": tail_prob_stderr,
+            "theta": theta,
+            "levels": levels,
+            "importance_sampling_from": boundary,
+            "ess": _effective_sample_size([r for v, r in ratios]),
+            "tail_ess": _effective_sample_size(
+                [r for v, r in ratios if v >= delta]),
+            "num_of_trials": len(ratios)}
+
+
+def _effective_sample_size(weights):
+    "重みの有効サンプルサイズ (Σw)^2 / Σw^2"
+
+    sum_of_squares = sum(w * w for w in weights)
+    if sum_of_squares == 0:
+        return 0.0
+    return sum(weights) ** 2 / sum_of_squares
+
+
+def _fit_tilting(samples, theta, penalty=1e-3, iterations=50):
+    """重み付きのグラフの手のつなぎ方の尤度を最大にする傾きを求める
+
+    samplesは(重み, generate_tilted_compact_graphのsteps)のリスト．各段階で
+    分類kの手が選ばれる確率はcounts[k] exp(theta_k) / Σ_l counts[l]
+    exp(theta_l)（OTHERの傾きは0）なので，対数尤度はthetaについて凹になる．
+    Newton法で解く．候補が一度も選ばれなかった分類の傾きが発散しないよう，重
+    みの合計のpenalty倍の係数で2乗の罰則を付ける．
+    """
+
+    ensemble_class = fjgraph.SpecifiedDegreeDistEnsemble
+    kinds = (ensemble_class.LOOP, ensemble_class.MULTI)
+    merged = Counter()
+    for weight, steps in samples:
+        for key, count in steps.items():
+            merged[key] += weight * count
+    regularization = penalty * sum(merged.values())
+
+    theta = list(theta)
+    for iteration in range(iterations):
+        factors = [1.0, math.exp(theta[0]), math.exp(theta[1])]
+        gradient = [-regularization * theta[0], -regularization * theta[1]]
+        hessian = [[regularization, 0.0], [0.0, regularization]]
+        for (kind, num_loop, num_multi, num_other), weight in merged.items():
+            counts = [num_other, num_loop, num_multi]
+            total = sum(c * f for c, f in zip(counts, factors))
+            probs = [counts[k] * factors[k] / total for k in kinds]
+            for j in range(2):
+                gradient[j] += weight * ((kind == kinds[j]) - probs[j])
+                for l in range(2):
+                    hessian[j][l] += weight * (
+                        (j == l) * probs[j] - probs[j] * probs[l])
+
+        # hessianは対数尤度のヘッセ行列の符号を反転したもの（正定値）
+        det = hessian[0][0] * hessian[1][1] - hessian[0][1] * hessian[1][0]
+        step = [(hessian[1][1] * gradient[0] - hessian[0][1] * gradient[1])
+                / det,
+                (hessian[0][0] * gradient[1] - hessian[1][0] * gradient[0])
+                / det]
+        scale = min(1.0, 2.0 / max(abs(step[0]), abs(step[1]), 1e-300))
+        theta = [theta[0] + scale * step[0], theta[1] + scale * step[1]]
+        if max(abs(step[0]), abs(step[1])) < 1e-8:
+            break
+    return tuple(theta)
+
+
 class ExperimentError(Exception):
     pass
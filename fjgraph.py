@@ -15,8 +15,19 @@
 from __future__ import division, print_function
 import networkx
 import random
+import heapq
+import math
+import array
 import itertools
-from collections import Counter
+import multiprocessing
+import threading
+import copy
+import fjutil
+from collections import Counter, OrderedDict, deque
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 
 def degree_dist(G):
@@ -25,30 +36,244 @@ def degree_dist(G):
     return Counter(networkx.degree(G).values())
 
 
+class IsomorphismCache(object):
+    """同型なグラフに対する計算結果を使い回すためのキャッシュ
+
+    グラフはWeisfeiler-Lehmanハッシュで振り分け，ハッシュが等しいものどうしは
+    厳密な同型判定で比べる．結果は最大maxsize個まで保持し，あふれたときは最も
+    長く使われていないものから捨てる（LRU）．ヒット数とミス数はhits, missesで
+    分かる．
+    """
+
+    # Weisfeiler-Lehmanハッシュの色の更新回数
+    _wl_iterations = 3
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 番号 -> (バケツ, キーグラフ, 結果)
+        self._buckets = {}  # (計算名, ハッシュ) -> 番号のリスト
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getstate__(self):
+        # 保持している結果は別のプロセスに持ち出さない
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state["maxsize"])
+
+    def get_or_compute(self, name, G, compute, marks=(), weighted=False):
+        """計算nameのGに対する結果を返す
+
+        キャッシュに同型なグラフの結果がなければcompute()で計算して保持する．
+        marksは区別する頂点（s-tカットのs, tなど）のリストで，同型写像はこれら
+        を同じ順番の頂点に写すものに限る．weightedがTrueのときは辺の重み
+        （"weight"属性）も区別する．
+        """
+
+        key_graph = self._key_graph(G, marks, weighted)
+        bucket = (name, self._wl_hash(key_graph))
+        for entry_id in self._buckets.get(bucket, ()):
+            graph, result = self._entries[entry_id][1:]
+            if self._is_isomorphic(graph, key_graph, marks, weighted):
+                self.hits += 1
+                self._entries[entry_id] = self._entries.pop(entry_id)
+                return copy.copy(result)
+
+        self.misses += 1
+        result = compute()
+        if self.maxsize > 0:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (bucket, key_graph, copy.copy(result))
+            self._buckets.setdefault(bucket, []).append(entry_id)
+            while len(self._entries) > self.maxsize:
+                old_id, (old_bucket, _, _) = self._entries.popitem(last=False)
+                self._buckets[old_bucket].remove(old_id)
+                if not self._buckets[old_bucket]:
+                    del self._buckets[old_bucket]
+        return result
+
+    @staticmethod
+    def _key_graph(G, marks, weighted):
+        "頂点に印（mark），辺に重み（weight）だけを持たせたMultiGraphを作る"
+
+        key_graph = networkx.MultiGraph()
+        for v in G.nodes():
+            key_graph.add_node(v, mark=-1)
+        for i, v in enumerate(marks):
+            key_graph.node[v]["mark"] = i
+        for u, v, attr in G.edges(data=True):
+            if weighted and "weight" in attr:
+                weight = (1, attr["weight"])
+            else:
+                weight = (0, 0)
+            key_graph.add_edge(u, v, weight=weight)
+        return key_graph
+
+    def _wl_hash(self, key_graph):
+        colors = {}
+        for v in key_graph.nodes():
+            loops = sorted(attr["weight"] for attr in
+                           key_graph[v].get(v, {}).values())
+            colors[v] = hash((key_graph.node[v]["mark"], tuple(loops)))
+
+        for i in range(self._wl_iterations):
+            new_colors = {}
+            for v in key_graph.nodes():
+                neighbors = []
+                for u, edges in key_graph[v].items():
+                    if u == v:
+                        continue
+                    for attr in edges.values():
+                        neighbors.append((colors[u], attr["weight"]))
+                new_colors[v] = hash((colors[v], tuple(sorted(neighbors))))
+            colors = new_colors
+
+        return hash((key_graph.number_of_nodes(),
+                     key_graph.number_of_edges(),
+                     tuple(sorted(colors.values()))))
+
+    @staticmethod
+    def _is_isomorphic(G1, G2, marks, weighted):
+        node_match = None
+        if marks:
+            node_match = lambda a, b: a["mark"] == b["mark"]
+        edge_match = None
+        if weighted:
+            edge_match = lambda a, b: (
+                sorted(attr["weight"] for attr in a.values()) ==
+                sorted(attr["weight"] for attr in b.values()))
+        return networkx.is_isomorphic(G1, G2, node_match, edge_match)
+
+
+def _cached(cache, name, G, compute, marks=(), weighted=False):
+    "cacheがNoneでなければcacheを使ってcompute()の結果を求める"
+
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(name, G, compute, marks, weighted)
+
+
 class MinCutCalculator(object):
-    "最小カット重みを求めるためのクラス"
+    """最小カット重みを求めるためのクラス
+
+    グラフはnetworkxのグラフかCompactGraphで与える．cacheにIsomorphismCacheを
+    指定すると，同型なグラフの結果を使い回す．
+    """
+
+    def __init__(self, cache=None):
+        self._cache = cache
 
     def _simplify_multigraph(self, graph):
         if not isinstance(graph, networkx.MultiGraph):
             raise FJGraphError("MultiGraphじゃない")
-        simple_graph = networkx.Graph()
-        simple_graph.add_nodes_from(graph.nodes())
-        for u, v in graph.edges():
-            if u == v: continue  # 自己ループ削除
-            if simple_graph.has_edge(u, v): continue
-            attrs = graph[u][v]
-            sum_weight = 0
-            for attr in attrs.values():
-                if "weight" in attr:
-                    sum_weight += attr["weight"]
-            simple_graph.add_edge(u, v, weight=sum_weight)
-        return simple_graph
-
-    def global_mincut(self, G):
-        "全域最小カット重みを求める"
+        with fjutil.profiler().phase("simplify_multigraph"):
+            simple_graph = networkx.Graph()
+            simple_graph.add_nodes_from(graph.nodes())
+            for u, v in graph.edges():
+                if u == v: continue  # 自己ループ削除
+                if simple_graph.has_edge(u, v): continue
+                attrs = graph[u][v]
+                sum_weight = 0
+                for attr in attrs.values():
+                    if "weight" in attr:
+                        sum_weight += attr["weight"]
+                simple_graph.add_edge(u, v, weight=sum_weight)
+            return simple_graph
+
+    def global_mincut(self, G, algorithm="maxflow"):
+        """全域最小カット重みを求める
+
+        algorithmには"maxflow"（n-1回のs-t最小カットを求める）か
+        "stoer_wagner"（Stoer-Wagner法）を指定する．結果は同じだが，
+        "stoer_wagner"のほうが速い．ただし，MultiGraphでない場合に重みのない辺
+        は，"maxflow"では容量無限大，"stoer_wagner"では重み1として扱う．
+        """
+
+        if algorithm == "maxflow":
+            compute = lambda: self._global_mincut(G)
+        elif algorithm == "stoer_wagner":
+            compute = lambda: self._stoer_wagner(G)
+        else:
+            raise FJGraphError(u"未知のアルゴリズム: {}".format(algorithm))
+        with fjutil.profiler().phase("global_mincut"):
+            return _cached(self._cache, "global_mincut:" + algorithm, G,
+                           compute, weighted=True)
+
+    def _weighted_adjacency(self, G):
+        "自己ループを除き，多重辺の重みをまとめた{u: {v: 重み}}を作る"
+
+        if isinstance(G, CompactGraph):
+            adj = dict((v, {}) for v in range(G.number_of_nodes()))
+            for u, v, weight in zip(G.src, G.dst, G.weight):
+                if u == v: continue
+                adj[u][v] = adj[u].get(v, 0) + weight
+                adj[v][u] = adj[v].get(u, 0) + weight
+            return adj
 
         if isinstance(G, networkx.MultiGraph):
             G = self._simplify_multigraph(G)
+            default_weight = 0
+        else:
+            default_weight = 1
+        adj = dict((v, {}) for v in G.nodes())
+        for u, v, attr in G.edges(data=True):
+            if u == v: continue
+            weight = attr.get("weight", default_weight)
+            adj[u][v] = weight
+            adj[v][u] = weight
+        return adj
+
+    def _stoer_wagner(self, G):
+        adj = self._weighted_adjacency(G)
+        if len(adj) < 2:
+            return None
+        order = dict((v, i) for i, v in enumerate(adj))
+        mincut = None
+        while len(adj) > 1:
+            # 最小カットフェーズ: 最も強く結合した頂点を順に加えていき，最後に
+            # 加えた頂点とそれ以外とのカットを候補にする
+            keys = dict((v, 0) for v in adj)
+            heap = [(0, order[v], v) for v in adj]
+            heapq.heapify(heap)
+            added = set()
+            prev = last = None
+            while heap:
+                key, _, v = heapq.heappop(heap)
+                if v in added or -key != keys[v]: continue
+                added.add(v)
+                prev, last = last, v
+                for u, weight in adj[v].items():
+                    if u in added: continue
+                    keys[u] += weight
+                    heapq.heappush(heap, (-keys[u], order[u], u))
+            if mincut is None or keys[last] < mincut:
+                mincut = keys[last]
+
+            # 最後の2頂点を縮約する
+            for u, weight in adj.pop(last).items():
+                del adj[u][last]
+                if u == prev: continue
+                adj[prev][u] = adj[prev].get(u, 0) + weight
+                adj[u][prev] = adj[u].get(prev, 0) + weight
+        return mincut
+
+    def _networkx_graph(self, G):
+        "networkx.min_cutに渡せる重み付きの単純グラフにする"
+
+        if isinstance(G, CompactGraph):
+            G = G.to_networkx()
+        if isinstance(G, networkx.MultiGraph):
+            G = self._simplify_multigraph(G)
+        return G
+
+    def _global_mincut(self, G):
+        G = self._networkx_graph(G)
         mincut = None
         nodes = G.nodes()
         s = nodes.pop()
@@ -61,14 +286,243 @@ class MinCutCalculator(object):
     def st_mincut(self, G, s, t):
         "s-t最小カットを求める"
 
-        if isinstance(G, networkx.MultiGraph):
-            G = self._simplify_multigraph(G)
+        with fjutil.profiler().phase("st_mincut"):
+            return _cached(self._cache, "st_mincut", G,
+                           lambda: self._st_mincut(G, s, t),
+                           marks=(s, t), weighted=True)
+
+    def _st_mincut(self, G, s, t):
+        G = self._networkx_graph(G)
         return networkx.min_cut(G, s, t, capacity="weight")
 
 
-class VertexCoverDistCalculator(object):
+def _run_shard(task):
+    "ExhaustiveDistCalculator._sharded_distの1つの分担分を計算する"
+
+    calc, method_name, G, args, prefix = task
+    return getattr(calc, method_name)(G, *args, prefix=prefix)
+
+
+class ExhaustiveDistCalculator(object):
+    """割り当てを全数探索して分布を求める計算機の基底クラス
+
+    グラフはnetworkxのグラフかCompactGraphで与える．頂点は0からn-1の整数とする．
+    """
+
+    # 割り当ての数がワーカ1つあたりこれより少ないときは並列化しない（プール
+    # とのやりとりのほうが時間がかかる）
+    min_parallel_assignments = 4096
+
+    def __init__(self, workers=1, cache=None, split_components=False):
+        """workersが2以上のときは，先頭の頂点への割り当て（prefix）ごとに探索を
+        分割し，multiprocessingのプールで並列に計算する．結果は並列化しないとき
+        と同じになる．プールは最初に使うときに作って使い回すので，使い終わった
+        らclose()を呼ぶ．
+
+        cacheにIsomorphismCacheを指定すると，同型なグラフの結果を使い回す．
+
+        split_componentsがTrueのときは，Gを連結成分に分けて成分ごとに分布を計
+        算し，それらを畳み込む（キーの和ごとに個数の積を足し合わせる）．孤立点
+        と孤立した辺の分布は式で求める．cacheは成分ごとに使う．
+        """
+
+        self._workers = workers
+        self._cache = cache
+        self._split_components = split_components
+        self._pool = None
+
+    def __getstate__(self):
+        # プールはワーカプロセスに渡せないので持ち出さない
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+    def close(self):
+        "並列計算に使ったプールを終了する"
+
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def _components(self, G, first=()):
+        """Gの連結成分ごとに，頂点を0から付け直したCompactGraphを作る
+
+        (成分のグラフ, 元の頂点のリスト)のリストを返す．成分の頂点は番号順に並
+        べるが，firstに含まれる頂点はその順番で先頭に置く．
+        """
+
+        n = G.number_of_nodes()
+        parent = list(range(n))
+
+        def find(v):
+            while parent[v] != v:
+                parent[v] = parent[parent[v]]
+                v = parent[v]
+            return v
+
+        edges = G.edges()
+        for u, v in edges:
+            parent[find(u)] = find(v)
+
+        members = OrderedDict()
+        first = list(OrderedDict.fromkeys(first))
+        for v in first + [v for v in range(n) if v not in first]:
+            members.setdefault(find(v), []).append(v)
+        component_edges = dict((root, ([], [])) for root in members)
+        for u, v in edges:
+            src, dst = component_edges[find(u)]
+            src.append(u)
+            dst.append(v)
+
+        components = []
+        for root, nodes in members.items():
+            index = dict((v, i) for i, v in enumerate(nodes))
+            src, dst = component_edges[root]
+            H = CompactGraph(len(nodes), [index[u] for u in src],
+                             [index[v] for v in dst])
+            components.append((H, nodes))
+        return components
+
+    @staticmethod
+    def _convolve(a, b):
+        "分布a, bの畳み込み（キーは整数か整数のタプル）"
+
+        ret = Counter()
+        for x, c in a.items():
+            for y, d in b.items():
+                if isinstance(x, tuple):
+                    key = tuple(i + j for i, j in zip(x, y))
+                else:
+                    key = x + y
+                ret[key] += c * d
+        return ret
+
+    @staticmethod
+    def _isolated_edges(H):
+        "Hが2頂点の間の辺（多重辺可）だけからなるとき，その本数を返す"
+
+        if H.number_of_nodes() != 2 or H.number_of_edges() == 0:
+            return None
+        for u, v in H.edges():
+            if u == v:
+                return None
+        return H.number_of_edges()
+
+    def _dist(self, name, G, compute, vertex_dist, edge_dist):
+        """Gの分布をcompute(G)で計算する
+
+        split_componentsがTrueのときは成分ごとに計算して畳み込む．vertex_dist
+        は孤立点の分布，edge_dist(k)はk本の多重辺でつながった2頂点の分布．
+        """
+
+        with fjutil.profiler().phase(name):
+            return self._uncached_dist(name, G, compute, vertex_dist,
+                                       edge_dist)
+
+    def _uncached_dist(self, name, G, compute, vertex_dist, edge_dist):
+        if not self._split_components or G.number_of_nodes() == 0:
+            return _cached(self._cache, name, G, lambda: compute(G))
+
+        ret_dist = None
+        for H, nodes in self._components(G):
+            k = self._isolated_edges(H)
+            if H.number_of_nodes() == 1 and H.number_of_edges() == 0:
+                dist = vertex_dist
+            elif k is not None:
+                dist = edge_dist(k)
+            else:
+                dist = _cached(self._cache, name, H, lambda: compute(H))
+            if ret_dist is None:
+                ret_dist = dist
+            else:
+                ret_dist = self._convolve(ret_dist, dist)
+        return ret_dist
+
+    def _shard_prefixes(self, n, generate):
+        """探索を分割するためのprefixのリストを求める
+
+        generate(p)は長さpのprefixを列挙する関数．ワーカ数の4倍以上に分割できる
+        最小のpを使う．
+        """
+
+        for p in range(n + 1):
+            prefixes = list(generate(p))
+            if self._workers <= 1 or len(prefixes) >= 4 * self._workers:
+                break
+        return prefixes
+
+    def _sharded_dist(self, method_name, G, args, prefixes,
+                      num_of_assignments):
+        """prefixesのそれぞれについてmethod_nameで分布を計算し，足し合わせる
+
+        method_nameはキーワード引数prefixを受け取るメソッドの名前．
+        num_of_assignmentsは調べる割り当ての数で，並列化するかどうかを決める
+        のに使う．
+        """
+
+        tasks = [(self, method_name, G, args, prefix) for prefix in prefixes]
+        if (self._workers <= 1 or len(tasks) <= 1 or num_of_assignments <
+                self.min_parallel_assignments * self._workers):
+            results = map(_run_shard, tasks)
+        else:
+            if self._pool is None:
+                self._pool = multiprocessing.Pool(self._workers)
+            results = self._pool.map(_run_shard, tasks, chunksize=1)
+
+        ret_dist = Counter()
+        for dist in results:
+            ret_dist.update(dist)
+        return ret_dist
+
+
+def _poly_add(a, b):
+    "係数のリストで表した多項式の和"
+
+    if len(a) < len(b):
+        a, b = b, a
+    ret = list(a)
+    for i, c in enumerate(b):
+        ret[i] += c
+    return ret
+
+
+def _poly_mul(a, b):
+    "係数のリストで表した多項式の積"
+
+    if not a or not b:
+        return []
+    ret = [0] * (len(a) + len(b) - 1)
+    for i, c in enumerate(a):
+        if c == 0: continue
+        for j, d in enumerate(b):
+            ret[i + j] += c * d
+    return ret
+
+
+def _poly_shift(a, k):
+    "多項式にx^kを掛ける"
+
+    if not a:
+        return []
+    return [0] * k + list(a)
+
+
+def _poly_pow(a, k):
+    "多項式のk乗"
+
+    ret = [1]
+    for i in range(k):
+        ret = _poly_mul(ret, a)
+    return ret
+
+
+class VertexCoverDistCalculator(ExhaustiveDistCalculator):
     "頂点被覆分布計算機"
 
+    # NumPyエンジンで一度に調べる割り当ての個数
+    _block_size = 2 ** 16
+
     def _ok_check_values(self, check_values):
         "check_valuesが頂点被覆ならばTrue"
 
@@ -77,62 +531,598 @@ class VertexCoverDistCalculator(object):
                 return False
         return True
 
-    def vertex_cover_dist(self, G):
-        "GのIP-頂点被覆分布を計算する"
+    def vertex_cover_dist(self, G, method="naive"):
+        """GのIP-頂点被覆分布を計算する
+
+        methodで計算方法を選ぶ．
+
+        * "naive": 0/1割り当てを1つずつ調べる
+        * "numpy": 割り当てを整数ビットマスクのブロックとしてNumPyでまとめて調べる
+        * "branch": 次数の大きい頂点から0/1を決めていき，0にした頂点の隣接頂
+          点を1に固定する．辺が残らなくなった部分は数え上げずに個数を計算する
+        """
 
+        if method == "naive":
+            method_name = "_vertex_cover_dist_naive"
+        elif method == "numpy":
+            method_name = "_vertex_cover_dist_numpy"
+        elif method == "branch":
+            method_name = "_vertex_cover_dist_branch"
+        else:
+            raise FJGraphError(u"methodが存在しない")
+
+        return self._dist(
+            "vertex_cover_dist", G,
+            lambda H: self._sharded_dist(
+                method_name, H, (),
+                self._shard_prefixes(
+                    H.number_of_nodes(),
+                    lambda p: itertools.product([0, 1], repeat=p)),
+                2 ** H.number_of_nodes()),
+            Counter({0: 1, 1: 1}),
+            lambda k: Counter({1: 2, 2: 1}))
+
+    def _vertex_cover_dist_naive(self, G, prefix=()):
         n = G.number_of_nodes()
         incidence_graph = IncidenceGraph(G)
         ret_dist = Counter()
 
-        for variable_values in itertools.product([0, 1], repeat=n):
+        prefix = tuple(prefix)
+        for rest in itertools.product([0, 1], repeat=n - len(prefix)):
+            variable_values = prefix + rest
             weight = sum(variable_values)
             check_values = incidence_graph.calc_check_values(variable_values)
             if self._ok_check_values(check_values):
                 ret_dist[weight] += 1
 
+        fjutil.profiler().count("assignments", 2 ** (n - len(prefix)))
         return ret_dist
 
+    def _vertex_cover_dist_numpy(self, G, prefix=()):
+        import numpy
+
+        n = G.number_of_nodes()
+        p = len(prefix)
+        # 多重辺は被覆の判定に影響しないのでまとめる
+        edges = set((min(u, v), max(u, v)) for u, v in G.edges())
+        num_of_assignments = 2 ** (n - p)
+        hist = numpy.zeros(n + 1, dtype=numpy.int64)
+
+        for start in range(0, num_of_assignments, self._block_size):
+            stop = min(start + self._block_size, num_of_assignments)
+            # ビットiが頂点p+iに割り当てる値を表す
+            masks = numpy.arange(start, stop, dtype=numpy.int64)
+            bits = [numpy.repeat(bool(value), stop - start)
+                    for value in prefix]
+            bits.extend(((masks >> i) & 1).astype(bool)
+                        for i in range(n - p))
+            covered = numpy.ones(stop - start, dtype=bool)
+            for u, v in edges:
+                covered &= bits[u] | bits[v]
+            weights = numpy.zeros(stop - start, dtype=numpy.int64)
+            for bit in bits:
+                weights += bit
+            hist += numpy.bincount(weights[covered], minlength=n + 1)
+        fjutil.profiler().count("assignments", num_of_assignments)
+
+        return Counter(dict(
+            (weight, int(count)) for weight, count in enumerate(hist) if count
+        ))
+
+    def _vertex_cover_dist_branch(self, G, prefix=()):
+        n = G.number_of_nodes()
+        adjacency = dict((v, set()) for v in range(n))
+        must_cover = set()  # 自己ループを持つ頂点
+        for u, v in G.edges():
+            if u == v:
+                must_cover.add(u)
+            else:
+                adjacency[u].add(v)
+                adjacency[v].add(u)
+
+        # prefixで決まった頂点と，それによって1に固定される頂点を除く
+        values = dict(enumerate(prefix))
+        for v in must_cover:
+            if values.get(v, 1) == 0:
+                return Counter()
+            values[v] = 1
+        for v, value in list(values.items()):
+            if value != 0: continue
+            for u in adjacency[v]:
+                if values.get(u, 1) == 0:
+                    return Counter()
+                values[u] = 1
+        remaining = frozenset(v for v in range(n) if v not in values)
+        adjacency = dict((v, frozenset(adjacency[v] & remaining))
+                         for v in remaining)
+
+        counts = self._count_vertex_covers(adjacency, remaining, {})
+        offset = sum(values.values())
+        return Counter(dict(
+            (offset + k, count) for k, count in enumerate(counts) if count
+        ))
+
+    def _count_vertex_covers(self, adjacency, remaining, memo):
+        """remainingが誘導する部分グラフの頂点被覆の個数を，大きさごとに並べ
+        たリスト（多項式の係数）で返す"""
+
+        if remaining in memo:
+            return memo[remaining]
+
+        degrees = dict((v, len(adjacency[v] & remaining)) for v in remaining)
+        max_degree = max(degrees.values()) if degrees else 0
+        if max_degree <= 1:
+            # 孤立点は(1+x)，孤立した辺は(2x+x^2)通り
+            num_of_edges = sum(degrees.values()) // 2
+            num_of_isolated = len(remaining) - 2 * num_of_edges
+            counts = _poly_mul(_poly_pow([1, 1], num_of_isolated),
+                               _poly_pow([0, 2, 1], num_of_edges))
+        else:
+            isolated = frozenset(v for v in remaining if degrees[v] == 0)
+            v = min(remaining - isolated, key=lambda v: (-degrees[v], v))
+            rest = remaining - isolated - frozenset([v])
+            neighbors = adjacency[v] & remaining
+            # vを1にする場合と，vを0にして隣接頂点をすべて1にする場合
+            counts = _poly_add(
+                _poly_shift(self._count_vertex_covers(adjacency, rest, memo),
+                            1),
+                _poly_shift(self._count_vertex_covers(
+                    adjacency, rest - neighbors, memo), len(neighbors)))
+            counts = _poly_mul(counts, _poly_pow([1, 1], len(isolated)))
+
+        memo[remaining] = counts
+        return counts
+
     def lp_vertex_cover_dist(self, G):
         "GのLP-頂点被覆分布を計算する"
 
+        return self._dist(
+            "lp_vertex_cover_dist", G,
+            lambda H: self._sharded_dist(
+                "_lp_vertex_cover_dist", H, (),
+                self._shard_prefixes(
+                    H.number_of_nodes(),
+                    lambda p: itertools.product([0, 0.5, 1], repeat=p)),
+                3 ** H.number_of_nodes()),
+            Counter({(0, 0): 1, (1, 0): 1, (0, 1): 1}),
+            lambda k: Counter({(0, 1): 2, (2, 0): 1, (1, 1): 2, (0, 2): 1}))
+
+    def _lp_vertex_cover_dist(self, G, prefix=()):
         n = G.number_of_nodes()
         incidence_graph = IncidenceGraph(G)
         ret_table = Counter()
 
-        for variable_values in itertools.product([0, 0.5, 1], repeat=n):
+        prefix = tuple(prefix)
+        for rest in itertools.product([0, 0.5, 1], repeat=n - len(prefix)):
+            variable_values = prefix + rest
             num_of_one_half = variable_values.count(0.5)
             num_of_one = variable_values.count(1)
             check_values = incidence_graph.calc_check_values(variable_values)
             if self._ok_check_values(check_values):
                 ret_table[(num_of_one_half, num_of_one)] += 1
 
+        fjutil.profiler().count("assignments", 3 ** (n - len(prefix)))
         return ret_table
 
 
+def _hopcroft_karp(adjacency, num_of_right):
+    """二部グラフの最大マッチングをHopcroft-Karp法で求める
+
+    adjacency[u]は左側の頂点uに隣接する右側の頂点のリスト．(左側の頂点の相手,
+    右側の頂点の相手)を返す．相手がいない頂点は-1．
+    """
+
+    num_of_left = len(adjacency)
+    match_left = [-1] * num_of_left
+    match_right = [-1] * num_of_right
+    while True:
+        # 相手のいない左側の頂点から，交互道の層を幅優先探索で作る
+        dist = [-1] * num_of_left
+        queue = [u for u in range(num_of_left) if match_left[u] == -1]
+        for u in queue:
+            dist[u] = 0
+        found = False
+        for u in queue:
+            for v in adjacency[u]:
+                w = match_right[v]
+                if w == -1:
+                    found = True
+                elif dist[w] == -1:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if not found:
+            break
+
+        # 層に沿った増加道を深さ優先探索で見つけて，マッチングを増やす
+        pointer = [0] * num_of_left
+        for root in range(num_of_left):
+            if match_left[root] != -1: continue
+            stack = [root]
+            path = []
+            while stack:
+                u = stack[-1]
+                while pointer[u] < len(adjacency[u]):
+                    v = adjacency[u][pointer[u]]
+                    pointer[u] += 1
+                    w = match_right[v]
+                    if w == -1:
+                        path.append(v)
+                        for x, y in zip(stack, path):
+                            match_left[x] = y
+                            match_right[y] = x
+                        stack = []
+                        break
+                    if dist[w] == dist[u] + 1:
+                        path.append(v)
+                        stack.append(w)
+                        break
+                else:
+                    # uからは増加道が見つからない
+                    dist[u] = -1
+                    stack.pop()
+                    if path:
+                        path.pop()
+    return match_left, match_right
+
+
+def _half_integral_vertex_cover(adjacency):
+    """LP緩和の最小頂点被覆問題の，0, 1/2, 1だけからなる最適解を求める
+
+    adjacency[v]は頂点vに隣接する頂点のリスト（自己ループはv自身を含む）．頂点
+    vを左右の2つの頂点L_v, R_vに分けた二部二重被覆グラフの最小頂点被覆を，最大
+    マッチングからKonigの定理で求める．
+    """
+
+    n = len(adjacency)
+    match_left, match_right = _hopcroft_karp(adjacency, n)
+
+    # 相手のいない左側の頂点から交互道でたどれる頂点
+    left_reached = [match_left[u] == -1 for u in range(n)]
+    right_reached = [False] * n
+    queue = [u for u in range(n) if left_reached[u]]
+    for u in queue:
+        for v in adjacency[u]:
+            if right_reached[v]: continue
+            right_reached[v] = True
+            w = match_right[v]
+            if w != -1 and not left_reached[w]:
+                left_reached[w] = True
+                queue.append(w)
+
+    # 最小頂点被覆は，たどれなかった左側の頂点とたどれた右側の頂点
+    return [((not left_reached[v]) + right_reached[v]) / 2 for v in range(n)]
+
+
+def _min_vertex_cover(adjacency):
+    """自己ループのない単純グラフの最小頂点被覆を求める
+
+    adjacencyは{頂点: 隣接頂点の集合}．_branch_and_reduceで解く．
+    """
+
+    adjacency = dict((v, set(adjacency[v])) for v in adjacency)
+    return _branch_and_reduce(adjacency, len(adjacency) + 1, itertools.count(1))
+
+
+def _lp_kernel(adjacency):
+    """LP緩和の半整数解で値が1の頂点をadjacencyから取り除いて返す
+
+    値が0の頂点も取り除く．最小頂点被覆には，値が1の頂点をすべて含み，値が0の
+    頂点を含まないものがある（Nemhauser-Trotterの定理）．残った頂点の値はすべ
+    て1/2なので，残ったグラフの各連結成分Cの最小頂点被覆の大きさは|C|/2以上に
+    なる．
+    """
+
+    nodes = list(adjacency)
+    index = dict((v, i) for i, v in enumerate(nodes))
+    values = _half_integral_vertex_cover(
+        [[index[u] for u in adjacency[v]] for v in nodes])
+    cover = set()
+    for v, x in zip(nodes, values):
+        if x == 1:
+            cover.add(v)
+        if x != 0.5:
+            _remove_vertex(adjacency, v)
+    return cover
+
+
+def _vertex_cover_components(adjacency):
+    "adjacencyの連結成分ごとの{頂点: 隣接頂点の集合}のリスト"
+
+    components = []
+    visited = set()
+    for root in adjacency:
+        if root in visited: continue
+        visited.add(root)
+        queue = [root]
+        for v in queue:
+            for u in adjacency[v]:
+                if u not in visited:
+                    visited.add(u)
+                    queue.append(u)
+        components.append(dict((v, set(adjacency[v])) for v in queue))
+    return components
+
+
+def _remove_vertex(adjacency, v):
+    for u in adjacency.pop(v):
+        adjacency[u].discard(v)
+
+
+def _reduce_vertex_cover(adjacency, counter):
+    """次数0, 1, 2の頂点を取り除く
+
+    adjacencyを書き換え，(被覆に入れる頂点の集合, 折りたたみの記録のリスト)
+    を返す．次数2の頂点vの隣接頂点u, wが隣接していなければ，v, u, wを1つの新
+    しい頂点xにまとめる（折りたたみ）．xの番号はcounterから負の整数で取る．元
+    のグラフの最小頂点被覆は，xが被覆に入るならu, w，入らないならvを加えたも
+    のになり，大きさは1つ増える．
+    """
+
+    cover = set()
+    folds = []
+    queue = list(adjacency)
+    while queue:
+        v = queue.pop()
+        if v not in adjacency:
+            continue
+        neighbors = adjacency[v]
+        if len(neighbors) == 0:
+            del adjacency[v]
+        elif len(neighbors) == 1:
+            u, = neighbors
+            queue.extend(adjacency[u])
+            cover.add(u)
+            _remove_vertex(adjacency, u)
+        elif len(neighbors) == 2:
+            u, w = neighbors
+            if w in adjacency[u]:
+                # 三角形ならuとwを被覆に入れればよい
+                queue.extend(adjacency[u] | adjacency[w])
+                cover.update((u, w))
+                _remove_vertex(adjacency, u)
+                _remove_vertex(adjacency, w)
+            else:
+                x = -next(counter)
+                merged = (adjacency[u] | adjacency[w]) - set([v])
+                for y in (v, u, w):
+                    _remove_vertex(adjacency, y)
+                adjacency[x] = merged
+                for y in merged:
+                    adjacency[y].add(x)
+                folds.append((x, v, u, w))
+                queue.append(x)
+                queue.extend(merged)
+    return cover, folds
+
+
+def _unfold_vertex_cover(cover, folds):
+    "折りたたみを逆順に戻して，元のグラフの頂点被覆にする"
+
+    for x, v, u, w in reversed(folds):
+        if x in cover:
+            cover.remove(x)
+            cover.update((u, w))
+        else:
+            cover.add(v)
+    return cover
+
+
+def _branch_and_reduce(adjacency, limit, counter):
+    """adjacencyの最小頂点被覆のうち，大きさがlimit未満のものを返す
+
+    そのようなものがなければNoneを返す．adjacencyは書き換える．次数0, 1, 2の
+    頂点の簡約とLP緩和によるカーネル化を繰り返してから，連結成分ごとに解くか，
+    次数最大の頂点で分枝する．下界には各連結成分のLP緩和の最適値を使う．
+    """
+
+    cover, folds = _reduce_vertex_cover(adjacency, counter)
+    while adjacency:
+        kernel_cover = _lp_kernel(adjacency)
+        if not kernel_cover:
+            break
+        cover |= kernel_cover
+        sub_cover, sub_folds = _reduce_vertex_cover(adjacency, counter)
+        cover |= sub_cover
+        folds.extend(sub_folds)
+    cost = len(cover) + len(folds)
+    if not adjacency:
+        if cost >= limit:
+            return None
+        return _unfold_vertex_cover(cover, folds)
+
+    components = _vertex_cover_components(adjacency)
+    bounds = [(len(component) + 1) // 2 for component in components]
+    if cost + sum(bounds) >= limit:
+        return None
+
+    if len(components) > 1:
+        for i, component in enumerate(components):
+            rest = cost + sum(bounds[i + 1:])
+            sub_cover = _branch_and_reduce(component, limit - rest, counter)
+            if sub_cover is None:
+                return None
+            cover |= sub_cover
+            cost += len(sub_cover)
+        return _unfold_vertex_cover(cover, folds)
+
+    # 次数最大の頂点vについて，vを被覆に入れる場合とvの隣接頂点をすべて被覆
+    # に入れる場合に分ける
+    v = max(adjacency, key=lambda v: (len(adjacency[v]), v))
+    neighbors = set(adjacency[v])
+    best = None
+
+    sub_adjacency = dict((u, set(adjacency[u])) for u in adjacency)
+    _remove_vertex(sub_adjacency, v)
+    sub_cover = _branch_and_reduce(sub_adjacency, limit - cost - 1, counter)
+    if sub_cover is not None:
+        best = sub_cover | set([v])
+        limit = cost + len(best)
+
+    sub_adjacency = adjacency
+    for u in neighbors:
+        _remove_vertex(sub_adjacency, u)
+    sub_cover = _branch_and_reduce(sub_adjacency, limit - cost - len(neighbors),
+                                   counter)
+    if sub_cover is not None:
+        best = sub_cover | neighbors
+
+    if best is None:
+        return None
+    return _unfold_vertex_cover(cover | best, folds)
+
+
+def _solve_vertex_cover_in_worker(task):
+    "solve_manyのワーカプロセスで1つのグラフを解き，解の値のリストを返す"
+
+    solver, G, mode = task
+    with solver.session(G) as session:
+        return VertexCoverSolver._solve_session(session, mode).values()
+
+
 class VertexCoverSolver(object):
     """最小頂点被覆問題を解くためのクラス
 
-    計算にCPLEXを使うので，cplexモジュールが必要．
+    backendで解き方を選ぶ．
+
+    * "cplex": CPLEXで解く．cplexモジュールが必要
+    * "native": LP解を二部二重被覆グラフの最大マッチングから求める．LP緩和の
+      最適解には0, 1/2, 1だけからなるものがあり，それは二重被覆グラフの最小頂
+      点被覆から得られる．IP解はLP解によるカーネル化と，次数0, 1, 2の頂点の
+      簡約を使った分枝限定法で求める．CPLEXは使わない
     """
 
+    # solve_manyで先に作っておくセッションの数
+    _prefetch = 2
+
+    # solve_manyで並列に解くとき，ワーカプロセス1つあたりに先に渡すグラフの数
+    _window_per_job = 4
+
     def __init__(self, results_stream=None, log_stream=None,
-                 error_stream=None, warning_stream=None):
+                 error_stream=None, warning_stream=None, backend="cplex"):
+        if backend not in ("cplex", "native"):
+            raise FJGraphError(u"backendが存在しない")
         self._results_stream = results_stream
         self._log_stream = log_stream
         self._error_stream = error_stream
         self._warning_stream = warning_stream
+        self._backend = backend
 
     def lp_solve(self, G):
         "Gの最小頂点問題のLP解を出す"
 
-        values = self._solve_with_cplex(G, easing=True)
-        return VertexCoverSolver.LPSolution(G.nodes(), values)
+        with self.session(G) as session:
+            return session.lp_solve()
 
     def ip_solve(self, G):
         "Gの最小頂点問題のIP解を出す"
 
-        values = self._solve_with_cplex(G, easing=False)
-        return VertexCoverSolver.IPSolution(G.nodes(), values)
+        with self.session(G) as session:
+            return session.ip_solve()
+
+    def solve_many(self, graphs, mode="LP", jobs=1):
+        """graphsのグラフを順に解き，解をその順に返すイテレータ
+
+        modeは"LP"か"IP"．graphsはイテレータでもよく，必要な分だけ先読みする．
+        jobsが1のときは，別のスレッドでグラフを取り出して次のモデル（セッショ
+        ン）を作りながら，今のグラフを解く．jobsが2以上のときは，
+        multiprocessingのプールで並列に解く．このときsolverとグラフはワーカプ
+        ロセスに渡せるもの（ストリームを指定していないものなど）でなければなら
+        ない．
+        """
+
+        if mode not in ("LP", "IP"):
+            raise FJGraphError(u"modeは'LP'もしくは'IP'でなければいけない")
+        if jobs > 1:
+            return self._solve_many_in_pool(graphs, mode, jobs)
+        return self._solve_many_pipelined(graphs, mode)
+
+    def _solve_many_pipelined(self, graphs, mode):
+        sessions = queue.Queue(self._prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    sessions.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                for G in graphs:
+                    session = self.session(G)
+                    if not put((session, None)):
+                        session.close()
+                        return
+            except Exception as e:
+                put((None, e))
+                return
+            put((None, None))
+
+        thread = threading.Thread(target=produce)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                session, error = sessions.get()
+                if session is None:
+                    if error is not None:
+                        raise error
+                    return
+                with session:
+                    yield self._solve_session(session, mode)
+        finally:
+            stop.set()
+            thread.join()
+            # 作ったが解かなかったセッションを閉じる
+            while True:
+                try:
+                    session, error = sessions.get_nowait()
+                except queue.Empty:
+                    break
+                if session is not None:
+                    session.close()
+
+    def _solve_many_in_pool(self, graphs, mode, jobs):
+        # 解のクラスはワーカプロセスから直接は返せないので，値のリストを受け
+        # 取って作り直す
+        solution_class = (VertexCoverSolver.LPSolution if mode == "LP"
+                          else VertexCoverSolver.IPSolution)
+        pending = deque()
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for G in graphs:
+                pending.append((G.nodes(), pool.apply_async(
+                    _solve_vertex_cover_in_worker, ((self, G, mode),))))
+                if len(pending) >= jobs * self._window_per_job:
+                    nodes, result = pending.popleft()
+                    yield solution_class(nodes, result.get())
+            while pending:
+                nodes, result = pending.popleft()
+                yield solution_class(nodes, result.get())
+        finally:
+            pool.terminate()
+            pool.join()
+
+    @staticmethod
+    def _solve_session(session, mode):
+        if mode == "LP":
+            return session.lp_solve()
+        return session.ip_solve()
+
+    def session(self, G):
+        """Gについてのモデルを一度だけ作り，LP解とIP解を続けて出すための
+        セッションを返す
+
+        with文で使うか，使い終わったらclose()を呼ぶ．
+        """
+
+        with fjutil.profiler().phase("build_model"):
+            if self._backend == "native":
+                return VertexCoverSolver.NativeSession(G)
+            return VertexCoverSolver.Session(self._create_cplex_solver(), G)
 
     def _create_cplex_solver(self):
         import cplex
@@ -143,50 +1133,147 @@ class VertexCoverSolver(object):
         solver.set_error_stream(self._error_stream)
         return solver
 
-    def _solve_with_cplex(self, G, easing=False):
-        solver = self._create_cplex_solver()
-
-        # 最小化問題
-        solver.objective.set_sense(solver.objective.sense.minimize)
-
-        # 最小化したい式と変数の定義域
-        # 変数の下界はデフォルトで0.0になるので，ここでは省略している
-        if easing:
-            variable_type = solver.variables.type.continuous
-        else:
-            variable_type = solver.variables.type.binary
-        solver.variables.add(
-            # 係数リスト
-            obj=[1.0 for i in range(G.number_of_nodes())],
-            # 変数の上界リスト
-            ub=[1.0 for i in range(G.number_of_nodes())],
-            # 変数名リスト
-            names=[str(n) for n in G.nodes()],
-            # Binary IPを指定
-            types=variable_type * G.number_of_nodes()
-        )
+    class Session(object):
+        """1つのグラフについての最小頂点被覆問題のCPLEXモデル
 
-        coefficients = []
-        for i, edge in enumerate(G.edges()):
-            if edge[0] == edge[1]:  # self-loop
-                coefficients.append([[str(edge[0])], [2.0]])
-            else:
-                coefficients.append([[str(edge[0]), str(edge[1])], [1.0, 1.0]])
-
-        # 線形制約 x_i + x_j >= 1 for (x_i, x_j) in edges
-        solver.linear_constraints.add(
-            # 線形式の係数リスト
-            lin_expr=coefficients,
-            # 不等号の向き
-            senses="G" * G.number_of_edges(),
-            # 右辺の値
-            rhs=[1.0 for i in range(G.number_of_edges())],
-            # 式の名前
-            names=["c{}".format(i) for i in range(G.number_of_edges())]
-        )
+        変数と制約には名前を付けず，番号で扱う．変数iはG.nodes()のi番目の頂点
+        である．LP解を出したあとでIP解を出すと，LP解を切り上げた頂点被覆を初期
+        解（MIP start）として使う．
+        """
 
-        solver.solve()
-        return solver.solution.get_values()
+        def __init__(self, solver, G):
+            self._solver = solver
+            self._nodes = G.nodes()
+            self._lp_values = None
+            index = dict((v, i) for i, v in enumerate(self._nodes))
+            n = len(self._nodes)
+
+            # 最小化問題
+            solver.objective.set_sense(solver.objective.sense.minimize)
+
+            # 最小化したい式と変数の定義域（最初はLP緩和）
+            # 変数の下界はデフォルトで0.0になるので，ここでは省略している
+            # 型を指定するとCPLEXはMILPとして解く．最適解が複数あるときにど
+            # れが出るかが変わらないように，以前と同じく型を指定しておく
+            self._continuous = solver.variables.type.continuous
+            solver.variables.add(obj=[1.0] * n, ub=[1.0] * n,
+                                 types=self._continuous * n)
+
+            # 線形制約 x_i + x_j >= 1 for (x_i, x_j) in edges
+            coefficients = []
+            for u, v in G.edges():
+                if u == v:  # self-loop
+                    coefficients.append([[index[u]], [2.0]])
+                else:
+                    coefficients.append([[index[u], index[v]], [1.0, 1.0]])
+            solver.linear_constraints.add(
+                lin_expr=coefficients,
+                senses="G" * len(coefficients),
+                rhs=[1.0] * len(coefficients)
+            )
+
+        def lp_solve(self):
+            "LP解を出す"
+
+            solver = self._solver
+            n = len(self._nodes)
+            solver.variables.set_types([(i, self._continuous)
+                                        for i in range(n)])
+            with fjutil.profiler().phase("lp_solve"):
+                solver.solve()
+            self._lp_values = solver.solution.get_values()
+            return VertexCoverSolver.LPSolution(self._nodes, self._lp_values)
+
+        def ip_solve(self):
+            "IP解を出す"
+
+            solver = self._solver
+            n = len(self._nodes)
+            binary = solver.variables.type.binary
+            solver.variables.set_types([(i, binary) for i in range(n)])
+            if self._lp_values is not None:
+                # 1/2以上の変数を1にすると頂点被覆になる
+                start = [1.0 if value >= 0.5 - 1e-6 else 0.0
+                         for value in self._lp_values]
+                solver.MIP_starts.add([list(range(n)), start],
+                                      solver.MIP_starts.effort_level.auto)
+            with fjutil.profiler().phase("ip_solve"):
+                solver.solve()
+            values = solver.solution.get_values()
+            return VertexCoverSolver.IPSolution(self._nodes, values)
+
+        def close(self):
+            self._solver.end()
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.close()
+            return False
+
+    class NativeSession(object):
+        "CPLEXを使わずに最小頂点被覆問題を解くセッション"
+
+        def __init__(self, G):
+            self._nodes = G.nodes()
+            index = dict((v, i) for i, v in enumerate(self._nodes))
+            self._edges = [(index[u], index[v]) for u, v in G.edges()]
+
+        def lp_solve(self):
+            """LP解を出す
+
+            二部二重被覆グラフで辺(u, v)はL_u-R_vとL_v-R_uの2本の辺になる．そ
+            の最小頂点被覆Cについて，x_v = (L_vがCに含まれるか + R_vがCに含ま
+            れるか) / 2がLP緩和の最適解になる．
+            """
+
+            adjacency = self._adjacency()
+            with fjutil.profiler().phase("lp_solve"):
+                values = _half_integral_vertex_cover(
+                    [sorted(adjacency[v]) for v in range(len(self._nodes))])
+            return VertexCoverSolver.LPSolution(self._nodes, values)
+
+        def ip_solve(self):
+            """IP解を出す
+
+            自己ループのある頂点を被覆に入れたあと，_min_vertex_coverで残りの
+            グラフの最小頂点被覆を求める．
+            """
+
+            adjacency = self._adjacency()
+            cover = set()
+            for u, v in self._edges:
+                if u == v:
+                    cover.add(u)
+            for v in cover:
+                for u in adjacency.pop(v):
+                    if u != v:
+                        adjacency[u].discard(v)
+            with fjutil.profiler().phase("ip_solve"):
+                cover |= _min_vertex_cover(adjacency)
+            values = [1.0 if v in cover else 0.0
+                      for v in range(len(self._nodes))]
+            return VertexCoverSolver.IPSolution(self._nodes, values)
+
+        def _adjacency(self):
+            "多重辺をまとめた{頂点: 隣接頂点の集合}（自己ループも含む）"
+
+            adjacency = dict((v, set()) for v in range(len(self._nodes)))
+            for u, v in self._edges:
+                adjacency[u].add(v)
+                adjacency[v].add(u)
+            return adjacency
+
+        def close(self):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.close()
+            return False
 
     class Solution(object):
         "最小頂点被覆問題の解"
@@ -229,6 +1316,265 @@ class VertexCoverSolver(object):
         pass
 
 
+class CompactGraph(object):
+    """辺の配列で表したグラフ
+
+    頂点は0からn-1の整数で，辺iは(src[i], dst[i])，重みはweight[i]である．辺の
+    情報はarray('i')で持つので，networkxのグラフよりも生成が速く，メモリも少な
+    くて済む．隣接頂点はCSR形式（indptr, indices）で持ち，最初に使うときに作る．
+
+    計算機やIncidenceGraphで使うnetworkxのメソッド（nodes, edges,
+    number_of_nodesなど）を同じ名前で持つので，networkxのグラフの代わりに使え
+    る．
+    """
+
+    def __init__(self, num_of_nodes, src, dst, weight=None, multigraph=True):
+        """src, dstは辺の端点の列，weightは辺の重みの列（省略すると1）
+
+        multigraphがFalseのときは，多重辺と自己ループがないものとして扱う．
+        """
+
+        if len(src) != len(dst):
+            raise FJGraphError(u"srcとdstの長さが違う")
+        if weight is None:
+            weight = [1] * len(src)
+        if len(weight) != len(src):
+            raise FJGraphError(u"weightの長さが辺数と違う")
+        self._num_of_nodes = num_of_nodes
+        self.src = array.array("i", src)
+        self.dst = array.array("i", dst)
+        self.weight = array.array("i", weight)
+        self._multigraph = multigraph
+        self._indptr = None
+        self._indices = None
+
+    @classmethod
+    def from_networkx(cls, G):
+        "networkxのグラフから作る．重みのない辺は重み1とする"
+
+        n = G.number_of_nodes()
+        if sorted(G.nodes()) != list(range(n)):
+            raise FJGraphError(u"頂点は0からn-1の整数でなければいけない")
+        src = []
+        dst = []
+        weight = []
+        for u, v, attr in G.edges(data=True):
+            src.append(u)
+            dst.append(v)
+            weight.append(attr.get("weight", 1))
+        return cls(n, src, dst, weight, multigraph=G.is_multigraph())
+
+    def to_networkx(self):
+        "networkxのグラフ（MultiGraphかGraph）に変換する"
+
+        if self._multigraph:
+            G = networkx.MultiGraph()
+        else:
+            G = networkx.Graph()
+        G.add_nodes_from(range(self._num_of_nodes))
+        for u, v, w in zip(self.src, self.dst, self.weight):
+            G.add_edge(u, v, weight=w)
+        return G
+
+    def is_multigraph(self):
+        return self._multigraph
+
+    def number_of_nodes(self):
+        return self._num_of_nodes
+
+    def number_of_edges(self):
+        return len(self.src)
+
+    def nodes(self):
+        return list(range(self._num_of_nodes))
+
+    def edges(self, data=False):
+        if data:
+            return [(u, v, {"weight": w})
+                    for u, v, w in zip(self.src, self.dst, self.weight)]
+        return list(zip(self.src, self.dst))
+
+    @property
+    def indptr(self):
+        "CSR形式の隣接頂点の区切り．頂点vの隣接頂点はindices[indptr[v]:indptr[v+1]]"
+
+        if self._indptr is None:
+            self._build_csr()
+        return self._indptr
+
+    @property
+    def indices(self):
+        "CSR形式の隣接頂点（多重辺は重複して持ち，自己ループは1回だけ持つ）"
+
+        if self._indices is None:
+            self._build_csr()
+        return self._indices
+
+    def _build_csr(self):
+        n = self._num_of_nodes
+        indptr = array.array("i", [0] * (n + 1))
+        for u, v in zip(self.src, self.dst):
+            indptr[u + 1] += 1
+            if u != v:
+                indptr[v + 1] += 1
+        for v in range(n):
+            indptr[v + 1] += indptr[v]
+        indices = array.array("i", [0] * indptr[n])
+        position = array.array("i", indptr[:n])
+        for u, v in zip(self.src, self.dst):
+            indices[position[u]] = v
+            position[u] += 1
+            if u != v:
+                indices[position[v]] = u
+                position[v] += 1
+        self._indptr = indptr
+        self._indices = indices
+
+    def neighbors(self, v):
+        "頂点vの隣接頂点のリスト（多重辺は重複する）"
+
+        return list(self.indices[self.indptr[v]:self.indptr[v + 1]])
+
+    def degree(self, v):
+        "頂点vの次数（自己ループは2と数える）"
+
+        loops = sum(1 for u in self.neighbors(v) if u == v)
+        return self.indptr[v + 1] - self.indptr[v] + loops
+
+    def __getstate__(self):
+        # CSRは必要になったときに作り直せるので保存しない
+        state = self.__dict__.copy()
+        state["_indptr"] = None
+        state["_indices"] = None
+        return state
+
+    def __str__(self):
+        return "{}(num_of_nodes={}, num_of_edges={})".format(
+            self.__class__.__name__, self._num_of_nodes, len(self.src))
+
+
+def _canonical_form(n, edges, colors):
+    """頂点に色の付いた多重グラフの標準形を求める
+
+    edgesは{(u, v): 本数}（u <= v，自己ループも含む），colorsは各頂点の色のリ
+    スト．同型なグラフ（色を保つ同型写像で移りあうもの）に対して同じ値になる
+    (色のタプル, (u, v, 本数)のタプル)を返す．これは標準的な番号付けをした
+    グラフそのものである．
+
+    頂点の分割を隣接関係で細分化し，細分化が止まったら最初の2頂点以上の組の頂
+    点を1つずつ取り出して分岐する（individualization-refinement）．葉の番号付
+    けのうち最小のものを使う．隣接関係が同じ隣接しない2頂点は入れ替えても同じ
+    なので，片方だけで分岐する．頂点数が小さいグラフ用である．
+    """
+
+    adjacency = [{} for v in range(n)]
+    loops = [0] * n
+    for (u, v), k in edges.items():
+        if u == v:
+            loops[u] = k
+        else:
+            adjacency[u][v] = k
+            adjacency[v][u] = k
+
+    def refine(cells):
+        while True:
+            cell_of = [0] * n
+            for i, cell in enumerate(cells):
+                for v in cell:
+                    cell_of[v] = i
+            new_cells = []
+            for cell in cells:
+                if len(cell) == 1:
+                    new_cells.append(cell)
+                    continue
+                signatures = {}
+                for v in cell:
+                    signature = tuple(sorted((cell_of[u], k) for u, k in
+                                             adjacency[v].items()))
+                    signatures.setdefault(signature, []).append(v)
+                for signature in sorted(signatures):
+                    new_cells.append(signatures[signature])
+            if len(new_cells) == len(cells):
+                return new_cells
+            cells = new_cells
+
+    def search(cells):
+        cells = refine(cells)
+        for i, cell in enumerate(cells):
+            if len(cell) > 1:
+                break
+        else:
+            label = dict((cell[0], j) for j, cell in enumerate(cells))
+            return (tuple(colors[cell[0]] for cell in cells),
+                    tuple(sorted((min(label[u], label[v]),
+                                  max(label[u], label[v]), k)
+                                 for (u, v), k in edges.items())))
+
+        best = None
+        twins = set()
+        for v in cell:
+            twin = (loops[v], tuple(sorted(adjacency[v].items())))
+            if twin in twins: continue
+            twins.add(twin)
+            rest = [u for u in cell if u != v]
+            form = search(cells[:i] + [[v], rest] + cells[i + 1:])
+            if best is None or form < best:
+                best = form
+        return best
+
+    classes = {}
+    for v in range(n):
+        classes.setdefault((colors[v], loops[v]), []).append(v)
+    return search([classes[key] for key in sorted(classes)])
+
+
+def _enumerate_isomorphism_classes(n, colors, num_of_steps, transitions):
+    """1ステップに1本ずつ辺を加えていく確率過程で，num_of_steps本の辺を加えた
+    あとのグラフの分布を，同型類ごとにまとめて求める
+
+    colorsは最初の頂点の色のリスト．transitions(edges, colors)は，
+    ((u, v), 加えたあとの色のリスト, 確率)を列挙する関数で，edgesと確率は
+    頂点の番号の付け替えで変わらないものでなければならない．このとき同型なグ
+    ラフからは同型なグラフに同じ確率で移るので，同型類の代表（標準形）だけを
+    追えばよい．(標準形の辺の{(u, v): 本数}, 確率)のリストを返す．
+
+    色と隣接関係が同じ隣接しない2頂点は入れ替えても同じグラフなので，そのよう
+    な頂点の組で端点を置き換えた辺を加えたグラフは同型になる．これを使って標
+    準形を求める回数を減らす．
+    """
+
+    states = {_canonical_form(n, {}, colors): 1.0}
+    for step in range(num_of_steps):
+        new_states = {}
+        for (state_colors, state_edges), prob in states.items():
+            edges = dict(((u, v), k) for u, v, k in state_edges)
+            neighbors = [[] for v in range(n)]
+            for (u, v), k in edges.items():
+                neighbors[u].append((v, k))
+                if u != v:
+                    neighbors[v].append((u, k))
+            twins = {}
+            twin_of = [twins.setdefault(
+                (state_colors[v], tuple(sorted(neighbors[v]))), len(twins))
+                for v in range(n)]
+
+            forms = {}
+            for (u, v), new_colors, p in transitions(edges, state_colors):
+                key = (min(twin_of[u], twin_of[v]),
+                       max(twin_of[u], twin_of[v]), u == v)
+                form = forms.get(key)
+                if form is None:
+                    edge = (min(u, v), max(u, v))
+                    new_edges = dict(edges)
+                    new_edges[edge] = new_edges.get(edge, 0) + 1
+                    form = _canonical_form(n, new_edges, new_colors)
+                    forms[key] = form
+                new_states[form] = new_states.get(form, 0.0) + prob * p
+        states = new_states
+    return [(dict(((u, v), k) for u, v, k in state_edges), prob)
+            for (state_colors, state_edges), prob in sorted(states.items())]
+
+
 class GraphEnsembleFactory(object):
     "グラフアンサンブルのファクトリークラス"
 
@@ -265,6 +1611,73 @@ class GraphEnsemble(object):
 
         return None
 
+    def generate_compact_graph(self):
+        """グラフアンサンブルのインスタンスをひとつランダムにCompactGraphとして
+        生成する"""
+
+        return CompactGraph.from_networkx(self.generate_graph())
+
+    def generate_graphs(self, k, rng=None):
+        """グラフアンサンブルのインスタンスをk個まとめてランダムに生成する
+
+        辺の端点を並べた(k, m, 2)のNumPy配列（int32）を返す．i番目のインスタン
+        スは CompactGraph(n, edges[i, :, 0].tolist(), edges[i, :, 1].tolist())
+        で作れる．rngはnumpy.random.RandomStateで，省略するとrandomモジュール
+        の乱数からシードを作る．分布はgenerate_graphと同じである．
+
+        この基底クラスの実装はgenerate_compact_graphをk回呼ぶ．
+        """
+
+        import numpy
+
+        m = self.num_of_edges()
+        edges = numpy.zeros((k, m, 2), dtype=numpy.int32)
+        for i in range(k):
+            G = self.generate_compact_graph()
+            edges[i, :, 0] = G.src
+            edges[i, :, 1] = G.dst
+        return edges
+
+    def enumerate_graphs(self):
+        """グラフアンサンブルのすべてのインスタンスを，同型なものをまとめて
+        (CompactGraph, 確率)として列挙する
+
+        同型なグラフを1つにまとめるので，頂点の番号の付け方によらない量の平均
+        を正確に求めるのに使う．確率の和は1になる．インスタンスの数は頂点数と
+        辺数に対して急激に増えるので，小さいアンサンブル用である．この基底クラ
+        スの実装はFJGraphErrorを送出する．
+        """
+
+        raise FJGraphError(u"このアンサンブルのインスタンスは列挙できない")
+
+    @staticmethod
+    def _compact_graphs(n, classes):
+        "_enumerate_isomorphism_classesの結果を(CompactGraph, 確率)にする"
+
+        for edges, prob in classes:
+            src = []
+            dst = []
+            for (u, v), k in sorted(edges.items()):
+                src.extend([u] * k)
+                dst.extend([v] * k)
+            yield CompactGraph(n, src, dst), prob
+
+    @staticmethod
+    def _random_state(rng):
+        import numpy
+
+        if rng is None:
+            rng = numpy.random.RandomState(random.getrandbits(32))
+        return rng
+
+    @staticmethod
+    def _batched_permutation(rng, k, size):
+        "0からsize-1の順列をk個並べた(k, size)の配列を返す"
+
+        import numpy
+
+        return numpy.argsort(rng.random_sample((k, size)), axis=1)
+
 
 class NMGraphEnsemble(GraphEnsemble):
     "頂点数nと辺数mを指定するランダムグラフアンサンブル"
@@ -287,6 +1700,60 @@ class NMGraphEnsemble(GraphEnsemble):
             G[u][v]["weight"] = 1
         return G
 
+    def generate_graphs(self, k, rng=None):
+        import numpy
+
+        n = self._num_of_nodes
+        m = self._num_of_edges
+        rng = self._random_state(rng)
+        num_of_pairs = n * (n - 1) // 2
+        if m > num_of_pairs:
+            raise FJGraphError(u"辺数が多すぎる")
+        edges = numpy.empty((k, m, 2), dtype=numpy.int32)
+        if 2 * m > num_of_pairs:
+            # 密なときは，頂点対をすべて並べて各インスタンスでm個を選ぶ
+            heads, tails = numpy.triu_indices(n, 1)
+            chosen = self._batched_permutation(rng, k, num_of_pairs)[:, :m]
+            edges[:, :, 0] = heads[chosen]
+            edges[:, :, 1] = tails[chosen]
+            return edges
+
+        # 疎なときは，頂点対u < vをu * n + vで表して各インスタンスでm個引き，
+        # 自己ループと重複したものだけを引き直す．引き直しは頂点対の番号の付
+        # け替えで変わらないので，m個の頂点対の組は一様に選ばれる
+        keys = numpy.full((k, m), -1, dtype=numpy.int64)
+        redraw = numpy.ones((k, m), dtype=bool)
+        while redraw.any():
+            num = int(redraw.sum())
+            u = rng.randint(0, n, size=num).astype(numpy.int64)
+            v = rng.randint(0, n, size=num).astype(numpy.int64)
+            keys[redraw] = numpy.where(
+                u == v, -1, numpy.minimum(u, v) * n + numpy.maximum(u, v))
+            keys.sort(axis=1)
+            redraw = keys < 0
+            redraw[:, 1:] |= keys[:, 1:] == keys[:, :-1]
+        edges[:, :, 0] = keys // n
+        edges[:, :, 1] = keys % n
+        return edges
+
+    def enumerate_graphs(self):
+        # まだない頂点対から1つを等確率で選んで辺にすることをm回繰り返す
+        n = self._num_of_nodes
+        m = self._num_of_edges
+        num_of_pairs = n * (n - 1) // 2
+        if m > num_of_pairs:
+            raise FJGraphError(u"辺数が多すぎる")
+
+        def transitions(edges, colors):
+            p = 1 / (num_of_pairs - len(edges))
+            for u in range(n):
+                for v in range(u + 1, n):
+                    if (u, v) not in edges:
+                        yield (u, v), colors, p
+
+        return self._compact_graphs(n, _enumerate_isomorphism_classes(
+            n, (0,) * n, m, transitions))
+
     def __str__(self):
         return "{}(num_of_nodes={}, num_of_edges={})".format(
             self.__class__.__name__, self._num_of_nodes, self._num_of_edges
@@ -314,6 +1781,9 @@ class ErdosRenyiGraphEnsemble(GraphEnsemble):
             G[u][v]["weight"] = 1
         return G
 
+    def generate_graphs(self, k, rng=None):
+        raise FJGraphError(u"辺数が一定でないので辺の配列にまとめられない")
+
     def __str__(self):
         return "{}(num_of_nodes={}, edge_prob={})".format(
             self.__class__.__name__, self._num_of_nodes, self._edge_prob
@@ -342,10 +1812,44 @@ class MultiGraphEnsemble(GraphEnsemble):
         for edge in range(m):
             s = random.randint(0, n - 1)
             t = random.randint(0, n - 1)
-            G.add_edge(s, t, weght=1)
+            G.add_edge(s, t, weight=1)
 
         return G
 
+    def generate_compact_graph(self):
+        n = self._num_of_nodes
+        m = self._num_of_edges
+
+        src = array.array("i", [0] * m)
+        dst = array.array("i", [0] * m)
+        for edge in range(m):
+            src[edge] = random.randint(0, n - 1)
+            dst[edge] = random.randint(0, n - 1)
+
+        return CompactGraph(n, src, dst)
+
+    def generate_graphs(self, k, rng=None):
+        import numpy
+
+        n = self._num_of_nodes
+        m = self._num_of_edges
+        rng = self._random_state(rng)
+        return rng.randint(0, n, size=(k, m, 2)).astype(numpy.int32)
+
+    def enumerate_graphs(self):
+        # 各辺の端点はn^2通りの順序対から等確率に選ぶので，u != vの頂点対は
+        # 2 / n^2，自己ループは1 / n^2の確率になる
+        n = self._num_of_nodes
+        m = self._num_of_edges
+
+        def transitions(edges, colors):
+            for u in range(n):
+                for v in range(u, n):
+                    yield (u, v), colors, (1 if u == v else 2) / n ** 2
+
+        return self._compact_graphs(n, _enumerate_isomorphism_classes(
+            n, (0,) * n, m, transitions))
+
     def __str__(self):
         return "{}(num_of_nodes={}, num_of_edges={})".format(
             self.__class__.__name__, self._num_of_nodes, self._num_of_edges
@@ -396,18 +1900,198 @@ class SpecifiedDegreeDistEnsemble(GraphEnsemble):
 
         return G
 
+    def generate_compact_graph(self):
+        # generate_graphと同じ順番で乱数を使う
+        node_size = self.num_of_nodes()
+
+        shuffled_nodes = list(range(node_size))
+        random.shuffle(shuffled_nodes)
+        edge_num_table = []
+        for d, dist in enumerate(self.degree_dist):
+            for i in range(dist):
+                n = shuffled_nodes.pop()
+                edge_num_table.extend([n] * d)
+
+        random.shuffle(edge_num_table)
+        return CompactGraph(node_size, edge_num_table[-1::-2],
+                            edge_num_table[-2::-2])
+
+    def generate_graphs(self, k, rng=None):
+        import numpy
+
+        n = self.num_of_nodes()
+        m = self.num_of_edges()
+        rng = self._random_state(rng)
+        # 次数の小さい順に並べた頂点の「手」の列を作り，頂点の番号付けと手の
+        # 並びをインスタンスごとにランダムに並べ替えて，隣り合う手を結ぶ
+        degrees = numpy.repeat(numpy.arange(len(self.degree_dist)),
+                               self.degree_dist)
+        stubs = numpy.repeat(numpy.arange(n), degrees)
+        rows = numpy.arange(k)[:, numpy.newaxis]
+        labels = self._batched_permutation(rng, k, n)
+        order = self._batched_permutation(rng, k, 2 * m)
+        edges = labels[rows, stubs[order]]
+        return edges.reshape(k, m, 2).astype(numpy.int32)
+
+    def enumerate_graphs(self):
+        # 頂点の色を残りの手の数とし，残りの手のある最初の頂点の手を，残りの
+        # 手から等確率に選んだ相手とつなぐ．どの手から選んでも，つなぎ方は手の
+        # 完全マッチングから一様に選んだものになる
+        n = self.num_of_nodes()
+        degrees = tuple(d for d, dist in enumerate(self.degree_dist)
+                        for i in range(dist))
+
+        def transitions(edges, colors):
+            u = next(v for v in range(n) if colors[v] > 0)
+            rest = sum(colors) - 1
+            for v in range(n):
+                hands = colors[v] - (1 if v == u else 0)
+                if hands <= 0: continue
+                new_colors = list(colors)
+                new_colors[u] -= 1
+                new_colors[v] -= 1
+                yield (u, v), tuple(new_colors), hands / rest
+
+        return self._compact_graphs(n, _enumerate_isomorphism_classes(
+            n, degrees, self.num_of_edges(), transitions))
+
+    # generate_tilted_compact_graphで相手の手を分類するときの番号
+    OTHER, LOOP, MULTI = 0, 1, 2
+
+    def generate_tilted_compact_graph(self, theta=(0.0, 0.0), steps=None):
+        """手のつなぎ方を傾けた分布から，グラフをひとつCompactGraphとして生成
+        する
+
+        重点サンプリングのためのもの．残っている手を1つ取り，相手の手を次の重
+        みに比例する確率で選ぶことを繰り返す．
+
+        * 同じ頂点の手（自己ループになる）: exp(theta[0])
+        * すでに辺でつながっている頂点の手（多重辺になる）: exp(theta[1])
+        * それ以外の手: 1
+
+        theta=(0, 0)ならgenerate_compact_graphと同じ分布になる．(グラフ, 尤度
+        比の対数log(p/q))を返す．pは元の分布での，qは傾けた分布での，この手の
+        つなぎ方の確率である．stepsにCounterを渡すと，相手を選んだ各段階につい
+        て(選んだ分類, 自己ループの候補数, 多重辺の候補数, それ以外の候補数)を
+        数える．分類はOTHER, LOOP, MULTIのいずれか．
+        """
+
+        node_size = self.num_of_nodes()
+        weights = (1.0, math.exp(theta[0]), math.exp(theta[1]))
+
+        shuffled_nodes = list(range(node_size))
+        random.shuffle(shuffled_nodes)
+        stubs = []
+        for d, dist in enumerate(self.degree_dist):
+            for i in range(dist):
+                n = shuffled_nodes.pop()
+                stubs.extend([n] * d)
+
+        # positions[v]は頂点vの残っている手のstubsでの位置
+        positions = [set() for v in range(node_size)]
+        for i, v in enumerate(stubs):
+            positions[v].add(i)
+
+        def remove(i):
+            v = stubs[i]
+            last = len(stubs) - 1
+            positions[v].discard(i)
+            if i != last:
+                w = stubs[last]
+                positions[w].discard(last)
+                positions[w].add(i)
+                stubs[i] = w
+            stubs.pop()
+            return v
+
+        adjacency = [set() for v in range(node_size)]
+        src = array.array("i")
+        dst = array.array("i")
+        log_ratio = 0.0
+        while stubs:
+            u = remove(len(stubs) - 1)
+            remaining = len(stubs)
+            neighbors = [v for v in adjacency[u] if v != u]
+            counts = [0, len(positions[u]),
+                      sum(len(positions[v]) for v in neighbors)]
+            counts[self.OTHER] = remaining - counts[self.LOOP] - \
+                counts[self.MULTI]
+            total = sum(c * w for c, w in zip(counts, weights))
+
+            r = random.random() * total
+            for kind in [k for k in (self.LOOP, self.MULTI, self.OTHER)
+                         if counts[k] > 0]:
+                r -= counts[kind] * weights[kind]
+                if r < 0:
+                    break
+
+            if kind == self.LOOP:
+                i = next(iter(positions[u]))
+            elif kind == self.MULTI:
+                r = random.randrange(counts[self.MULTI])
+                for v in neighbors:
+                    r -= len(positions[v])
+                    if r < 0:
+                        break
+                i = next(iter(positions[v]))
+            elif counts[self.OTHER] * 8 < remaining:
+                i = random.choice([i for i, v in enumerate(stubs)
+                                   if v != u and v not in adjacency[u]])
+            else:
+                while True:
+                    i = random.randrange(remaining)
+                    if stubs[i] != u and stubs[i] not in adjacency[u]:
+                        break
+            v = remove(i)
+
+            # 元の分布では相手の手は一様に選ばれる
+            log_ratio += math.log(total / (weights[kind] * remaining))
+            if steps is not None:
+                steps[(kind, counts[self.LOOP], counts[self.MULTI],
+                       counts[self.OTHER])] += 1
+            adjacency[u].add(v)
+            adjacency[v].add(u)
+            src.append(u)
+            dst.append(v)
+
+        return CompactGraph(node_size, src, dst), log_ratio
+
     def __str__(self):
         return "{}(degree_dist={}) [n={}, m={}]".format(
             self.__class__.__name__, self.degree_dist,
             self.num_of_nodes(), self.num_of_edges())
 
 
+def check_sum(u, v):
+    "両端の値の和をチェックノード値にするチェック関数"
+
+    return u + v
+
+
+def check_inequality(u, v):
+    "両端の値が違えば1，同じならば0をチェックノード値にするチェック関数"
+
+    if u != v:
+        return 1
+    else:
+        return 0
+
+
 class IncidenceGraph(object):
-    "オリジナルグラフGの各辺に，頂点（チェックノード）を追加した二部グラフ"
+    """オリジナルグラフGの各辺に，頂点（チェックノード）を追加した二部グラフ
 
-    def __init__(self, G, check_function=lambda u, v: u + v):
+    Gはnetworkxのグラフか，CompactGraphである．辺の端点は作るときに配列にして
+    おくので，その後にGを変更しても反映されない．check_functionがcheck_sumか
+    check_inequalityのときは，関数を呼ばずに直接計算する．
+    """
+
+    def __init__(self, G, check_function=check_sum):
         self.original_graph = G
         self.check_function = check_function
+        self._num_of_nodes = G.number_of_nodes()
+        self._edges = list(G.edges())
+        self._heads = [u for u, v in self._edges]
+        self._tails = [v for u, v in self._edges]
 
     def calc_check_values(self, variable_values):
         """チェックノード値を計算する
@@ -415,16 +2099,40 @@ class IncidenceGraph(object):
         variable_valuesは各頂点に割り当てる値を表すリストである．
         """
 
-        G = self.original_graph
-        if len(variable_values) != G.number_of_nodes():
+        if len(variable_values) != self._num_of_nodes:
             raise ValueError(u"variable_valuesのサイズがおかしい")
 
-        check_values = []
-        for u, v in G.edges():
-            value = self.check_function(variable_values[u], variable_values[v])
-            check_values.append(value)
+        if self.check_function is check_sum:
+            return [variable_values[u] + variable_values[v]
+                    for u, v in self._edges]
+        elif self.check_function is check_inequality:
+            return [int(variable_values[u] != variable_values[v])
+                    for u, v in self._edges]
+        check_function = self.check_function
+        return [check_function(variable_values[u], variable_values[v])
+                for u, v in self._edges]
+
+    def calc_check_values_many(self, assignments):
+        """複数の割り当てのチェックノード値をまとめて計算する
+
+        assignmentsは1行が1つの割り当てを表す2次元配列である．i行j列がi番目の
+        割り当ての辺jのチェックノード値である2次元のNumPy配列を返す．
+        """
 
-        return check_values
+        import numpy
+
+        assignments = numpy.asarray(assignments)
+        if (assignments.ndim != 2 or
+                assignments.shape[1] != self._num_of_nodes):
+            raise ValueError(u"assignmentsのサイズがおかしい")
+
+        if self.check_function is check_sum:
+            return assignments[:, self._heads] + assignments[:, self._tails]
+        elif self.check_function is check_inequality:
+            return (assignments[:, self._heads] !=
+                    assignments[:, self._tails]).astype(numpy.int64)
+        rows = [self.calc_check_values(values) for values in assignments]
+        return numpy.array(rows).reshape(len(assignments), len(self._edges))
 
 
 class FJGraphError(Exception):
@@ -435,58 +2143,198 @@ class DegreeDistError(FJGraphError):
     pass
 
 
-class CutSetDistCalculator(object):
+class CutSetDistCalculator(ExhaustiveDistCalculator):
     "2分割カットセット重み分布計算機"
 
-    @staticmethod
-    def _check_cut_set(u, v):
-        if u != v:
-            return 1
-        else:
-            return 0
+    _check_cut_set = staticmethod(check_inequality)
 
-    def detailed_global_cutset_dist(self, G):
+    def detailed_global_cutset_dist(self, G, method="naive",
+                                    use_symmetry=False):
         """詳細全域カットセット重み分布A_G(u,w)を計算する
 
         A_G(u,w): 頂点をu個のグループとn-u個のグループに分割するとき，カットセッ
         トサイズがwになるパターン数
+
+        methodで計算方法を選ぶ．
+
+        * "naive": 割り当てごとにカットセットサイズを計算し直す
+        * "gray": グレイコード順に割り当てを調べ，カットセットサイズを差分更新する
+
+        use_symmetryがTrueのときは，頂点0に0を割り当てたものだけを調べる．割り
+        当てとその0と1を入れ替えたものは同じカットセットサイズを持つので，
+        A_G(u,w)はそこから復元できる．
         """
 
-        n = G.number_of_nodes()
-        incidence_graph = IncidenceGraph(G, self._check_cut_set)
-        ret_dist = Counter()
+        method_name = self._method_name(method)
+        return self._global_dist(G, method_name, use_symmetry)
 
-        for variable_values in itertools.product([0, 1], repeat=n):
-            check_values = incidence_graph.calc_check_values(variable_values)
-            u = sum(variable_values)
-            w = sum(check_values)
-            ret_dist[(u, w)] += 1
+    def _global_dist(self, G, method_name, use_symmetry):
+        return self._dist(
+            "detailed_global_cutset_dist", G,
+            lambda H: self._detailed_global_cutset_dist(
+                H, method_name, use_symmetry),
+            Counter({(0, 0): 1, (1, 0): 1}),
+            lambda k: Counter({(0, 0): 1, (1, k): 2, (2, 0): 1}))
+
+    def _detailed_global_cutset_dist(self, G, method_name, use_symmetry):
+        n = G.number_of_nodes()
+        if not use_symmetry or n == 0:
+            return self._detailed_cutset_dist(G, method_name)
 
+        half_dist = self._detailed_cutset_dist(G, method_name, head=(0,))
+        ret_dist = Counter()
+        for (u, w), count in half_dist.items():
+            ret_dist[(u, w)] += count
+            ret_dist[(n - u, w)] += count
         return ret_dist
 
-    def detailed_st_cutset_dist(self, G, s, t):
+    def detailed_st_cutset_dist(self, G, s, t, method="naive"):
         """詳細s-tカットセット重み分布A_G^{s-t}(u,w)を計算する
 
         A_G^{s-t}(u,w): 頂点をu個のグループとn-u個のグループに分割するとき，s-tカッ
         トセットサイズがwになるパターン数
+
+        methodはdetailed_global_cutset_distと同じ．
+        """
+
+        method_name = self._method_name(method)
+        if self._split_components:
+            return self._split_st_cutset_dist(G, s, t, method_name)
+        return _cached(self._cache, "detailed_st_cutset_dist", G,
+                       lambda: self._detailed_cutset_dist(
+                           G, method_name, st=(s, t)),
+                       marks=(s, t))
+
+    def _split_st_cutset_dist(self, G, s, t, method_name):
+        """連結成分に分けて詳細s-tカットセット重み分布を計算する
+
+        sとtが別の成分にあるときは，sに0を割り当てた分布と1を割り当てた分布を
+        成分ごとに求めて組み合わせる．成分の頂点はs, tが先頭に来るように付け直
+        すので，頂点0への割り当てはprefixとして与えられる．
         """
 
+        ret_dist = None
+        st_dists = []
+        for H, nodes in self._components(G, first=(s, t)):
+            if nodes[0] == s and t in nodes:
+                st = (0, nodes.index(t))
+                dist = _cached(self._cache, "detailed_st_cutset_dist", H,
+                               lambda: self._detailed_cutset_dist(
+                                   H, method_name, st=st),
+                               marks=st)
+            elif nodes[0] in (s, t):
+                # 先頭の頂点に0を割り当てたものと1を割り当てたもの
+                n = H.number_of_nodes()
+                zero_dist = self._detailed_cutset_dist(H, method_name,
+                                                       head=(0,))
+                one_dist = Counter(dict(((n - u, w), count) for (u, w), count
+                                        in zero_dist.items()))
+                st_dists.append((zero_dist, one_dist))
+                continue
+            else:
+                dist = self._global_dist(H, method_name, False)
+            if ret_dist is None:
+                ret_dist = dist
+            else:
+                ret_dist = self._convolve(ret_dist, dist)
+
+        if st_dists:
+            (s_zero, s_one), (t_zero, t_one) = st_dists
+            dist = self._convolve(s_zero, t_one)
+            dist.update(self._convolve(s_one, t_zero))
+            if ret_dist is None:
+                ret_dist = dist
+            else:
+                ret_dist = self._convolve(ret_dist, dist)
+        return ret_dist
+
+    @staticmethod
+    def _method_name(method):
+        "計算方法methodを実装するメソッドの名前"
+
+        if method == "naive":
+            return "_detailed_cutset_dist_naive"
+        elif method == "gray":
+            return "_detailed_cutset_dist_gray"
+        else:
+            raise FJGraphError(u"methodが存在しない")
+
+    def _detailed_cutset_dist(self, G, method_name, st=None, head=()):
+        """頂点0, 1, ...にheadを割り当てたものについて詳細カットセット重み分布
+        を計算する"""
+
+        n = G.number_of_nodes()
+        prefixes = self._shard_prefixes(
+            n - len(head),
+            lambda p: (head + rest
+                       for rest in itertools.product([0, 1], repeat=p)))
+        return self._sharded_dist(method_name, G, (st,), prefixes,
+                                  2 ** (n - len(head)))
+
+    def _detailed_cutset_dist_naive(self, G, st, prefix=()):
         n = G.number_of_nodes()
         incidence_graph = IncidenceGraph(G, self._check_cut_set)
         ret_dist = Counter()
 
-        for variable_values in itertools.product([0, 1], repeat=n):
-            if variable_values[s] == variable_values[t]:
+        prefix = tuple(prefix)
+        for rest in itertools.product([0, 1], repeat=n - len(prefix)):
+            variable_values = prefix + rest
+            if st and variable_values[st[0]] == variable_values[st[1]]:
                 continue
             check_values = incidence_graph.calc_check_values(variable_values)
             u = sum(variable_values)
             w = sum(check_values)
             ret_dist[(u, w)] += 1
 
+        fjutil.profiler().count("assignments", 2 ** (n - len(prefix)))
+        return ret_dist
+
+    @staticmethod
+    def _adjacency_list(G):
+        "自己ループを除いた隣接リスト（多重辺は重複して持つ）"
+
+        adjacency = [[] for i in range(G.number_of_nodes())]
+        for u, v in G.edges():
+            if u == v:
+                continue
+            adjacency[u].append(v)
+            adjacency[v].append(u)
+        return adjacency
+
+    def _detailed_cutset_dist_gray(self, G, st, prefix=()):
+        n = G.number_of_nodes()
+        p = len(prefix)
+        adjacency = self._adjacency_list(G)
+        ret_dist = Counter()
+
+        # prefixの後ろをすべて0にした割り当てから始める
+        variable_values = list(prefix) + [0] * (n - p)
+        u = sum(variable_values)
+        w = sum(1 for i in range(n) for j in adjacency[i]
+                if i < j and variable_values[i] != variable_values[j])
+        if not st or variable_values[st[0]] != variable_values[st[1]]:
+            ret_dist[(u, w)] += 1
+
+        for k in range(1, 2 ** (n - p)):
+            # k番目のグレイコードでは，kの最下位の1のビットに対応する頂点が反転する
+            i = p + (k & -k).bit_length() - 1
+            value = variable_values[i]
+            for j in adjacency[i]:
+                if variable_values[j] == value:
+                    w += 1
+                else:
+                    w -= 1
+            variable_values[i] = 1 - value
+            u += 1 - 2 * value
+            if st and variable_values[st[0]] == variable_values[st[1]]:
+                continue
+            ret_dist[(u, w)] += 1
+
+        fjutil.profiler().count("assignments", 2 ** (n - p))
         return ret_dist
 
 
-class ThreeWayCutSetDistCalculator(object):
+class ThreeWayCutSetDistCalculator(ExhaustiveDistCalculator):
     "3分割カットセット分布計算機"
 
     def _partition_size(self, variable_values):
@@ -495,63 +2343,478 @@ class ThreeWayCutSetDistCalculator(object):
         count = Counter(variable_values)
         return count[0], count[1], count[2]
 
-    @staticmethod
-    def _check_cut_set(u, v):
-        if u != v:
-            return 1
-        else:
-            return 0
+    _check_cut_set = staticmethod(check_inequality)
 
-    def detailed_cutset_dist(self, G):
+    def detailed_cutset_dist(self, G, use_symmetry=False, method="naive"):
         """詳細カットセット分布A_G(j,k,l;w)を計算する
 
         A_G(j,k,l;w): 頂点をR（サイズj）, S（サイズk）, T（サイズl）の
         集合に3分割するときに，カットセットサイズがwになるパターン数
+
+        methodで計算方法を選ぶ．
+
+        * "naive": 3^n通りの割り当てを1つずつ調べる
+        * "mitm": 頂点を前半と後半に分け，それぞれの割り当ての分布を，もう一方
+          の半分と辺でつながった頂点（境界）のラベルごとにまとめてから組み合わ
+          せる（半分全列挙）．境界が小さい疎なグラフで速い．時間は境界の頂点
+          数について指数的に増えるので，同じ頂点数でもグラフによって10倍ほど
+          変わる
+
+        use_symmetryがTrueのときは，ラベルの付け替えで移りあう割り当てのうち，
+        ラベルが0, 1, 2の順に初めて現れるもの（代表元）だけを調べる．ラベルを付
+        け替えてもカットセットサイズは変わらないので，A_G(j,k,l;w)はそこから復
+        元できる．"mitm"では使わない．また，"mitm"は並列化しない．
         """
 
+        if method == "naive":
+            compute = lambda H: self._detailed_cutset_dist_sharded(
+                H, use_symmetry)
+        elif method == "mitm":
+            compute = self._detailed_cutset_dist_mitm
+        else:
+            raise FJGraphError(u"methodが存在しない")
+
+        edge_dist = lambda k: Counter({
+            (2, 0, 0, 0): 1, (0, 2, 0, 0): 1, (0, 0, 2, 0): 1,
+            (1, 1, 0, k): 2, (1, 0, 1, k): 2, (0, 1, 1, k): 2,
+        })
+        return self._dist(
+            "3way_detailed_cutset_dist", G, compute,
+            Counter({(1, 0, 0, 0): 1, (0, 1, 0, 0): 1, (0, 0, 1, 0): 1}),
+            edge_dist)
+
+    def _detailed_cutset_dist_sharded(self, G, use_symmetry):
+        n = G.number_of_nodes()
+        if not use_symmetry or n == 0:
+            prefixes = self._shard_prefixes(
+                n, lambda p: itertools.product([0, 1, 2], repeat=p))
+            return self._sharded_dist(
+                "_detailed_cutset_dist", G, (False,), prefixes, 3 ** n)
+
+        # 代表元はおよそ3^n / 6個
+        prefixes = self._shard_prefixes(n, self._canonical_labelings)
+        rep_dist = self._sharded_dist(
+            "_detailed_cutset_dist", G, (True,), prefixes, 3 ** n // 6)
+        ret_dist = Counter()
+        for (j, k, l, w), count in rep_dist.items():
+            if j == n:
+                # すべて同じラベルの割り当ては3通りにしか移らない
+                patterns = set(itertools.permutations((j, k, l)))
+            else:
+                patterns = itertools.permutations((j, k, l))
+            for sizes in patterns:
+                ret_dist[sizes + (w,)] += count
+        return ret_dist
+
+    @staticmethod
+    def _canonical_labelings(n, prefix=()):
+        "prefixで始まり，ラベルが0, 1, 2の順に初めて現れる割り当てを列挙する"
+
+        prefix = tuple(prefix)
+        p = len(prefix)
+        if 1 in prefix:
+            for rest in itertools.product([0, 1, 2], repeat=n - p):
+                yield prefix + rest
+            return
+
+        # prefixはすべて0
+        yield (0,) * n
+        for i in range(max(p, 1), n):
+            # 頂点0からi-1までが0で，頂点iに初めて1が現れる
+            head = (0,) * i + (1,)
+            for rest in itertools.product([0, 1, 2], repeat=n - i - 1):
+                yield head + rest
+
+    def _detailed_cutset_dist(self, G, use_symmetry, prefix=()):
         n = G.number_of_nodes()
         incidence_graph = IncidenceGraph(G, self._check_cut_set)
         ret_dist = Counter()
 
-        for variable_values in itertools.product([0, 1, 2], repeat=n):
+        if use_symmetry:
+            labelings = self._canonical_labelings(n, prefix)
+        else:
+            labelings = (tuple(prefix) + rest for rest in
+                         itertools.product([0, 1, 2], repeat=n - len(prefix)))
+        for variable_values in labelings:
             check_values = incidence_graph.calc_check_values(variable_values)
             w = sum(check_values)
             j, k, l = self._partition_size(variable_values)
             ret_dist[(j, k, l, w)] += 1
 
+        fjutil.profiler().count("assignments", sum(ret_dist.values()))
         return ret_dist
 
-    def all_cutset(self, G):
-        "すべての3分割カットセットを求める"
+    @staticmethod
+    def _split_halves(G):
+        """幅優先探索の順番で頂点を前半と後半に分ける
+
+        前半は連結した塊になりやすいので，前半と後半をつなぐ辺が少なくなる．
+        """
 
+        n = G.number_of_nodes()
+        adjacency = [[] for v in range(n)]
+        for u, v in G.edges():
+            adjacency[u].append(v)
+            adjacency[v].append(u)
+
+        order = []
+        visited = [False] * n
+        for root in range(n):
+            if visited[root]: continue
+            visited[root] = True
+            queue = [root]
+            for v in queue:
+                order.append(v)
+                for u in adjacency[v]:
+                    if not visited[u]:
+                        visited[u] = True
+                        queue.append(u)
+        return order[:n // 2], order[n // 2:]
+
+    def _half_labelings(self, nodes, edges):
+        """nodesへのラベルの割り当てを，境界のラベルごとにまとめて返す
+
+        edgesは辺のリストで，nodesの頂点どうしの辺（内部の辺）とnodesの頂点
+        とそれ以外の頂点の辺（境界の辺）を含む．(境界の頂点, {境界のラベル:
+        [(割り当て, 内部の辺でカットされる辺の集合を表すビットマスク,
+        内部の辺のカット数)]})を返す．ビットはedgesの番号に対応する．
+        """
+
+        index = dict((v, i) for i, v in enumerate(nodes))
+        internal = []
+        boundary = []
+        for i, (u, v) in enumerate(edges):
+            if u in index and v in index:
+                if u != v:
+                    internal.append((index[u], index[v], 1 << i))
+            elif u in index:
+                boundary.append(u)
+            elif v in index:
+                boundary.append(v)
+        boundary = sorted(set(boundary))
+        boundary_index = [index[v] for v in boundary]
+
+        groups = {}
+        for labels in itertools.product([0, 1, 2], repeat=len(nodes)):
+            mask = 0
+            w = 0
+            for a, b, bit in internal:
+                if labels[a] != labels[b]:
+                    mask |= bit
+                    w += 1
+            signature = tuple(labels[i] for i in boundary_index)
+            groups.setdefault(signature, []).append((labels, mask, w))
+        return boundary, groups
+
+    def _detailed_cutset_dist_mitm(self, G):
         n = G.number_of_nodes()
         edges = G.edges()
-        incidence_graph = IncidenceGraph(G, self._check_cut_set)
-        cutsets = set()
+        first, second = self._split_halves(G)
+        first_boundary, first_groups = self._half_labelings(first, edges)
+        second_boundary, second_groups = self._half_labelings(second, edges)
+
+        # 分布のキー(j, k, w)を整数j + k*base + w*base^2で表す（l = n - j - k）
+        base = n + len(edges) + 1
+        histogram = lambda group: Counter(
+            labels.count(0) + labels.count(1) * base + w * base ** 2
+            for labels, mask, w in group)
+        first_hists = dict((signature, histogram(group))
+                           for signature, group in first_groups.items())
+        second_hists = dict((signature, histogram(group))
+                            for signature, group in second_groups.items())
+
+        # 前半と後半をつなぐ辺の，境界の頂点の中での番号
+        first_index = dict((v, i) for i, v in enumerate(first_boundary))
+        second_index = dict((v, i) for i, v in enumerate(second_boundary))
+        cross = []
+        for u, v in edges:
+            if u in first_index and v in second_index:
+                cross.append((first_index[u], second_index[v]))
+            elif v in first_index and u in second_index:
+                cross.append((first_index[v], second_index[u]))
+
+        codes = Counter()
+        for first_signature, first_hist in first_hists.items():
+            # 後半の分布を，前半の境界のラベルに対するカット数だけずらして足す
+            second_hist = Counter()
+            for second_signature, hist in second_hists.items():
+                c = sum(1 for a, b in cross
+                        if first_signature[a] != second_signature[b])
+                shift = c * base ** 2
+                for code, count in hist.items():
+                    second_hist[code + shift] += count
+            for x, c in first_hist.items():
+                for y, d in second_hist.items():
+                    codes[x + y] += c * d
 
-        for variable_values in itertools.product([0, 1, 2], repeat=n):
-            if 0 not in variable_values:
-                continue
-            if 1 not in variable_values:
-                continue
-            if 2 not in variable_values:
+        ret_dist = Counter()
+        for code, count in codes.items():
+            j = code % base
+            k = code // base % base
+            w = code // base ** 2
+            ret_dist[(j, k, n - j - k, w)] += count
+        return ret_dist
+
+    @staticmethod
+    def _distinct_edges(G):
+        "自己ループを除き，多重辺を1本にまとめた辺のリスト"
+
+        edges = []
+        seen = set()
+        for u, v in G.edges():
+            key = (min(u, v), max(u, v))
+            if u == v or key in seen:
                 continue
-            check_values = incidence_graph.calc_check_values(variable_values)
-            cutset = []
-            for i, value in enumerate(check_values):
-                if value == 1:
-                    cutset.append(edges[i])
-            cutsets.add(frozenset(cutset))
+            seen.add(key)
+            edges.append((u, v))
+        return edges
 
+    def all_cutset(self, G):
+        "すべての3分割カットセットを求める"
+
+        edges = self._distinct_edges(G)
+        cutsets = set()
+        for mask in self.all_cutset_masks(G):
+            cutsets.add(frozenset(
+                edge for i, edge in enumerate(edges) if mask >> i & 1))
+        return cutsets
+
+    def all_cutset_masks(self, G):
+        """すべての3分割カットセットを，辺の集合を表す整数のビットマスクの集合
+        として求める
+
+        ビットiは，G.edges()から自己ループと重複する多重辺を除いたi番目の辺に
+        対応する．頂点を前半と後半に分け，それぞれの割り当てを境界のラベルごと
+        にまとめ，使ったラベルの集合とカットされる内部の辺のマスクの組の重複を
+        除いてから組み合わせる．
+        """
+
+        edges = self._distinct_edges(G)
+        first, second = self._split_halves(G)
+        halves = []
+        for nodes in (first, second):
+            boundary, groups = self._half_labelings(nodes, edges)
+            entries = {}
+            for signature, group in groups.items():
+                entries[signature] = set(
+                    (sum(1 << label for label in set(labels)), mask)
+                    for labels, mask, w in group)
+            halves.append((dict((v, i) for i, v in enumerate(boundary)),
+                           entries))
+        (first_index, first_entries), (second_index, second_entries) = halves
+
+        cross = []
+        for i, (u, v) in enumerate(edges):
+            if u in first_index and v in second_index:
+                cross.append((first_index[u], second_index[v], 1 << i))
+            elif v in first_index and u in second_index:
+                cross.append((first_index[v], second_index[u], 1 << i))
+
+        cutsets = set()
+        for first_signature, first_set in first_entries.items():
+            for second_signature, second_set in second_entries.items():
+                cross_mask = 0
+                for a, b, bit in cross:
+                    if first_signature[a] != second_signature[b]:
+                        cross_mask |= bit
+                for first_used, first_mask in first_set:
+                    for second_used, second_mask in second_set:
+                        # 3つのラベルをすべて使う割り当てだけを考える
+                        if first_used | second_used == 7:
+                            cutsets.add(first_mask | second_mask | cross_mask)
         return cutsets
 
     def cutset_dist(self, G):
         "3分割カット重み分布を求める"
 
+        return _cached(self._cache, "3way_cutset_dist", G,
+                       lambda: self._cutset_dist(G))
+
+    def _cutset_dist(self, G):
         cutset_dist = Counter()
-        cutsets = self.all_cutset(G)
-        for cutset in cutsets:
-            weight = len(cutset)
+        for mask in self.all_cutset_masks(G):
+            weight = bin(mask).count("1")
             cutset_dist[weight] += 1
 
         return cutset_dist
+
+
+class TreeDecompositionDistCalculator(object):
+    """木分解上の動的計画法で分布を求める計算機
+
+    最小次数ヒューリスティックで頂点の消去順序を決め，その順番で頂点を消去して
+    いく（バケット消去法）．頂点を消去するときに関係する頂点の集合が木分解のバッ
+    グになるので，計算量は頂点数に対しては多項式的で，木幅に対して指数的である．
+    疎なグラフなら頂点数が数百でも計算できる．
+
+    分布は，頂点への割り当てについての多項式（指数のタプルをキー，個数を値とす
+    るCounter）として計算する．結果はVertexCoverDistCalculatorや
+    CutSetDistCalculatorと同じになる．cacheにIsomorphismCacheを指定すると，同
+    型なグラフの結果を使い回す．
+    """
+
+    def __init__(self, cache=None):
+        self._cache = cache
+
+    def elimination_order(self, G):
+        """最小次数ヒューリスティックで頂点の消去順序を求める
+
+        (消去順序, 幅)を返す．幅は得られた木分解の最大バッグサイズ-1である．
+        """
+
+        adjacency = dict((v, set()) for v in range(G.number_of_nodes()))
+        for u, v in G.edges():
+            if u == v: continue
+            adjacency[u].add(v)
+            adjacency[v].add(u)
+
+        order = []
+        width = 0
+        while adjacency:
+            v = min(adjacency, key=lambda v: (len(adjacency[v]), v))
+            neighbors = adjacency.pop(v)
+            width = max(width, len(neighbors))
+            for u in neighbors:
+                adjacency[u].discard(v)
+                adjacency[u].update(neighbors - set([u]))
+            order.append(v)
+        return order, width
+
+    def vertex_cover_dist(self, G):
+        "GのIP-頂点被覆分布を計算する"
+
+        return _cached(self._cache, "vertex_cover_dist", G,
+                       lambda: self._vertex_cover_dist(G))
+
+    def _vertex_cover_dist(self, G):
+        def unary(value, num_of_loops):
+            if num_of_loops and value == 0:
+                return None
+            return (value,)
+
+        def binary(a, b, multiplicity):
+            return (0,) if a + b >= 1 else None
+
+        poly = self._eliminate(G, (0, 1), unary, binary)
+        return Counter(dict((k, count) for (k,), count in poly.items()))
+
+    def lp_vertex_cover_dist(self, G):
+        "GのLP-頂点被覆分布を計算する"
+
+        return _cached(self._cache, "lp_vertex_cover_dist", G,
+                       lambda: self._lp_vertex_cover_dist(G))
+
+    def _lp_vertex_cover_dist(self, G):
+        def unary(value, num_of_loops):
+            if num_of_loops and value * 2 < 1:
+                return None
+            return (int(value == 0.5), int(value == 1))
+
+        def binary(a, b, multiplicity):
+            return (0, 0) if a + b >= 1 else None
+
+        return self._eliminate(G, (0, 0.5, 1), unary, binary)
+
+    def detailed_global_cutset_dist(self, G):
+        "詳細全域カットセット重み分布A_G(u,w)を計算する"
+
+        return _cached(self._cache, "detailed_global_cutset_dist", G,
+                       lambda: self._detailed_global_cutset_dist(G))
+
+    def _detailed_global_cutset_dist(self, G):
+        def unary(value, num_of_loops):
+            return (value, 0)
+
+        def binary(a, b, multiplicity):
+            return (0, multiplicity) if a != b else (0, 0)
+
+        return self._eliminate(G, (0, 1), unary, binary)
+
+    @staticmethod
+    def _poly_mul(a, b):
+        # 指数は1つの整数にまとめてあるので，単項式の積は整数の和になる
+        ret = Counter()
+        for x, c in a.items():
+            for y, d in b.items():
+                ret[x + y] += c * d
+        return ret
+
+    def _eliminate(self, G, values, unary, binary):
+        """頂点にvaluesの値を割り当てたときの多項式の和を求める
+
+        unary(値, 自己ループの数)は頂点ごとの，binary(値, 値, 多重度)は辺ごとの
+        単項式の指数を返す．割り当てが許されないときはNoneを返す．
+        """
+
+        n = G.number_of_nodes()
+        loops = Counter()
+        multiplicity = Counter()
+        for u, v in G.edges():
+            if u == v:
+                loops[u] += 1
+            else:
+                multiplicity[(min(u, v), max(u, v))] += 1
+
+        # 指数のタプル(e_0, e_1, ...)を整数e_0 + e_1*base + ...で表す
+        base = n + G.number_of_edges() + 1
+        dimension = len(unary(values[-1], 0))
+        encode = lambda exponent: sum(e * base ** i
+                                      for i, e in enumerate(exponent))
+
+        # 因子は(スコープ, {割り当て: 多項式})
+        factors = []
+        for v in range(n):
+            table = {}
+            for a in values:
+                exponent = unary(a, loops[v])
+                if exponent is not None:
+                    table[(a,)] = Counter({encode(exponent): 1})
+            factors.append(((v,), table))
+        for (u, v), k in multiplicity.items():
+            table = {}
+            for a, b in itertools.product(values, repeat=2):
+                exponent = binary(a, b, k)
+                if exponent is not None:
+                    table[(a, b)] = Counter({encode(exponent): 1})
+            factors.append(((u, v), table))
+
+        order, width = self.elimination_order(G)
+        for v in order:
+            bucket = [f for f in factors if v in f[0]]
+            factors = [f for f in factors if v not in f[0]]
+            factors.append(self._sum_out(v, bucket, values))
+
+        poly = Counter({0: 1})
+        for scope, table in factors:
+            poly = self._poly_mul(poly, table.get((), Counter()))
+        return Counter(dict(
+            (tuple(code // base ** i % base for i in range(dimension)), count)
+            for code, count in poly.items()
+        ))
+
+    def _sum_out(self, v, bucket, values):
+        "bucketの因子の積を求め，頂点vについて和をとった因子を返す"
+
+        scope = sorted(set(x for f in bucket for x in f[0]) - set([v]))
+        table = {}
+        for assignment in itertools.product(values, repeat=len(scope)):
+            env = dict(zip(scope, assignment))
+            total = Counter()
+            for a in values:
+                env[v] = a
+                poly = None
+                for factor_scope, factor_table in bucket:
+                    factor_poly = factor_table.get(
+                        tuple(env[x] for x in factor_scope))
+                    if factor_poly is None:
+                        poly = None
+                        break
+                    if poly is None:
+                        poly = factor_poly
+                    else:
+                        poly = self._poly_mul(poly, factor_poly)
+                if poly:
+                    total.update(poly)
+            if total:
+                table[assignment] = total
+        return (tuple(scope), table)
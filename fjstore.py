@@ -0,0 +1,84 @@
+#coding: utf-8
+
+"""試行結果の保存
+
+実験の試行結果をSQLiteのデータベースファイルに保存する．途中で止まった実験の
+再開や，同じアンサンブルに対する複数の実行の結果の統合に使う．
+"""
+
+# Copyright (c) 2013 Yuki Fujii @fjyuu
+# Licensed under the MIT License
+
+from __future__ import division, print_function
+import pickle
+import sqlite3
+import time
+
+
+class TrialStore(object):
+    """試行結果をSQLiteのデータベースファイルに保存するクラス
+
+    結果は実験名，アンサンブル，シード，試行番号で区別する．アンサンブルとシー
+    ドは文字列にして保存する．同じファイルを複数のプロセスから同時に使ってもよ
+    い．
+    """
+
+    # 前回のコミットからこの秒数が経つとコミットする
+    _commit_interval = 1.0
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("""CREATE TABLE IF NOT EXISTS trials (
+            experiment TEXT NOT NULL,
+            ensemble TEXT NOT NULL,
+            seed TEXT NOT NULL,
+            trial INTEGER NOT NULL,
+            result BLOB NOT NULL,
+            PRIMARY KEY (experiment, ensemble, seed, trial))""")
+        self._connection.commit()
+        self._last_commit = time.time()
+
+    def load(self, experiment, ensemble, seed):
+        "保存されている結果を{試行番号: 結果}のdictで返す"
+
+        cursor = self._connection.execute(
+            """SELECT trial, result FROM trials
+               WHERE experiment = ? AND ensemble = ? AND seed = ?""",
+            (experiment, u"{}".format(ensemble), u"{}".format(seed)))
+        return dict((trial, self._loads(result)) for trial, result in cursor)
+
+    def results(self, experiment, ensemble):
+        """保存されているすべてのシードの結果を(シード, 試行番号, 結果)として
+        返すイテレータ"""
+
+        cursor = self._connection.execute(
+            """SELECT seed, trial, result FROM trials
+               WHERE experiment = ? AND ensemble = ?
+               ORDER BY seed, trial""",
+            (experiment, u"{}".format(ensemble)))
+        for seed, trial, result in cursor.fetchall():
+            yield seed, trial, self._loads(result)
+
+    def save(self, experiment, ensemble, seed, trial, result):
+        "結果を保存する"
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO trials VALUES (?, ?, ?, ?, ?)",
+            (experiment, u"{}".format(ensemble), u"{}".format(seed), trial,
+             sqlite3.Binary(pickle.dumps(result, 2))))
+        if time.time() - self._last_commit > self._commit_interval:
+            self.flush()
+
+    def flush(self):
+        "保存した結果をファイルに書き込む"
+
+        self._connection.commit()
+        self._last_commit = time.time()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    @staticmethod
+    def _loads(blob):
+        return pickle.loads(bytes(blob))
@@ -7,6 +7,11 @@
 
 from __future__ import division, print_function
 import sys
+import math
+import time
+import numbers
+import itertools
+from collections import Counter
 
 
 class ProgressBar(object):
@@ -52,6 +57,405 @@ def output_dist(dist, file, format="{} {}"):
         file.write("\n")
 
 
+def print_dist_with_interval(dist, num_of_trials, z=1.96,
+                             format="{:>5}: {} [{:.4}, {:.4}]"):
+    """確率分布を表すdictを，各確率のWilsonスコア区間とともに標準出力に書き
+    出す
+
+    distはnum_of_trials回の試行から求めた確率（の累積）でなければならない．
+    """
+
+    for item in sorted(dist.keys()):
+        successes = int(round(dist[item] * num_of_trials))
+        low, high = wilson_interval(successes, num_of_trials, z)
+        print(format.format(item, dist[item], low, high))
+
+
+def print_dist_with_stderr(dist, stderr,
+                           format="{:>5}: {:.4} (stderr: {:.3}, rel_error: {:.3})"):
+    """推定値の分布を表すdictを，標準誤差とその推定値に対する比とともに標準出
+    力に書き出す"""
+
+    for item in sorted(dist.keys()):
+        value = dist[item]
+        if value > 0:
+            rel_error = stderr[item] / value
+        else:
+            rel_error = float("inf")
+        print(format.format(item, value, stderr[item], rel_error))
+
+
+def wilson_interval(successes, num_of_trials, z=1.96):
+    """成功確率のWilsonスコア区間を(下限, 上限)で返す
+
+    zは標準正規分布の分位点で，1.96なら95%信頼区間になる．成功回数が0や
+    num_of_trialsに近くても区間が[0, 1]からはみ出さない．
+    """
+
+    if num_of_trials == 0:
+        return (0.0, 1.0)
+    n = num_of_trials
+    p = successes / n
+    denominator = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) \
+        / denominator
+    return (max(0.0, center - half_width), min(1.0, center + half_width))
+
+
+class RunningMean(object):
+    "値を1つずつ加えながら，平均とその標準誤差を求める"
+
+    def __init__(self):
+        self.n = 0
+        self._sum = 0.0
+        self._sum_of_squares = 0.0
+
+    def add(self, value):
+        self.n += 1
+        self._sum += value
+        self._sum_of_squares += value * value
+
+    def mean(self):
+        return self._sum / self.n
+
+    def stderr(self):
+        "平均の標準誤差（値が2つ未満のときは無限大）"
+
+        if self.n < 2:
+            return float("inf")
+        variance = (self._sum_of_squares - self._sum * self._sum / self.n) \
+            / (self.n - 1)
+        return math.sqrt(max(variance, 0.0) / self.n)
+
+    def interval(self, z=1.96):
+        "平均の信頼区間を(下限, 上限)で返す"
+
+        return normal_interval(self.mean(), self.stderr(), z)
+
+
+def normal_interval(mean, stderr, z=1.96):
+    "平均meanと標準誤差stderrから，正規近似による信頼区間を(下限, 上限)で返す"
+
+    return (mean - z * stderr, mean + z * stderr)
+
+
+class CounterAccumulator(object):
+    """分布を表すdictを足し合わせていくクラス
+
+    DenseAccumulatorと同じ使い方ができる．キーの範囲が分からないときや，NumPy
+    がないときに使う．countはaddした分布の数．
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._sum = Counter()
+
+    def add(self, dist):
+        "distを足す"
+
+        self.count += 1
+        for key, value in dist.items():
+            self._sum[key] += value
+
+    def merge(self, other):
+        "別のCounterAccumulatorかDenseAccumulatorの和を足す"
+
+        self.count += other.count
+        for key, value in other.to_counter().items():
+            self._sum[key] += value
+
+    def to_counter(self):
+        "和を，値が0でないキーだけのCounterで返す"
+
+        return Counter(dict((key, value) for key, value in self._sum.items()
+                            if value != 0))
+
+    def average(self):
+        "和をcountで割ったものをCounterで返す"
+
+        return Counter(dict((key, value / self.count)
+                            for key, value in self.to_counter().items()))
+
+    def checkpoint(self, path):
+        "pathに書き出す．書き出しの途中で止まっても前の内容は壊れない"
+
+        _atomic_pickle(self, path)
+
+
+class DenseAccumulator(CounterAccumulator):
+    """キーが非負整数（の組）の分布を，NumPyの配列に足し込んでいくクラス
+
+    shapeはキーの各成分の上限に1を足したもの．キーが整数ならshapeは長さ1のタ
+    プルにする．値が整数の間はint64の配列に足し込み，int64に収まらなくなりそ
+    うになるか，整数でない値を足すと，Pythonのオブジェクトの配列に切り替える．
+    """
+
+    # 配列の要素の絶対値がこれを超えそうになったらオブジェクトの配列にする
+    _int64_limit = 2 ** 62
+
+    def __init__(self, shape):
+        import numpy
+
+        self.shape = tuple(shape)
+        self.count = 0
+        self._array = numpy.zeros(self.shape, dtype=numpy.int64)
+        self._bound = 0  # 配列の要素の絶対値の上界
+
+    def add(self, dist):
+        import numpy
+
+        self.count += 1
+        if not dist:
+            return
+        size = len(dist)
+        if len(self.shape) == 1:
+            index = numpy.fromiter(dist.keys(), numpy.intp, size)
+        else:
+            keys = numpy.fromiter(itertools.chain.from_iterable(dist.keys()),
+                                  numpy.intp, size * len(self.shape))
+            index = tuple(keys.reshape(size, len(self.shape)).T)
+        values = numpy.array(list(dist.values()))
+
+        if self._array.dtype != object:
+            # int64に収まる整数だけならdtypeがint64になる
+            if values.dtype == numpy.int64:
+                peak = max(int(values.max()), -int(values.min()))
+                if self._bound + peak < self._int64_limit:
+                    self._array[index] += values
+                    self._bound += peak
+                    return
+            self._array = self._array.astype(object)
+        self._array[index] += values.astype(object)
+
+    def merge(self, other):
+        "同じshapeの別のDenseAccumulatorの和を足す"
+
+        if other.shape != self.shape:
+            raise ValueError("shape mismatch: {} and {}".format(
+                self.shape, other.shape))
+        self.count += other.count
+        if (self._array.dtype == object or other._array.dtype == object or
+                self._bound + other._bound >= self._int64_limit):
+            self._array = self._array.astype(object) + \
+                other._array.astype(object)
+        else:
+            self._array = self._array + other._array
+            self._bound += other._bound
+
+    def to_counter(self):
+        import numpy
+
+        ret = Counter()
+        for index in zip(*numpy.nonzero(self._array)):
+            value = self._array[index]
+            if isinstance(value, numbers.Integral):
+                value = int(value)
+            key = tuple(int(i) for i in index)
+            if len(self.shape) == 1:
+                key = key[0]
+            ret[key] = value
+        return ret
+
+
+def make_accumulator(shape=None):
+    """分布を足し合わせるためのオブジェクトを作る
+
+    shapeを指定し，NumPyが使えればDenseAccumulator，そうでなければ
+    CounterAccumulatorを返す．
+    """
+
+    if shape is not None:
+        try:
+            return DenseAccumulator(shape)
+        except ImportError:
+            pass
+    return CounterAccumulator()
+
+
+def load_accumulator(path):
+    "checkpointで書き出したCounterAccumulatorかDenseAccumulatorを読み込む"
+
+    import pickle
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def save_checkpoint(path, accumulator, next_trial):
+    """accumulatorと，次に行う試行の番号next_trialをpathに書き出す
+
+    書き出しの途中で止まっても前の内容は壊れない．
+    """
+
+    _atomic_pickle({"accumulator": accumulator, "next_trial": next_trial},
+                   path)
+
+
+def load_checkpoint(path):
+    """save_checkpointで書き出したものを(accumulator, next_trial)として読み込む
+
+    accumulatorのcheckpointで書き出したファイルなら，next_trialはaddした分布
+    の数とする．
+    """
+
+    state = load_accumulator(path)
+    if isinstance(state, dict):
+        return state["accumulator"], state["next_trial"]
+    return state, state.count
+
+
+def _atomic_pickle(obj, path):
+    import os
+    import pickle
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        pickle.dump(obj, f, 2)
+    if os.path.exists(path) and not hasattr(os, "replace"):
+        os.remove(path)  # Python 2のWindowsでは上書きできない
+    getattr(os, "replace", os.rename)(temp_path, path)
+
+
+class Profiler(object):
+    """フェーズごとの時間と回数，カウンタを集計するクラス
+
+    with profiler.phase(name): で囲んだ部分の時間と回数をnameごとに足し合わ
+    せ，count(name, n)でカウンタnameにnを足す．フェーズは入れ子にしてよく，
+    時間は内側のフェーズの分も含む．使うにはset_profilerで有効にする．
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.counters = Counter()
+
+    def phase(self, name):
+        "nameのフェーズの時間を計るコンテキストマネージャを返す"
+
+        return _ProfilerPhase(self, name)
+
+    def count(self, name, n=1):
+        "カウンタnameにnを足す"
+
+        self.counters[name] += n
+
+    def merge(self, other):
+        "別のProfilerで集計したものを足す"
+
+        self.seconds.update(other.seconds)
+        self.calls.update(other.calls)
+        self.counters.update(other.counters)
+
+    def take(self):
+        "これまでに集計したものを新しいProfilerに移して返し，自分は空にする"
+
+        taken = Profiler()
+        taken.seconds, self.seconds = self.seconds, Counter()
+        taken.calls, self.calls = self.calls, Counter()
+        taken.counters, self.counters = self.counters, Counter()
+        return taken
+
+    def to_dict(self):
+        "JSONに書き出せるdictにする"
+
+        return {"phases": dict((name, {"calls": self.calls[name],
+                                       "seconds": self.seconds[name]})
+                               for name in self.calls),
+                "counters": dict(self.counters)}
+
+    def print_report(self):
+        "フェーズごとの時間と回数，カウンタを標準出力に書き出す"
+
+        print("= profile =")
+        print("{:<24} {:>10} {:>12} {:>12}".format(
+            "phase", "calls", "total[s]", "mean[ms]"))
+        for name in sorted(self.calls, key=lambda name: -self.seconds[name]):
+            calls = self.calls[name]
+            print("{:<24} {:>10} {:>12.3f} {:>12.3f}".format(
+                name, calls, self.seconds[name],
+                1000 * self.seconds[name] / calls))
+        for name in sorted(self.counters):
+            print("{}: {}".format(name, self.counters[name]))
+        print()
+
+
+def output_profile(profiler, report=False, json_file=None):
+    """profilerで集計したものを，reportがTrueなら表として標準出力に書き出し，
+    json_fileを指定すればそこにJSONで書き出す（profilerがNoneなら何もしない）"""
+
+    if profiler is None:
+        return
+    if report:
+        print()
+        profiler.print_report()
+    if json_file is not None:
+        import json
+        with open(json_file, "w") as f:
+            json.dump(profiler.to_dict(), f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+class _ProfilerPhase(object):
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        profiler = self._profiler
+        profiler.seconds[self._name] += time.time() - self._start
+        profiler.calls[self._name] += 1
+        return False
+
+
+class NullProfiler(object):
+    "何も集計しないProfiler．有効にしていないときに使う"
+
+    enabled = False
+
+    def phase(self, name):
+        return _null_phase
+
+    def count(self, name, n=1):
+        pass
+
+
+class _NullPhase(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_phase = _NullPhase()
+_profiler = NullProfiler()
+
+
+def profiler():
+    "有効なProfilerを返す（有効にしていなければNullProfiler）"
+
+    return _profiler
+
+
+def set_profiler(new_profiler):
+    """new_profilerを有効にし，それまで有効だったものを返す
+
+    Noneを指定すると無効にする．
+    """
+
+    global _profiler
+    previous = _profiler
+    _profiler = new_profiler if new_profiler is not None else NullProfiler()
+    return previous
+
+
 def load_json_file(file):
     "jsonファイルを読み込む"
 
@@ -62,6 +466,18 @@ def load_json_file(file):
     return ret
 
 
+def derive_seed(seed, index):
+    """seedとindexから新しいシードを作る
+
+    試行ごとに別の乱数列を使うためのもので，Pythonのバージョンやプロセスによら
+    ず同じ値になる．
+    """
+
+    import hashlib
+    key = u"{}:{}".format(seed, index).encode("utf-8")
+    return int(hashlib.sha1(key).hexdigest()[:16], 16)
+
+
 def frange(start, stop, step):
     "stepが小数でも大丈夫なrange"
 
@@ -10,6 +10,7 @@ from __future__ import division, print_function
 import fjgraph
 import fjutil
 import fjexperiment
+import fjstore
 import random
 
 
@@ -29,7 +30,64 @@ def parse_arguments():
                       default=None,
                       help="set the seed for the random module",
                       metavar="STRING")
+    parser.add_option("-j", "--jobs",
+                      dest="jobs",
+                      type="int",
+                      default=1,
+                      help="set the number of worker processes",
+                      metavar="NUMBER")
+    parser.add_option("--solver",
+                      dest="solver",
+                      type="choice",
+                      choices=["cplex", "native"],
+                      default="cplex",
+                      help="set the vertex cover solver (cplex or native)",
+                      metavar="NAME")
+    parser.add_option("--rel-error",
+                      dest="rel_error",
+                      type="float",
+                      default=None,
+                      help="run trials in batches of --trials until the "
+                           "confidence intervals are within this relative "
+                           "error",
+                      metavar="NUMBER")
+    parser.add_option("--max-trials",
+                      dest="max_trials",
+                      type="int",
+                      default=None,
+                      help="set the maximum number of trials for --rel-error",
+                      metavar="NUMBER")
+    parser.add_option("--store",
+                      dest="store",
+                      type="string",
+                      default=None,
+                      help="save trial results to FILE and skip saved trials",
+                      metavar="FILE")
+    parser.add_option("--pool",
+                      dest="pool",
+                      action="store_true",
+                      default=False,
+                      help="also use the other trials saved in the store")
+    parser.add_option("--profile",
+                      dest="profile",
+                      action="store_true",
+                      default=False,
+                      help="print the time spent in each phase and counters")
+    parser.add_option("--profile-json",
+                      dest="profile_json",
+                      type="string",
+                      default=None,
+                      help="write the profile to FILE as JSON",
+                      metavar="FILE")
     (opts, args) = parser.parse_args()
+    if opts.store and opts.seed is None:
+        parser.error("--store requires --seed")
+    if opts.pool and not opts.store:
+        parser.error("--pool requires --store")
+    if opts.rel_error is not None and opts.max_trials is None:
+        parser.error("--rel-error requires --max-trials")
+    if opts.max_trials is not None and opts.rel_error is None:
+        parser.error("--max-trials requires --rel-error")
     if len(args) != 1:
         parser.error("required a json file which define the ensemble")
     if not os.access(args[0], os.R_OK):
@@ -46,21 +104,53 @@ def lp_ip_ensemble_experiment():
     random.seed(opts.seed)
     ensemble_def = fjutil.load_json_file(json_file)
     ensemble = fjgraph.GraphEnsembleFactory().create(**ensemble_def)
+    store = None
+    if opts.store:
+        store = fjstore.TrialStore(opts.store)
+    profiler = None
+    if opts.profile or opts.profile_json:
+        profiler = fjutil.Profiler()
+    runner = fjexperiment.TrialRunner(seed=opts.seed, jobs=opts.jobs,
+                                      store=store, pool_trials=opts.pool,
+                                      rel_error=opts.rel_error,
+                                      max_trials=opts.max_trials,
+                                      profiler=profiler)
+    solver = fjgraph.VertexCoverSolver(backend=opts.solver)
     print("ensemble: {}".format(ensemble))
     print("num_of_trials: {}".format(opts.trials))
     print("seed: {}".format(opts.seed))
+    print("jobs: {}".format(opts.jobs))
+    print("store: {}".format(opts.store))
+    print("rel_error: {}".format(opts.rel_error))
+    print("max_trials: {}".format(opts.max_trials))
+    print("solver: {}".format(opts.solver))
     print()
 
     # 結果出力
-    r = fjexperiment.ip_lp_ensemble(ensemble, opts.trials)
+    r = fjexperiment.ip_lp_ensemble(ensemble, opts.trials, runner,
+                                       solver=solver)
     print("= main result =")
-    print("ave_num_of_one_half: {:.4} ({:.2%})".format(
-            r["ave_num_of_one_half"], r["ave_num_of_one_half_ratio"]))
-    print("ave_opt_ration: {:.4}".format(r["ave_opt_ration"]))
-    print("ave_lp_opt_value: {:.4}".format(r["ave_lp_opt_value"]))
-    print("ave_ip_opt_value: {:.4}".format(r["ave_ip_opt_value"]))
-    print("lp_equal_ip_prob: {:.4}".format(r["lp_equal_ip_prob"]))
-    print("ave_difference_opt: {:.4}".format(r["ave_difference_opt"]))
+    if opts.rel_error is None:
+        print("ave_num_of_one_half: {:.4} ({:.2%})".format(
+                r["ave_num_of_one_half"], r["ave_num_of_one_half_ratio"]))
+        print("ave_opt_ration: {:.4}".format(r["ave_opt_ration"]))
+        print("ave_lp_opt_value: {:.4}".format(r["ave_lp_opt_value"]))
+        print("ave_ip_opt_value: {:.4}".format(r["ave_ip_opt_value"]))
+        print("lp_equal_ip_prob: {:.4}".format(r["lp_equal_ip_prob"]))
+        print("ave_difference_opt: {:.4}".format(r["ave_difference_opt"]))
+        fjutil.output_profile(profiler, opts.profile, opts.profile_json)
+        return
+
+    # 逐次停止モードでは95%信頼区間も出す
+    print("num_of_trials: {}".format(r["num_of_trials"]))
+    for key in ["ave_num_of_one_half", "ave_opt_ration", "ave_lp_opt_value",
+                "ave_ip_opt_value", "lp_equal_ip_prob", "ave_difference_opt"]:
+        if key + "_interval" in r:
+            low, high = r[key + "_interval"]
+        else:
+            low, high = fjutil.normal_interval(r[key], r[key + "_stderr"])
+        print("{}: {:.4} [{:.4}, {:.4}]".format(key, r[key], low, high))
+    fjutil.output_profile(profiler, opts.profile, opts.profile_json)
 
 
 if __name__ == "__main__":
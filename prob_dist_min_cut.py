@@ -10,6 +10,7 @@ from __future__ import division, print_function
 import fjgraph
 import fjutil
 import fjexperiment
+import fjstore
 import random
 
 
@@ -29,6 +30,51 @@ def parse_arguments():
                       default=None,
                       help="set the seed for the random module",
                       metavar="STRING")
+    parser.add_option("-j", "--jobs",
+                      dest="jobs",
+                      type="int",
+                      default=1,
+                      help="set the number of worker processes",
+                      metavar="NUMBER")
+    parser.add_option("--rel-error",
+                      dest="rel_error",
+                      type="float",
+                      default=None,
+                      help="run trials in batches of --trials until the "
+                           "confidence intervals are within this relative "
+                           "error",
+                      metavar="NUMBER")
+    parser.add_option("--max-trials",
+                      dest="max_trials",
+                      type="int",
+                      default=None,
+                      help="set the maximum number of trials for --rel-error",
+                      metavar="NUMBER")
+    parser.add_option("--rare-event",
+                      dest="rare_event",
+                      type="int",
+                      default=None,
+                      help="estimate the probabilities around DELTA by "
+                           "importance sampling "
+                           "(SpecifiedDegreeDistEnsemble only)",
+                      metavar="DELTA")
+    parser.add_option("--store",
+                      dest="store",
+                      type="string",
+                      default=None,
+                      help="save trial results to FILE and skip saved trials",
+                      metavar="FILE")
+    parser.add_option("--pool",
+                      dest="pool",
+                      action="store_true",
+                      default=False,
+                      help="also use the other trials saved in the store")
+    parser.add_option("-c", "--cache",
+                      dest="cache",
+                      type="int",
+                      default=0,
+                      help="cache results of up to SIZE isomorphism classes",
+                      metavar="SIZE")
     parser.add_option("--non-cumulative",
                       dest="non_cumulative",
                       action="store_true",
@@ -40,7 +86,30 @@ def parse_arguments():
                       default=None,
                       help="set the output file prefix",
                       metavar="FILE")
+    parser.add_option("--profile",
+                      dest="profile",
+                      action="store_true",
+                      default=False,
+                      help="print the time spent in each phase and counters")
+    parser.add_option("--profile-json",
+                      dest="profile_json",
+                      type="string",
+                      default=None,
+                      help="write the profile to FILE as JSON",
+                      metavar="FILE")
     (opts, args) = parser.parse_args()
+    if opts.store and opts.seed is None:
+        parser.error("--store requires --seed")
+    if opts.pool and not opts.store:
+        parser.error("--pool requires --store")
+    if opts.rel_error is not None and opts.max_trials is None:
+        parser.error("--rel-error requires --max-trials")
+    if opts.max_trials is not None and opts.rel_error is None:
+        parser.error("--max-trials requires --rel-error")
+    if opts.rare_event is not None and opts.rel_error is not None:
+        parser.error("--rare-event cannot be used with --rel-error")
+    if opts.rare_event is not None and opts.non_cumulative:
+        parser.error("--rare-event cannot be used with --non-cumulative")
     if len(args) != 1:
         parser.error("required a json file which define the ensemble")
     if not os.access(args[0], os.R_OK):
@@ -48,6 +117,27 @@ def parse_arguments():
     return (opts, args[0])
 
 
+def print_dist(dist, num_of_trials, with_interval):
+    "分布を書き出す．with_intervalがTrueなら各確率の95%信頼区間も書き出す"
+
+    if with_interval:
+        fjutil.print_dist_with_interval(dist, num_of_trials)
+    else:
+        fjutil.print_dist(dist, format="{:>5}: {}")
+
+
+def print_rare_event_result(r):
+    "重点サンプリングの推定値と診断情報を書き出す"
+
+    fjutil.print_dist_with_stderr(r["tail_prob_dist"], r["tail_prob_stderr"])
+    print("importance sampling for x >= {} (plain Monte Carlo below)".format(
+        r["importance_sampling_from"]))
+    print("theta: ({:.4}, {:.4})".format(*r["theta"]))
+    print("levels: {}".format(r["levels"]))
+    print("ess: {:.1f} / {}".format(r["ess"], r["num_of_trials"]))
+    print("tail_ess: {:.1f}".format(r["tail_ess"]))
+
+
 def prob_dist_min_cut_experiment():
     # 引数処理
     (opts, json_file) = parse_arguments()
@@ -58,29 +148,77 @@ def prob_dist_min_cut_experiment():
     ensemble_def = fjutil.load_json_file(json_file)
     ensemble = fjgraph.GraphEnsembleFactory().create(**ensemble_def)
     num_of_trials = opts.trials
+    cache = None
+    if opts.cache > 0:
+        cache = fjgraph.IsomorphismCache(opts.cache)
+    store = None
+    if opts.store:
+        store = fjstore.TrialStore(opts.store)
+    profiler = None
+    if opts.profile or opts.profile_json:
+        profiler = fjutil.Profiler()
+    runner = fjexperiment.TrialRunner(seed=opts.seed, jobs=opts.jobs,
+                                      cache=cache, store=store,
+                                      pool_trials=opts.pool,
+                                      rel_error=opts.rel_error,
+                                      max_trials=opts.max_trials,
+                                      profiler=profiler)
     print("ensemble: {}".format(ensemble))
     print("seed: {}".format(opts.seed))
     print("num_of_trials: {}".format(num_of_trials))
+    print("jobs: {}".format(opts.jobs))
+    print("store: {}".format(opts.store))
+    print("rel_error: {}".format(opts.rel_error))
+    print("max_trials: {}".format(opts.max_trials))
+    print("rare_event: {}".format(opts.rare_event))
+    print("cache: {}".format(opts.cache))
     print()
 
+    # 重点サンプリングによる実験
+    if opts.rare_event is not None:
+        global_result = fjexperiment.rare_event_prob_dist_min_cut(
+            ensemble, num_of_trials, opts.rare_event, "global", runner)
+        st_result = fjexperiment.rare_event_prob_dist_min_cut(
+            ensemble, num_of_trials, opts.rare_event, "st", runner)
+
+        print("= main result =")
+        print(u"全域最小カット重みがdelta以上の確率分布（重点サンプリング）:")
+        print_rare_event_result(global_result)
+        print(u"s-t最小カット重みがdelta以上の確率分布（重点サンプリング）:")
+        print_rare_event_result(st_result)
+
+        if opts.output:
+            global_file = open(opts.output + "-global.dat", "w")
+            st_file = open(opts.output + "-st.dat", "w")
+            fjutil.output_dist(global_result["tail_prob_dist"], global_file)
+            fjutil.output_dist(st_result["tail_prob_dist"], st_file)
+        fjutil.output_profile(profiler, opts.profile, opts.profile_json)
+        return
+
     # 実験
-    global_prob_dist = fjexperiment.prob_dist_global_min_cut(ensemble, num_of_trials)
+    global_prob_dist = fjexperiment.prob_dist_global_min_cut(ensemble, num_of_trials, runner)
+    global_num_of_trials = runner.num_of_results
     c_global_prob_dist = fjutil.cumulative_prob_dist(global_prob_dist, step=1)
-    st_prob_dist = fjexperiment.prob_dist_st_min_cut(ensemble, num_of_trials)
+    st_prob_dist = fjexperiment.prob_dist_st_min_cut(ensemble, num_of_trials, runner)
+    st_num_of_trials = runner.num_of_results
     c_st_prob_dist = fjutil.cumulative_prob_dist(st_prob_dist, step=1)
 
     print("= main result =")
 
     if opts.non_cumulative:
         print(u"全域最小カット重みの確率分布:")
-        fjutil.print_dist(global_prob_dist, format="{:>5}: {}")
+        print_dist(global_prob_dist, global_num_of_trials,
+                   opts.rel_error is not None)
         print(u"s-t最小カット重みの確率分布:")
-        fjutil.print_dist(st_prob_dist, format="{:>5}: {}")
+        print_dist(st_prob_dist, st_num_of_trials,
+                   opts.rel_error is not None)
     else:
         print(u"全域最小カット重みがdelta以上の確率分布:")
-        fjutil.print_dist(c_global_prob_dist, format="{:>5}: {}")
+        print_dist(c_global_prob_dist, global_num_of_trials,
+                   opts.rel_error is not None)
         print(u"s-t最小カット重みがdelta以上の確率分布:")
-        fjutil.print_dist(c_st_prob_dist, format="{:>5}: {}")
+        print_dist(c_st_prob_dist, st_num_of_trials,
+                   opts.rel_error is not None)
 
     # ファイル出力
     if opts.output:
@@ -93,6 +231,8 @@ def prob_dist_min_cut_experiment():
             fjutil.output_dist(c_global_prob_dist, global_file)
             fjutil.output_dist(c_st_prob_dist, st_file)
 
+    fjutil.output_profile(profiler, opts.profile, opts.profile_json)
+
 
 if __name__ == "__main__":
     prob_dist_min_cut_experiment()
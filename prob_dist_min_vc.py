@@ -10,6 +10,7 @@ from __future__ import division, print_function
 import fjgraph
 import fjutil
 import fjexperiment
+import fjstore
 import random
 
 
@@ -29,6 +30,52 @@ def parse_arguments():
                       default=None,
                       help="set the seed for the random module",
                       metavar="STRING")
+    parser.add_option("-j", "--jobs",
+                      dest="jobs",
+                      type="int",
+                      default=1,
+                      help="set the number of worker processes",
+                      metavar="NUMBER")
+    parser.add_option("--solver",
+                      dest="solver",
+                      type="choice",
+                      choices=["cplex", "native"],
+                      default="cplex",
+                      help="set the vertex cover solver (cplex or native)",
+                      metavar="NAME")
+    parser.add_option("--rel-error",
+                      dest="rel_error",
+                      type="float",
+                      default=None,
+                      help="run trials in batches of --trials until the "
+                           "confidence intervals are within this relative "
+                           "error",
+                      metavar="NUMBER")
+    parser.add_option("--max-trials",
+                      dest="max_trials",
+                      type="int",
+                      default=None,
+                      help="set the maximum number of trials for --rel-error",
+                      metavar="NUMBER")
+    parser.add_option("--rare-event",
+                      dest="rare_event",
+                      type="float",
+                      default=None,
+                      help="estimate the probabilities around DELTA by "
+                           "importance sampling "
+                           "(SpecifiedDegreeDistEnsemble only)",
+                      metavar="DELTA")
+    parser.add_option("--store",
+                      dest="store",
+                      type="string",
+                      default=None,
+                      help="save trial results to FILE and skip saved trials",
+                      metavar="FILE")
+    parser.add_option("--pool",
+                      dest="pool",
+                      action="store_true",
+                      default=False,
+                      help="also use the other trials saved in the store")
     parser.add_option("--non-cumulative",
                       dest="non_cumulative",
                       action="store_true",
@@ -40,7 +87,30 @@ def parse_arguments():
                       default=None,
                       help="set the output file prefix",
                       metavar="FILE")
+    parser.add_option("--profile",
+                      dest="profile",
+                      action="store_true",
+                      default=False,
+                      help="print the time spent in each phase and counters")
+    parser.add_option("--profile-json",
+                      dest="profile_json",
+                      type="string",
+                      default=None,
+                      help="write the profile to FILE as JSON",
+                      metavar="FILE")
     (opts, args) = parser.parse_args()
+    if opts.store and opts.seed is None:
+        parser.error("--store requires --seed")
+    if opts.pool and not opts.store:
+        parser.error("--pool requires --store")
+    if opts.rel_error is not None and opts.max_trials is None:
+        parser.error("--rel-error requires --max-trials")
+    if opts.max_trials is not None and opts.rel_error is None:
+        parser.error("--max-trials requires --rel-error")
+    if opts.rare_event is not None and opts.rel_error is not None:
+        parser.error("--rare-event cannot be used with --rel-error")
+    if opts.rare_event is not None and opts.non_cumulative:
+        parser.error("--rare-event cannot be used with --non-cumulative")
     if len(args) != 1:
         parser.error("required a json file which define the ensemble")
     if not os.access(args[0], os.R_OK):
@@ -48,6 +118,27 @@ def parse_arguments():
     return (opts, args[0])
 
 
+def print_dist(dist, num_of_trials, with_interval):
+    "分布を書き出す．with_intervalがTrueなら各確率の95%信頼区間も書き出す"
+
+    if with_interval:
+        fjutil.print_dist_with_interval(dist, num_of_trials)
+    else:
+        fjutil.print_dist(dist, format="{:>5}: {}")
+
+
+def print_rare_event_result(r):
+    "重点サンプリングの推定値と診断情報を書き出す"
+
+    fjutil.print_dist_with_stderr(r["tail_prob_dist"], r["tail_prob_stderr"])
+    print("importance sampling for x >= {} (plain Monte Carlo below)".format(
+        r["importance_sampling_from"]))
+    print("theta: ({:.4}, {:.4})".format(*r["theta"]))
+    print("levels: {}".format(r["levels"]))
+    print("ess: {:.1f} / {}".format(r["ess"], r["num_of_trials"]))
+    print("tail_ess: {:.1f}".format(r["tail_ess"]))
+
+
 def prob_dist_min_vertex_cover_experiment():
     # 引数処理
     (opts, json_file) = parse_arguments()
@@ -58,33 +149,82 @@ def prob_dist_min_vertex_cover_experiment():
     ensemble_def = fjutil.load_json_file(json_file)
     ensemble = fjgraph.GraphEnsembleFactory().create(**ensemble_def)
     num_of_trials = opts.trials
+    store = None
+    if opts.store:
+        store = fjstore.TrialStore(opts.store)
+    profiler = None
+    if opts.profile or opts.profile_json:
+        profiler = fjutil.Profiler()
+    runner = fjexperiment.TrialRunner(seed=opts.seed, jobs=opts.jobs,
+                                      store=store, pool_trials=opts.pool,
+                                      rel_error=opts.rel_error,
+                                      max_trials=opts.max_trials,
+                                      profiler=profiler)
+    solver = fjgraph.VertexCoverSolver(backend=opts.solver)
     print("ensemble: {}".format(ensemble))
     print("seed: {}".format(opts.seed))
     print("num_of_trials: {}".format(num_of_trials))
+    print("jobs: {}".format(opts.jobs))
+    print("store: {}".format(opts.store))
+    print("rel_error: {}".format(opts.rel_error))
+    print("max_trials: {}".format(opts.max_trials))
+    print("rare_event: {}".format(opts.rare_event))
+    print("solver: {}".format(opts.solver))
     print()
 
+    # 重点サンプリングによる実験
+    if opts.rare_event is not None:
+        ip_result = fjexperiment.rare_event_prob_dist_min_vertex_cover(
+            ensemble, num_of_trials, opts.rare_event, "IP", runner, solver)
+        lp_result = fjexperiment.rare_event_prob_dist_min_vertex_cover(
+            ensemble, num_of_trials, opts.rare_event, "LP", runner, solver)
+
+        print("= main result =")
+        print(u"最小頂点被覆サイズがdelta以上の確率分布（重点サンプリング）:")
+        print_rare_event_result(ip_result)
+        print()
+        print(u"半整数を許したときの最小頂点被覆サイズがdelta以上の確率分布"
+              u"（重点サンプリング）:")
+        print_rare_event_result(lp_result)
+
+        if opts.output:
+            ip_file = open(opts.output + "-ip.dat", "w")
+            lp_file = open(opts.output + "-lp.dat", "w")
+            fjutil.output_dist(ip_result["tail_prob_dist"], ip_file)
+            fjutil.output_dist(lp_result["tail_prob_dist"], lp_file)
+        fjutil.output_profile(profiler, opts.profile, opts.profile_json)
+        return
+
     # 実験
-    ip_prob_dist = fjexperiment.prob_dist_min_vertex_cover(ensemble, num_of_trials)
+    ip_prob_dist = fjexperiment.prob_dist_min_vertex_cover(
+        ensemble, num_of_trials, runner, solver=solver)
+    ip_num_of_trials = runner.num_of_results
     ip_c_prob_dist = fjutil.cumulative_prob_dist(ip_prob_dist, step=1)
-    lp_prob_dist = fjexperiment.prob_dist_lp_min_vertex_cover(ensemble, num_of_trials)
+    lp_prob_dist = fjexperiment.prob_dist_lp_min_vertex_cover(
+        ensemble, num_of_trials, runner, solver=solver)
+    lp_num_of_trials = runner.num_of_results
     lp_c_prob_dist = fjutil.cumulative_prob_dist(lp_prob_dist, step=0.5)
 
     print("= main result =")
 
     if opts.non_cumulative:
         print(u"最小頂点被覆サイズの確率分布:")
-        fjutil.print_dist(ip_prob_dist, format="{:>5}: {}")
+        print_dist(ip_prob_dist, ip_num_of_trials,
+                   opts.rel_error is not None)
     else:
         print(u"最小頂点被覆サイズがdelta以上の確率分布:")
-        fjutil.print_dist(ip_c_prob_dist, format="{:>5}: {}")
+        print_dist(ip_c_prob_dist, ip_num_of_trials,
+                   opts.rel_error is not None)
     print()
 
     if opts.non_cumulative:
         print(u"半整数を許したときの最小頂点被覆サイズの確率分布:")
-        fjutil.print_dist(lp_prob_dist, format="{:>5}: {}")
+        print_dist(lp_prob_dist, lp_num_of_trials,
+                   opts.rel_error is not None)
     else:
         print(u"半整数を許したときの最小頂点被覆サイズがdelta以上の確率分布:")
-        fjutil.print_dist(lp_c_prob_dist, format="{:>5}: {}")
+        print_dist(lp_c_prob_dist, lp_num_of_trials,
+                   opts.rel_error is not None)
 
     # ファイル出力
     if opts.output:
@@ -97,6 +237,8 @@ def prob_dist_min_vertex_cover_experiment():
             fjutil.output_dist(ip_c_prob_dist, ip_file)
             fjutil.output_dist(lp_c_prob_dist, lp_file)
 
+    fjutil.output_profile(profiler, opts.profile, opts.profile_json)
+
 
 if __name__ == "__main__":
     prob_dist_min_vertex_cover_experiment()
@@ -0,0 +1,84 @@
+# coding: utf-8
+
+import unittest
+import fjbench
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+def _results(seconds):
+    "{ケース名: 時間}からrunの結果の形のdictを作る．時間がNoneなら飛ばしたケース"
+
+    results = {}
+    for name, value in seconds.items():
+        if value is None:
+            results[name] = {"params": {}, "skipped": u"No module named cplex"}
+        else:
+            results[name] = {"params": {}, "seconds": value, "median": value,
+                             "repeat": 3, "number": 1}
+    return {"meta": {"seed": "0"}, "results": results}
+
+
+class CompareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.old = _results({"slower": 1.0, "faster": 1.0, "same": 1.0,
+                             "zero": 0.0, "skipped": 1.0, "old_only": 1.0})
+        self.new = _results({"slower": 1.2, "faster": 0.8, "same": 1.05,
+                             "zero": 0.5, "skipped": None, "new_only": 1.0})
+
+    def test_verdicts(self):
+        rows = fjbench.compare(self.old, self.new, threshold=0.1)
+        self.assertEqual([row[0] for row in rows],
+                         ["faster", "same", "slower", "zero"])
+        verdicts = dict((row[0], row[4]) for row in rows)
+        self.assertEqual(verdicts, {"faster": "improvement", "same": "",
+                                    "slower": "regression", "zero": ""})
+        ratios = dict((row[0], row[3]) for row in rows)
+        self.assertAlmostEqual(ratios["slower"], 1.2)
+        self.assertEqual(ratios["zero"], 1.0)
+
+    def test_threshold(self):
+        rows = fjbench.compare(self.old, self.new, threshold=0.25)
+        self.assertEqual([row[4] for row in rows], ["", "", "", ""])
+
+    def test_run_case_skipped(self):
+        def setup():
+            import no_such_module_for_fjbench
+        case = fjbench.BenchmarkCase("missing", {"n": 1}, setup)
+        result = fjbench.run_case(case, 0)
+        self.assertEqual(result["params"], {"n": 1})
+        self.assertTrue("skipped" in result)
+        self.assertFalse("seconds" in result)
+
+    def test_exit_status(self):
+        # 遅くなったケースがあるときだけ終了ステータスが1になる
+        directory = tempfile.mkdtemp()
+        try:
+            paths = {}
+            for name, data in [("old", self.old), ("new", self.new),
+                               ("same", _results({"same": 1.05})),
+                               ("improved", _results({"faster": 0.8,
+                                                      "same": 1.0}))]:
+                paths[name] = os.path.join(directory, name + ".json")
+                with open(paths[name], "w") as f:
+                    json.dump(data, f)
+
+            def compare(old, new):
+                script = os.path.join(os.path.dirname(
+                    os.path.abspath(__file__)), "benchmark.py")
+                process = subprocess.Popen(
+                    [sys.executable, script, "compare", old, new],
+                    stdout=subprocess.PIPE)
+                process.communicate()
+                return process.returncode
+
+            self.assertEqual(compare(paths["old"], paths["new"]), 1)
+            self.assertEqual(compare(paths["old"], paths["same"]), 0)
+            self.assertEqual(compare(paths["old"], paths["improved"]), 0)
+        finally:
+            shutil.rmtree(directory)
@@ -2,10 +2,27 @@
 
 import unittest
 import fjgraph
+import itertools
 import networkx
+import random
 from collections import Counter
 
 
+def _disconnected_graph():
+    "孤立点，孤立した多重辺，自己ループのある成分を含むグラフ"
+
+    G = networkx.MultiGraph()
+    G.add_nodes_from(range(8))
+    G.add_edge(0, 3)
+    G.add_edge(3, 5)
+    G.add_edge(5, 0)
+    G.add_edge(5, 5)
+    G.add_edge(1, 4)
+    G.add_edge(1, 4)
+    G.add_edge(6, 7)
+    return G
+
+
 class IncidenceGraphTest(unittest.TestCase):
 
     def setUp(self):
@@ -28,6 +45,324 @@ class IncidenceGraphTest(unittest.TestCase):
         cvalues = incidence_graph.calc_check_values([0] * n)
         self.assertEqual(cvalues, [0] * m)
 
+    def test_calc_check_values_many(self):
+        n = self.G.number_of_nodes()
+        assignments = [[0, 1, 2, 1, 0], [1, 1, 0, 0, 1], [0] * n]
+        check_functions = [fjgraph.check_sum, fjgraph.check_inequality,
+                           lambda u, v: u * v]
+        for check_function in check_functions:
+            incidence_graph = fjgraph.IncidenceGraph(self.G, check_function)
+            cvalues = incidence_graph.calc_check_values_many(assignments)
+            self.assertEqual(cvalues.tolist(),
+                             [incidence_graph.calc_check_values(values)
+                              for values in assignments])
+        self.assertRaises(ValueError, incidence_graph.calc_check_values_many,
+                          [[0] * (n + 1)])
+
+
+class CompactGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        G = networkx.MultiGraph()
+        G.add_nodes_from(range(5))
+        G.add_edge(0, 1, weight=2)
+        G.add_edge(0, 1, weight=1)
+        G.add_edge(1, 2, weight=1)
+        G.add_edge(2, 2, weight=1)
+        G.add_edge(3, 0, weight=3)
+        self.G = G
+
+    def test_networkx_conversion(self):
+        C = fjgraph.CompactGraph.from_networkx(self.G)
+        self.assertEqual(C.number_of_nodes(), 5)
+        self.assertEqual(C.number_of_edges(), 5)
+        self.assertTrue(C.is_multigraph())
+        H = C.to_networkx()
+        edges = lambda G: sorted((u, v, attr["weight"])
+                                 for u, v, attr in G.edges(data=True))
+        self.assertEqual(edges(H), edges(self.G))
+
+    def test_csr(self):
+        C = fjgraph.CompactGraph.from_networkx(self.G)
+        self.assertEqual(sorted(C.neighbors(0)), [1, 1, 3])
+        self.assertEqual(sorted(C.neighbors(2)), [1, 2])
+        self.assertEqual(C.neighbors(4), [])
+        for v in self.G.nodes():
+            self.assertEqual(C.degree(v), self.G.degree(v))
+
+    def test_generate_compact_graph(self):
+        ensembles = [
+            fjgraph.MultiGraphEnsemble(6, 9),
+            fjgraph.SpecifiedDegreeDistEnsemble([1, 2, 3, 2]),
+            fjgraph.NMGraphEnsemble(6, 7),
+        ]
+        for ensemble in ensembles:
+            random.seed(1)
+            G = ensemble.generate_graph()
+            random.seed(1)
+            C = ensemble.generate_compact_graph()
+            self.assertEqual(
+                sorted(tuple(sorted(edge)) for edge in C.edges()),
+                sorted(tuple(sorted(edge)) for edge in G.edges()))
+
+    def test_calculators(self):
+        G = fjgraph.SpecifiedDegreeDistEnsemble([0, 2, 4, 2]).generate_graph()
+        C = fjgraph.CompactGraph.from_networkx(G)
+        calc = fjgraph.MinCutCalculator()
+        for algorithm in ["maxflow", "stoer_wagner"]:
+            self.assertEqual(calc.global_mincut(C, algorithm=algorithm),
+                             calc.global_mincut(G, algorithm=algorithm))
+        self.assertEqual(calc.st_mincut(C, 0, 1), calc.st_mincut(G, 0, 1))
+        vc_calc = fjgraph.VertexCoverDistCalculator()
+        self.assertEqual(vc_calc.vertex_cover_dist(C),
+                         vc_calc.vertex_cover_dist(G))
+        cut_calc = fjgraph.CutSetDistCalculator(workers=2)
+        cut_calc.min_parallel_assignments = 0
+        self.assertEqual(cut_calc.detailed_global_cutset_dist(C, "gray"),
+                         cut_calc.detailed_global_cutset_dist(G, "gray"))
+        cut_calc.close()
+
+
+class GenerateGraphsTest(unittest.TestCase):
+
+    def test_multi_graph(self):
+        ensemble = fjgraph.MultiGraphEnsemble(5, 7)
+        edges = ensemble.generate_graphs(10)
+        self.assertEqual(edges.shape, (10, 7, 2))
+        self.assertTrue(edges.min() >= 0 and edges.max() < 5)
+
+    def test_specified_degree_dist(self):
+        degree_dist = [1, 2, 3, 2]
+        ensemble = fjgraph.SpecifiedDegreeDistEnsemble(degree_dist)
+        edges = ensemble.generate_graphs(10)
+        self.assertEqual(edges.shape, (10, ensemble.num_of_edges(), 2))
+        for instance in edges:
+            degrees = Counter(instance.flatten().tolist())
+            self.assertEqual(
+                sorted(degrees[v] for v in range(ensemble.num_of_nodes())),
+                [d for d, dist in enumerate(degree_dist)
+                 for i in range(dist)])
+
+    def test_nm_graph(self):
+        ensemble = fjgraph.NMGraphEnsemble(6, 10)
+        edges = ensemble.generate_graphs(10)
+        self.assertEqual(edges.shape, (10, 10, 2))
+        for instance in edges:
+            pairs = set(tuple(sorted(edge)) for edge in instance.tolist())
+            self.assertEqual(len(pairs), 10)
+            self.assertTrue(all(u != v for u, v in pairs))
+
+    def test_sparse_nm_graph(self):
+        # 頂点対をすべて並べずに選ぶので，大きいnでもすぐ終わる
+        n, m, k = 1000, 1500, 10
+        edges = fjgraph.NMGraphEnsemble(n, m).generate_graphs(k)
+        self.assertEqual(edges.shape, (k, m, 2))
+        for instance in edges:
+            pairs = set(tuple(sorted(edge)) for edge in instance.tolist())
+            self.assertEqual(len(pairs), m)
+            self.assertTrue(all(u != v for u, v in pairs))
+            self.assertTrue(min(min(pair) for pair in pairs) >= 0)
+            self.assertTrue(max(max(pair) for pair in pairs) < n)
+
+        # 5頂点3辺では，120通りの辺の組がほぼ同じ回数だけ出る
+        edges = fjgraph.NMGraphEnsemble(5, 3).generate_graphs(12000)
+        counts = Counter(tuple(sorted(tuple(sorted(edge))
+                                      for edge in instance))
+                         for instance in edges.tolist())
+        self.assertEqual(len(counts), 120)
+        self.assertTrue(all(50 < c < 150 for c in counts.values()))
+
+    def test_erdos_renyi_graph(self):
+        ensemble = fjgraph.ErdosRenyiGraphEnsemble(5, 0.5)
+        self.assertRaises(fjgraph.FJGraphError, ensemble.generate_graphs, 2)
+
+
+class TiltedCompactGraphTest(unittest.TestCase):
+
+    def test_degrees(self):
+        degree_dist = [1, 2, 3, 2]
+        ensemble = fjgraph.SpecifiedDegreeDistEnsemble(degree_dist)
+        for theta in [(0.0, 0.0), (2.0, -1.0), (-3.0, 3.0)]:
+            steps = Counter()
+            G, log_ratio = ensemble.generate_tilted_compact_graph(theta, steps)
+            self.assertEqual(G.number_of_edges(), ensemble.num_of_edges())
+            self.assertEqual(
+                sorted(G.degree(v) for v in G.nodes()),
+                [d for d, dist in enumerate(degree_dist)
+                 for i in range(dist)])
+            self.assertEqual(sum(steps.values()), ensemble.num_of_edges())
+            if theta == (0.0, 0.0):
+                self.assertEqual(log_ratio, 0.0)
+
+    def test_likelihood_ratio(self):
+        "次数2の頂点2つ: 自己ループ2つになる確率は1/3"
+
+        import math
+        ensemble = fjgraph.SpecifiedDegreeDistEnsemble([0, 0, 2])
+        theta = (1.5, -2.0)
+        loop_prob = math.exp(theta[0]) / (math.exp(theta[0]) + 2)
+        for i in range(20):
+            G, log_ratio = ensemble.generate_tilted_compact_graph(theta)
+            if all(u == v for u, v in G.edges()):
+                expected = (1 / 3.0) / loop_prob
+            else:
+                expected = (2 / 3.0) / (1 - loop_prob)
+            self.assertAlmostEqual(math.exp(log_ratio), expected)
+
+
+class IsomorphismCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.G = networkx.MultiGraph()
+        self.G.add_edge(0, 1)
+        self.G.add_edge(0, 1)
+        self.G.add_edge(1, 2)
+        self.G.add_edge(2, 2)
+        # Gの頂点を0->2, 1->0, 2->1と付け替えたもの
+        self.H = networkx.MultiGraph()
+        self.H.add_edge(2, 0)
+        self.H.add_edge(2, 0)
+        self.H.add_edge(0, 1)
+        self.H.add_edge(1, 1)
+
+    def test_isomorphic_graph(self):
+        cache = fjgraph.IsomorphismCache()
+        calc = fjgraph.VertexCoverDistCalculator(cache=cache)
+        dist = calc.vertex_cover_dist(self.G)
+        self.assertEqual(calc.vertex_cover_dist(self.H), dist)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        K = networkx.MultiGraph()
+        K.add_edge(0, 1)
+        K.add_edge(1, 2)
+        K.add_edge(2, 2)
+        K.add_edge(2, 2)
+        calc.vertex_cover_dist(K)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_marks(self):
+        cache = fjgraph.IsomorphismCache()
+        calc = fjgraph.CutSetDistCalculator(cache=cache)
+        calc.detailed_st_cutset_dist(self.G, 0, 1)
+        calc.detailed_st_cutset_dist(self.H, 2, 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(calc.detailed_st_cutset_dist(self.H, 0, 1),
+                         fjgraph.CutSetDistCalculator().
+                         detailed_st_cutset_dist(self.H, 0, 1))
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_maxsize(self):
+        cache = fjgraph.IsomorphismCache(maxsize=1)
+        calc = fjgraph.MinCutCalculator(cache=cache)
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1, weight=1)
+        calc.global_mincut(G)
+        calc.global_mincut(self.G)
+        calc.global_mincut(G)
+        self.assertEqual((cache.hits, cache.misses), (0, 3))
+        self.assertEqual(len(cache), 1)
+
+
+class VertexCoverDistCalculatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calc = fjgraph.VertexCoverDistCalculator()
+        self.G = networkx.MultiGraph()
+        self.G.add_edge(0, 1)
+        self.G.add_edge(0, 1)
+        self.G.add_edge(1, 4)
+        self.G.add_edge(4, 3)
+        self.G.add_edge(3, 2)
+        self.G.add_edge(2, 0)
+        self.G.add_edge(1, 1)
+
+    def test_vertex_cover_dist(self):
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1)
+        G.add_edge(1, 2)
+
+        dist = self.calc.vertex_cover_dist(G)
+        self.assertEqual(dist, Counter({1: 1, 2: 3, 3: 1}))
+
+    def test_numpy_method(self):
+        dist = self.calc.vertex_cover_dist(self.G, method="numpy")
+        self.assertEqual(dist, self.calc.vertex_cover_dist(self.G))
+
+        ensemble = fjgraph.SpecifiedDegreeDistEnsemble([0, 4, 4, 2])
+        for i in range(5):
+            G = ensemble.generate_graph()
+            self.assertEqual(self.calc.vertex_cover_dist(G, method="numpy"),
+                             self.calc.vertex_cover_dist(G))
+
+    def test_branch_method(self):
+        dist = self.calc.vertex_cover_dist(self.G, method="branch")
+        self.assertEqual(dist, self.calc.vertex_cover_dist(self.G))
+
+        ensembles = [fjgraph.SpecifiedDegreeDistEnsemble([1, 2, 4, 2]),
+                     fjgraph.MultiGraphEnsemble(8, 10)]
+        for ensemble in ensembles:
+            for i in range(5):
+                G = ensemble.generate_graph()
+                self.assertEqual(
+                    self.calc.vertex_cover_dist(G, method="branch"),
+                    self.calc.vertex_cover_dist(G))
+
+    def test_unknown_method(self):
+        self.assertRaises(fjgraph.FJGraphError,
+                          self.calc.vertex_cover_dist, self.G, method="none")
+
+    def test_workers(self):
+        calc = fjgraph.VertexCoverDistCalculator(workers=2)
+        calc.min_parallel_assignments = 0
+        for method in ["naive", "numpy", "branch"]:
+            self.assertEqual(calc.vertex_cover_dist(self.G, method=method),
+                             self.calc.vertex_cover_dist(self.G))
+        self.assertEqual(calc.lp_vertex_cover_dist(self.G),
+                         self.calc.lp_vertex_cover_dist(self.G))
+        calc.close()
+
+    def test_pool_reuse(self):
+        # 小さいグラフではプールを作らず，作ったプールは使い回す
+        calc = fjgraph.VertexCoverDistCalculator(workers=2)
+        calc.vertex_cover_dist(self.G)
+        self.assertTrue(calc._pool is None)
+        calc.min_parallel_assignments = 0
+        calc.vertex_cover_dist(self.G)
+        pool = calc._pool
+        self.assertTrue(pool is not None)
+        calc.lp_vertex_cover_dist(self.G)
+        self.assertTrue(calc._pool is pool)
+        calc.close()
+        self.assertTrue(calc._pool is None)
+
+    def test_lp_pool_threshold(self):
+        # LPでは3^n通り，IPでは2^n通りの割り当てを調べるので，workers=2では
+        # LPはn=9から並列化し，IPはn=9でも並列化しない
+        def cycle(n):
+            return fjgraph.CompactGraph(n, list(range(n)),
+                                        [(v + 1) % n for v in range(n)])
+
+        calc = fjgraph.VertexCoverDistCalculator(workers=2)
+        self.assertEqual(calc.lp_vertex_cover_dist(cycle(8)),
+                         self.calc.lp_vertex_cover_dist(cycle(8)))
+        self.assertTrue(calc._pool is None)
+        self.assertEqual(calc.vertex_cover_dist(cycle(9)),
+                         self.calc.vertex_cover_dist(cycle(9)))
+        self.assertTrue(calc._pool is None)
+        self.assertEqual(calc.lp_vertex_cover_dist(cycle(9)),
+                         self.calc.lp_vertex_cover_dist(cycle(9)))
+        self.assertTrue(calc._pool is not None)
+        calc.close()
+
+    def test_split_components(self):
+        calc = fjgraph.VertexCoverDistCalculator(split_components=True)
+        G = _disconnected_graph()
+        for method in ["naive", "numpy", "branch"]:
+            self.assertEqual(calc.vertex_cover_dist(G, method=method),
+                             self.calc.vertex_cover_dist(G))
+        self.assertEqual(calc.lp_vertex_cover_dist(G),
+                         self.calc.lp_vertex_cover_dist(G))
+
 
 class VertexCoverSolverTest(unittest.TestCase):
 
@@ -76,6 +411,136 @@ class VertexCoverSolverTest(unittest.TestCase):
         self.assertEqual(ip_solution.values_dict(),
                          {0: 1.0})
 
+    def test_session(self):
+        G = networkx.complete_graph(4)
+        G.add_edge(4, 5)
+
+        with self.solver.session(G) as session:
+            lp_solution = session.lp_solve()
+            self.assertEqual(lp_solution.opt_value(), 3.0)
+            ip_solution = session.ip_solve()
+            self.assertEqual(ip_solution.opt_value(), 4.0)
+            # IPのあとでもう一度LPを解ける
+            self.assertEqual(session.lp_solve().values(),
+                             lp_solution.values())
+
+
+class NativeVertexCoverSolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.solver = fjgraph.VertexCoverSolver(backend="native")
+
+    def test_known_graphs(self):
+        G = networkx.Graph()
+        G.add_edge(0, 1)
+        G.add_edge(1, 2)
+        self.assertEqual(self.solver.lp_solve(G).values_dict(),
+                         {0: 0.0, 1: 1.0, 2: 0.0})
+
+        G = networkx.complete_graph(4)
+        self.assertEqual(self.solver.lp_solve(G).values_dict(),
+                         {0: 0.5, 1: 0.5, 2: 0.5, 3: 0.5})
+
+        G = networkx.MultiGraph()
+        G.add_edge(0, 0)
+        self.assertEqual(self.solver.lp_solve(G).values_dict(), {0: 0.5})
+
+    def test_lp_opt_value(self):
+        "LP最適値は，半整数の頂点被覆の最小の重みと一致する"
+
+        calc = fjgraph.VertexCoverDistCalculator()
+        ensemble = fjgraph.MultiGraphEnsemble(7, 9)
+        for i in range(20):
+            G = ensemble.generate_graph()
+            solution = self.solver.lp_solve(G)
+            values = solution.values_dict()
+            for u, v in G.edges():
+                self.assertTrue(values[u] + values[v] >= 1)
+            self.assertEqual(
+                solution.opt_value(),
+                min(s / 2.0 + t for s, t in calc.lp_vertex_cover_dist(G)))
+
+    def test_ip_known_graphs(self):
+        G = networkx.cycle_graph(5)
+        self.assertEqual(self.solver.ip_solve(G).opt_value(), 3)
+
+        G = networkx.petersen_graph()
+        self.assertEqual(self.solver.ip_solve(G).opt_value(), 6)
+
+        G = networkx.MultiGraph()
+        G.add_edge(0, 0)
+        G.add_edge(0, 1)
+        G.add_edge(1, 2)
+        G.add_edge(1, 2)
+        self.assertEqual(self.solver.ip_solve(G).values_dict(),
+                         {0: 1.0, 1: 1.0, 2: 0.0})
+
+    def test_ip_opt_value(self):
+        "IP最適値は，頂点被覆の最小の大きさと一致する"
+
+        calc = fjgraph.VertexCoverDistCalculator()
+        ensemble = fjgraph.MultiGraphEnsemble(9, 14)
+        for i in range(20):
+            G = ensemble.generate_graph()
+            solution = self.solver.ip_solve(G)
+            values = solution.values_dict()
+            for u, v in G.edges():
+                self.assertTrue(values[u] + values[v] >= 1)
+            self.assertEqual(solution.opt_value(),
+                             min(calc.vertex_cover_dist(G)))
+
+    def test_ip_folding(self):
+        "次数2の頂点の折りたたみを何重にも使うグラフ"
+
+        G = networkx.Graph()
+        for i in range(30):
+            G.add_edge(i, i + 1)
+            G.add_edge(i, (i * 7 + 3) % 31)
+        G.remove_edges_from(G.selfloop_edges())
+        solution = self.solver.ip_solve(G)
+        values = solution.values_dict()
+        for u, v in G.edges():
+            self.assertTrue(values[u] + values[v] >= 1)
+        calc = fjgraph.VertexCoverDistCalculator()
+        self.assertEqual(solution.opt_value(),
+                         min(calc.vertex_cover_dist(G, method="branch")))
+
+    def test_solve_many(self):
+        "solve_manyの解は1つずつ解いたものと同じで，順番も同じ"
+
+        ensemble = fjgraph.MultiGraphEnsemble(12, 15)
+        graphs = [ensemble.generate_graph() for i in range(10)]
+        for mode, solve in [("LP", self.solver.lp_solve),
+                            ("IP", self.solver.ip_solve)]:
+            expected = [solve(G).values_dict() for G in graphs]
+            for jobs in (1, 2):
+                solutions = self.solver.solve_many(iter(graphs), mode, jobs)
+                self.assertEqual([s.values_dict() for s in solutions],
+                                 expected)
+
+    def test_solve_many_stop(self):
+        "途中でやめてもよく，graphsは必要な分だけ読む"
+
+        ensemble = fjgraph.MultiGraphEnsemble(5, 6)
+        read = []
+
+        def graphs():
+            for i in range(100):
+                read.append(i)
+                yield ensemble.generate_graph()
+
+        solutions = self.solver.solve_many(graphs(), "IP")
+        for i in range(3):
+            next(solutions)
+        solutions.close()
+        self.assertTrue(len(read) < 10)
+
+        self.assertRaises(fjgraph.FJGraphError,
+                          self.solver.solve_many, [], "MIP")
+
+    def test_unknown_backend(self):
+        self.assertRaises(fjgraph.FJGraphError,
+                          fjgraph.VertexCoverSolver, backend="glpk")
 
 class ThreeWayCutSetDistCalculatorTest(unittest.TestCase):
     "ThreeWayCutSetDistCalculatorクラスのテスト"
@@ -143,6 +608,78 @@ class ThreeWayCutSetDistCalculatorTest(unittest.TestCase):
         self.assertEqual(ret[2], 0)
         self.assertEqual(ret[3], 1)
 
+    def test_use_symmetry(self):
+        "ラベルの対称性を使っても同じ詳細カットセット分布になる"
+
+        calc = self.calc
+
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1)
+        G.add_edge(0, 1)
+        G.add_edge(1, 2)
+        G.add_edge(2, 3)
+        G.add_edge(3, 3)
+
+        triangle = networkx.MultiGraph()
+        triangle.add_edge(0, 1)
+        triangle.add_edge(1, 2)
+        triangle.add_edge(2, 0)
+
+        for H in [triangle, G]:
+            self.assertEqual(calc.detailed_cutset_dist(H, use_symmetry=True),
+                             calc.detailed_cutset_dist(H))
+
+    def test_workers(self):
+        "並列に計算しても同じ詳細カットセット分布になる"
+
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1)
+        G.add_edge(1, 2)
+        G.add_edge(2, 3)
+        G.add_edge(3, 0)
+        G.add_edge(3, 3)
+
+        calc = fjgraph.ThreeWayCutSetDistCalculator(workers=2)
+        calc.min_parallel_assignments = 0
+        dist = self.calc.detailed_cutset_dist(G)
+        self.assertEqual(calc.detailed_cutset_dist(G), dist)
+        self.assertEqual(calc.detailed_cutset_dist(G, use_symmetry=True), dist)
+        calc.close()
+
+    def test_mitm_method(self):
+        "半分全列挙でも同じ詳細カットセット分布になる"
+
+        G = _disconnected_graph()
+        self.assertEqual(self.calc.detailed_cutset_dist(G, method="mitm"),
+                         self.calc.detailed_cutset_dist(G))
+        ensemble = fjgraph.SpecifiedDegreeDistEnsemble([0, 2, 3, 2])
+        for i in range(3):
+            G = ensemble.generate_graph()
+            self.assertEqual(self.calc.detailed_cutset_dist(G, method="mitm"),
+                             self.calc.detailed_cutset_dist(G))
+
+    def test_all_cutset_masks(self):
+        "ビットマスクで表したカットセットは，all_cutsetと一致する"
+
+        G = _disconnected_graph()
+        edges = [(0, 3), (0, 5), (3, 5), (1, 4), (6, 7)]
+        self.assertEqual(sorted(tuple(sorted(edge)) for edge in
+                                self.calc._distinct_edges(G)), sorted(edges))
+        masks = self.calc.all_cutset_masks(G)
+        cutsets = self.calc.all_cutset(G)
+        self.assertEqual(len(masks), len(cutsets))
+        self.assertEqual(Counter(bin(mask).count("1") for mask in masks),
+                         Counter(len(cutset) for cutset in cutsets))
+        # 3頂点の閉路のカットセットは5通り，2本の孤立した辺はそれぞれ2通り
+        self.assertEqual(len(masks), 5 * 2 * 2)
+
+    def test_split_components(self):
+        calc = fjgraph.ThreeWayCutSetDistCalculator(split_components=True)
+        G = _disconnected_graph()
+        dist = self.calc.detailed_cutset_dist(G)
+        self.assertEqual(calc.detailed_cutset_dist(G), dist)
+        self.assertEqual(calc.detailed_cutset_dist(G, use_symmetry=True), dist)
+
 
 class ErdosRenyiGraphEnsembleTest(unittest.TestCase):
 
@@ -177,6 +714,78 @@ class NMGraphEnsembleTest(unittest.TestCase):
         self.assertEqual(G.number_of_edges(), m)
 
 
+class EnumerateGraphsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calc = fjgraph.VertexCoverDistCalculator()
+
+    def _ave_dist(self, weighted_graphs):
+        ret = Counter()
+        for G, prob in weighted_graphs:
+            for k, num in self.calc.vertex_cover_dist(G).items():
+                ret[k] += prob * num
+        return ret
+
+    def assertDistAlmostEqual(self, first, second):
+        self.assertEqual(sorted(first), sorted(second))
+        for k in first:
+            self.assertAlmostEqual(first[k], second[k])
+
+    def test_nm_graph(self):
+        # 5頂点5辺の単純グラフの同型類は6個
+        graphs = list(fjgraph.NMGraphEnsemble(5, 5).enumerate_graphs())
+        self.assertEqual(len(graphs), 6)
+        self.assertAlmostEqual(sum(prob for G, prob in graphs), 1)
+        for G, prob in graphs:
+            self.assertEqual(G.number_of_nodes(), 5)
+            self.assertEqual(G.number_of_edges(), 5)
+
+    def test_multi_graph(self):
+        # 端点の順序対のすべての選び方と比べる
+        n, m = 3, 2
+        graphs = []
+        for ends in itertools.product(range(n), repeat=2 * m):
+            G = networkx.MultiGraph()
+            G.add_nodes_from(range(n))
+            G.add_edges_from(zip(ends[::2], ends[1::2]))
+            graphs.append((G, 1.0 / n ** (2 * m)))
+        exact = list(fjgraph.MultiGraphEnsemble(n, m).enumerate_graphs())
+        self.assertAlmostEqual(sum(prob for G, prob in exact), 1)
+        self.assertDistAlmostEqual(self._ave_dist(exact),
+                                   self._ave_dist(graphs))
+
+    def test_specified_degree_dist(self):
+        # 手のすべての完全マッチングと比べる
+        degree_dist = [0, 2, 2]
+        hands = [0, 1, 2, 2, 3, 3]
+
+        def matchings(hands):
+            if not hands:
+                yield []
+                return
+            for i in range(1, len(hands)):
+                rest = hands[1:i] + hands[i + 1:]
+                for matching in matchings(rest):
+                    yield [(hands[0], hands[i])] + matching
+
+        graphs = []
+        for matching in matchings(hands):
+            G = networkx.MultiGraph()
+            G.add_nodes_from(range(4))
+            G.add_edges_from(matching)
+            graphs.append((G, 1.0 / 15))
+        self.assertEqual(len(graphs), 15)
+        ensemble = fjgraph.SpecifiedDegreeDistEnsemble(degree_dist)
+        exact = list(ensemble.enumerate_graphs())
+        self.assertAlmostEqual(sum(prob for G, prob in exact), 1)
+        self.assertDistAlmostEqual(self._ave_dist(exact),
+                                   self._ave_dist(graphs))
+
+    def test_not_supported(self):
+        ensemble = fjgraph.ErdosRenyiGraphEnsemble(5, 0.5)
+        self.assertRaises(fjgraph.FJGraphError, ensemble.enumerate_graphs)
+
+
 class MinCutCalculatorTest(unittest.TestCase):
 
     @classmethod
@@ -202,6 +811,40 @@ class MinCutCalculatorTest(unittest.TestCase):
         st_mincut = self.calc.st_mincut(G, 0, 1)
         self.assertEqual(st_mincut, 3)
 
+    def test_stoer_wagner(self):
+        calc = self.calc
+        for ensemble in [fjgraph.MultiGraphEnsemble(8, 12),
+                         fjgraph.SpecifiedDegreeDistEnsemble([0, 2, 4, 2])]:
+            for i in range(20):
+                G = ensemble.generate_graph()
+                for u, v, key in G.edges(keys=True):
+                    G[u][v][key]["weight"] = random.randint(1, 3)
+                self.assertEqual(
+                    calc.global_mincut(G, algorithm="stoer_wagner"),
+                    calc.global_mincut(G, algorithm="maxflow"))
+
+    def test_stoer_wagner_disconnected(self):
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1, weight=2)
+        G.add_edge(2, 3, weight=2)
+        self.assertEqual(self.calc.global_mincut(G, algorithm="stoer_wagner"),
+                         0)
+
+    def test_unknown_algorithm(self):
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1, weight=1)
+        self.assertRaises(fjgraph.FJGraphError,
+                          self.calc.global_mincut, G, algorithm="karger")
+
+    def test_cache_per_algorithm(self):
+        # アルゴリズムごとに別の結果としてキャッシュする
+        cache = fjgraph.IsomorphismCache()
+        calc = fjgraph.MinCutCalculator(cache)
+        G = _disconnected_graph()
+        for algorithm in ["maxflow", "stoer_wagner", "maxflow"]:
+            self.assertEqual(calc.global_mincut(G, algorithm=algorithm), 0)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
 
 class CutSetDistCalculatorTest(unittest.TestCase):
 
@@ -235,3 +878,112 @@ class CutSetDistCalculatorTest(unittest.TestCase):
             (2, 2): 2,
         })
         self.assertEqual(dist, ok_dist)
+
+    def test_gray_method(self):
+        calc = self.calc
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1)
+        G.add_edge(0, 1)
+        G.add_edge(1, 4)
+        G.add_edge(4, 3)
+        G.add_edge(3, 2)
+        G.add_edge(2, 0)
+        G.add_edge(1, 1)
+
+        self.assertEqual(calc.detailed_global_cutset_dist(G, method="gray"),
+                         calc.detailed_global_cutset_dist(G))
+        self.assertEqual(calc.detailed_st_cutset_dist(G, 0, 3, method="gray"),
+                         calc.detailed_st_cutset_dist(G, 0, 3))
+
+    def test_use_symmetry(self):
+        calc = self.calc
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1)
+        G.add_edge(0, 1)
+        G.add_edge(1, 4)
+        G.add_edge(4, 3)
+        G.add_edge(3, 2)
+        G.add_edge(2, 0)
+        G.add_edge(1, 1)
+
+        dist = calc.detailed_global_cutset_dist(G)
+        for method in ["naive", "gray"]:
+            self.assertEqual(
+                calc.detailed_global_cutset_dist(G, method=method,
+                                                 use_symmetry=True),
+                dist)
+
+    def test_workers(self):
+        calc = fjgraph.CutSetDistCalculator(workers=2)
+        calc.min_parallel_assignments = 0
+        G = networkx.MultiGraph()
+        G.add_edge(0, 1)
+        G.add_edge(0, 1)
+        G.add_edge(1, 4)
+        G.add_edge(4, 3)
+        G.add_edge(3, 2)
+        G.add_edge(2, 0)
+        G.add_edge(1, 1)
+
+        dist = self.calc.detailed_global_cutset_dist(G)
+        st_dist = self.calc.detailed_st_cutset_dist(G, 0, 3)
+        for method in ["naive", "gray"]:
+            self.assertEqual(
+                calc.detailed_global_cutset_dist(G, method=method), dist)
+            self.assertEqual(
+                calc.detailed_global_cutset_dist(G, method=method,
+                                                 use_symmetry=True), dist)
+            self.assertEqual(
+                calc.detailed_st_cutset_dist(G, 0, 3, method=method), st_dist)
+        calc.close()
+
+
+    def test_split_components(self):
+        calc = fjgraph.CutSetDistCalculator(split_components=True)
+        G = _disconnected_graph()
+        dist = self.calc.detailed_global_cutset_dist(G)
+        for method in ["naive", "gray"]:
+            self.assertEqual(
+                calc.detailed_global_cutset_dist(G, method=method), dist)
+            # sとtが同じ成分にある場合と別の成分にある場合
+            for s, t in [(0, 5), (3, 1), (4, 2)]:
+                self.assertEqual(
+                    calc.detailed_st_cutset_dist(G, s, t, method=method),
+                    self.calc.detailed_st_cutset_dist(G, s, t))
+
+class TreeDecompositionDistCalculatorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        self.calc = fjgraph.TreeDecompositionDistCalculator()
+
+    def test_same_as_exhaustive(self):
+        vc_calc = fjgraph.VertexCoverDistCalculator()
+        cut_calc = fjgraph.CutSetDistCalculator()
+        ensembles = [fjgraph.SpecifiedDegreeDistEnsemble([1, 2, 3, 2]),
+                     fjgraph.MultiGraphEnsemble(6, 8)]
+        for ensemble in ensembles:
+            for i in range(5):
+                G = ensemble.generate_graph()
+                self.assertEqual(self.calc.vertex_cover_dist(G),
+                                 vc_calc.vertex_cover_dist(G))
+                self.assertEqual(self.calc.lp_vertex_cover_dist(G),
+                                 vc_calc.lp_vertex_cover_dist(G))
+                self.assertEqual(self.calc.detailed_global_cutset_dist(G),
+                                 cut_calc.detailed_global_cutset_dist(G))
+
+    def test_large_cycle(self):
+        n = 100
+        G = networkx.cycle_graph(n)
+        order, width = self.calc.elimination_order(G)
+        self.assertEqual(sorted(order), list(range(n)))
+        self.assertEqual(width, 2)
+
+        # 閉路の頂点被覆の個数はリュカ数L_n
+        a, b = 2, 1
+        for i in range(n):
+            a, b = b, a + b
+        self.assertEqual(sum(self.calc.vertex_cover_dist(G).values()), a)
+        dist = self.calc.detailed_global_cutset_dist(G)
+        self.assertEqual(sum(dist.values()), 2 ** n)
+        self.assertEqual(dist[(1, 2)], n)
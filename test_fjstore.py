@@ -0,0 +1,92 @@
+# coding: utf-8
+
+import unittest
+import fjexperiment
+import fjstore
+import fjutil
+import os
+import random
+import shutil
+import tempfile
+
+# _dist_trialを呼んだ回数
+_calls = []
+
+
+def _dist_trial(n):
+    _calls.append(1)
+    return {random.randint(0, n): 1}
+
+
+class TrialStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "trials.db")
+        del _calls[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        store = fjstore.TrialStore(self.path)
+        store.save("exp", "ensemble", 1, 0, {3: 1})
+        store.save("exp", "ensemble", 1, 2, (0.5, [1, 2]))
+        store.flush()
+        store.close()
+
+        store = fjstore.TrialStore(self.path)
+        self.assertEqual(store.load("exp", "ensemble", 1),
+                         {0: {3: 1}, 2: (0.5, [1, 2])})
+        self.assertEqual(store.load("exp", "ensemble", 2), {})
+        self.assertEqual(store.load("other", "ensemble", 1), {})
+        store.close()
+
+    def test_results(self):
+        # 同じ実験とアンサンブルならシードが違っても集め，アンサンブルが違え
+        # ば分ける
+        store = fjstore.TrialStore(self.path)
+        store.save("exp", "A", 1, 0, "a10")
+        store.save("exp", "A", 1, 1, "a11")
+        store.save("exp", "A", 2, 0, "a20")
+        store.save("exp", "B", 1, 0, "b10")
+        store.flush()
+        self.assertEqual(list(store.results("exp", "A")),
+                         [(u"1", 0, "a10"), (u"1", 1, "a11"),
+                          (u"2", 0, "a20")])
+        self.assertEqual(list(store.results("exp", "B")), [(u"1", 0, "b10")])
+        store.close()
+
+    def _accumulate(self, results):
+        accumulator = fjutil.make_accumulator()
+        for dist in results:
+            accumulator.add(dist)
+        return accumulator.to_counter()
+
+    def test_resume(self):
+        key = ("exp", "ensemble")
+        expected = self._accumulate(
+            fjexperiment.TrialRunner(seed=1).run(_dist_trial, (5,), 20))
+        del _calls[:]
+
+        # 7回目の結果を受け取ったところで止める
+        store = fjstore.TrialStore(self.path)
+        runner = fjexperiment.TrialRunner(seed=1, store=store)
+        results = runner.run(_dist_trial, (5,), 20, key)
+        for i in range(7):
+            next(results)
+        results.close()
+        store.close()
+        self.assertEqual(len(_calls), 7)
+
+        # 同じファイルで再開すると，残りの試行だけを計算する
+        del _calls[:]
+        store = fjstore.TrialStore(self.path)
+        self.assertEqual(sorted(store.load("exp", "ensemble", 1)),
+                         list(range(7)))
+        runner = fjexperiment.TrialRunner(seed=1, store=store)
+        actual = self._accumulate(runner.run(_dist_trial, (5,), 20, key))
+        store.close()
+        self.assertEqual(len(_calls), 13)
+        self.assertEqual(actual, expected)
+        self.assertEqual(sum(actual.values()), 20)
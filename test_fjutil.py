@@ -24,3 +24,111 @@ class UtilTest(unittest.TestCase):
 
         f = fjutil.str2float("2e-1")
         self.assertEqual(f, 2.0 * (10 ** -1))
+
+    def test_derive_seed(self):
+        seed = fjutil.derive_seed("abc", 0)
+        self.assertEqual(seed, fjutil.derive_seed("abc", 0))
+        self.assertNotEqual(seed, fjutil.derive_seed("abc", 1))
+        self.assertNotEqual(seed, fjutil.derive_seed("abd", 0))
+
+    def test_wilson_interval(self):
+        low, high = fjutil.wilson_interval(50, 100)
+        self.assertAlmostEqual(low, 0.4038, places=4)
+        self.assertAlmostEqual(high, 0.5962, places=4)
+
+        low, high = fjutil.wilson_interval(0, 10)
+        self.assertEqual(low, 0.0)
+        self.assertTrue(0.0 < high < 0.5)
+
+        self.assertEqual(fjutil.wilson_interval(0, 0), (0.0, 1.0))
+
+    def test_running_mean(self):
+        mean = fjutil.RunningMean()
+        for value in [1, 2, 3, 4]:
+            mean.add(value)
+        self.assertEqual(mean.mean(), 2.5)
+        self.assertAlmostEqual(mean.stderr(), (5 / 3.0 / 4) ** 0.5)
+        low, high = mean.interval()
+        self.assertAlmostEqual((low + high) / 2, 2.5)
+
+        mean = fjutil.RunningMean()
+        mean.add(1)
+        self.assertEqual(mean.stderr(), float("inf"))
+
+    def test_dense_accumulator(self):
+        from collections import Counter
+        dists = [{(0, 1): 2, (2, 0): 1}, {(0, 1): 1, (1, 1): 3}, {}]
+        expected = Counter()
+        acc = fjutil.make_accumulator((3, 2))
+        for dist in dists:
+            acc.add(dist)
+            expected.update(dist)
+        self.assertEqual(acc.count, 3)
+        self.assertEqual(acc.to_counter(), expected)
+        self.assertEqual(acc.average()[(1, 1)], 1)
+
+        other = fjutil.make_accumulator((3, 2))
+        other.add({(2, 0): 5})
+        acc.merge(other)
+        expected[(2, 0)] += 5
+        self.assertEqual(acc.count, 4)
+        self.assertEqual(acc.to_counter(), expected)
+        self.assertRaises(ValueError, acc.merge, fjutil.make_accumulator((2,)))
+
+    def test_dense_accumulator_promotion(self):
+        acc = fjutil.make_accumulator((3,))
+        acc.add({0: 2 ** 62, 1: 1})
+        acc.add({0: 2 ** 62})
+        acc.add({2: 0.5})
+        self.assertEqual(acc.to_counter(), {0: 2 ** 63, 1: 1, 2: 0.5})
+
+    def test_accumulator_checkpoint(self):
+        import os
+        import shutil
+        import tempfile
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "acc.pickle")
+            for acc in [fjutil.make_accumulator((4,)),
+                        fjutil.make_accumulator()]:
+                acc.add({1: 2, 3: 1})
+                acc.checkpoint(path)
+                loaded = fjutil.load_accumulator(path)
+                self.assertEqual(loaded.count, 1)
+                self.assertEqual(loaded.to_counter(), acc.to_counter())
+                loaded.merge(acc)
+                self.assertEqual(loaded.to_counter(), {1: 4, 3: 2})
+
+                fjutil.save_checkpoint(path, loaded, 7)
+                loaded, next_trial = fjutil.load_checkpoint(path)
+                self.assertEqual((loaded.count, next_trial), (2, 7))
+                self.assertEqual(loaded.to_counter(), {1: 4, 3: 2})
+                acc.checkpoint(path)
+                self.assertEqual(fjutil.load_checkpoint(path)[1], 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_profiler(self):
+        self.assertFalse(fjutil.profiler().enabled)
+        with fjutil.profiler().phase("a"):
+            fjutil.profiler().count("x")
+
+        profiler = fjutil.Profiler()
+        previous = fjutil.set_profiler(profiler)
+        try:
+            for i in range(3):
+                with fjutil.profiler().phase("a"):
+                    fjutil.profiler().count("x", 2)
+        finally:
+            fjutil.set_profiler(previous)
+        self.assertFalse(fjutil.profiler().enabled)
+        self.assertEqual(profiler.calls["a"], 3)
+        self.assertEqual(profiler.counters["x"], 6)
+
+        taken = profiler.take()
+        self.assertEqual(profiler.to_dict(), {"phases": {}, "counters": {}})
+        profiler.merge(taken)
+        profiler.merge(taken)
+        d = profiler.to_dict()
+        self.assertEqual(d["phases"]["a"]["calls"], 6)
+        self.assertEqual(d["counters"], {"x": 12})
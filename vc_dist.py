@@ -10,6 +10,7 @@ from __future__ import division, print_function
 import fjgraph
 import fjutil
 import fjexperiment
+import fjstore
 import random
 from collections import Counter
 
@@ -30,13 +31,77 @@ def parse_arguments():
                       default=None,
                       help="set the seed for the random module",
                       metavar="STRING")
+    parser.add_option("-j", "--jobs",
+                      dest="jobs",
+                      type="int",
+                      default=1,
+                      help="set the number of worker processes",
+                      metavar="NUMBER")
+    parser.add_option("--store",
+                      dest="store",
+                      type="string",
+                      default=None,
+                      help="save trial results to FILE and skip saved trials",
+                      metavar="FILE")
+    parser.add_option("--pool",
+                      dest="pool",
+                      action="store_true",
+                      default=False,
+                      help="also use the other trials saved in the store")
+    parser.add_option("-c", "--cache",
+                      dest="cache",
+                      type="int",
+                      default=0,
+                      help="cache results of up to SIZE isomorphism classes",
+                      metavar="SIZE")
+    parser.add_option("--checkpoint",
+                      dest="checkpoint",
+                      type="string",
+                      default=None,
+                      help="save partial sums to PREFIX-ip.pickle and "
+                           "PREFIX-lp.pickle and resume from them",
+                      metavar="PREFIX")
+    parser.add_option("-m", "--method",
+                      dest="method",
+                      type="choice",
+                      choices=["naive", "numpy", "branch"],
+                      default="naive",
+                      help="set the method for the IP vertex cover dist "
+                           "(naive, numpy or branch)",
+                      metavar="METHOD")
+    parser.add_option("--exact",
+                      dest="exact",
+                      action="store_true",
+                      default=False,
+                      help="enumerate all graphs of the ensemble up to "
+                           "isomorphism instead of sampling (small ensembles "
+                           "only)")
     parser.add_option("-O", "--output",
                       dest="output",
                       type="string",
                       default=None,
                       help="set the output file prefix",
                       metavar="FILE")
+    parser.add_option("--profile",
+                      dest="profile",
+                      action="store_true",
+                      default=False,
+                      help="print the time spent in each phase and counters")
+    parser.add_option("--profile-json",
+                      dest="profile_json",
+                      type="string",
+                      default=None,
+                      help="write the profile to FILE as JSON",
+                      metavar="FILE")
     (opts, args) = parser.parse_args()
+    if opts.store and opts.seed is None:
+        parser.error("--store requires --seed")
+    if opts.pool and not opts.store:
+        parser.error("--pool requires --store")
+    if opts.checkpoint and opts.seed is None:
+        parser.error("--checkpoint requires --seed")
+    if opts.exact and (opts.store or opts.checkpoint):
+        parser.error("--exact cannot be used with --store or --checkpoint")
     if len(args) != 1:
         parser.error("required a json file which define the ensemble")
     if not os.access(args[0], os.R_OK):
@@ -61,14 +126,45 @@ def ave_vertex_cover_dist_experiment():
     ensemble_def = fjutil.load_json_file(json_file)
     ensemble = fjgraph.GraphEnsembleFactory().create(**ensemble_def)
     loop_count = opts.trials
+    cache = None
+    if opts.cache > 0:
+        cache = fjgraph.IsomorphismCache(opts.cache)
+    store = None
+    if opts.store:
+        store = fjstore.TrialStore(opts.store)
+    profiler = None
+    if opts.profile or opts.profile_json:
+        profiler = fjutil.Profiler()
+    runner = fjexperiment.TrialRunner(seed=opts.seed, jobs=opts.jobs,
+                                      cache=cache, store=store,
+                                      pool_trials=opts.pool,
+                                      profiler=profiler)
     print("ensemble: {}".format(ensemble))
     print("seed: {}".format(opts.seed))
     print("num_of_trials: {}".format(loop_count))
+    print("jobs: {}".format(opts.jobs))
+    print("store: {}".format(opts.store))
+    print("cache: {}".format(opts.cache))
+    print("method: {}".format(opts.method))
+    print("checkpoint: {}".format(opts.checkpoint))
+    print("exact: {}".format(opts.exact))
     print()
 
     # 実験
-    ave_ip_dist = fjexperiment.ave_vertex_cover_dist(ensemble, loop_count)
-    ave_lp_table = fjexperiment.ave_lp_vertex_cover_dist(ensemble, loop_count)
+    ip_checkpoint = lp_checkpoint = None
+    if opts.checkpoint:
+        ip_checkpoint = opts.checkpoint + "-ip.pickle"
+        lp_checkpoint = opts.checkpoint + "-lp.pickle"
+    if opts.exact:
+        ave_ip_dist = fjexperiment.exact_ave_vertex_cover_dist(
+            ensemble, runner, opts.method)
+        ave_lp_table = fjexperiment.exact_ave_lp_vertex_cover_dist(
+            ensemble, runner)
+    else:
+        ave_ip_dist = fjexperiment.ave_vertex_cover_dist(
+            ensemble, loop_count, runner, opts.method, ip_checkpoint)
+        ave_lp_table = fjexperiment.ave_lp_vertex_cover_dist(
+            ensemble, loop_count, runner, lp_checkpoint)
     ave_lp_dist = flatten_ave_lp_vertex_cover_dist(ave_lp_table)
 
     # 結果出力
@@ -92,6 +188,8 @@ def ave_vertex_cover_dist_experiment():
                                             start=0, stop=n, step=0.5)
         fjutil.output_dist(fillup_lp_dist, lp_file)
 
+    fjutil.output_profile(profiler, opts.profile, opts.profile_json)
+
 
 if __name__ == "__main__":
     ave_vertex_cover_dist_experiment()